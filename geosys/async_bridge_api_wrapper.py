@@ -0,0 +1,458 @@
+# coding=utf-8
+"""Implementation of the asynchronous Bridge API Wrapper.
+"""
+import asyncio
+
+from geosys.bridge_api.api_abstract import ApiClient
+from geosys.bridge_api.async_api_abstract import AsyncApiClient
+from geosys.bridge_api.async_connection import AsyncConnectionAPIClient
+from geosys.bridge_api.async_field_level_maps import (
+    AsyncFieldLevelMapsAPIClient)
+from geosys.bridge_api.default import CATALOG_BATCH_SIZE
+from geosys.bridge_api.definitions import SAMZ
+from geosys.bridge_api.token_store import TokenStore
+from geosys.bridge_api_wrapper import AuthenticationError, BridgeAPI
+
+from geosys.utilities.utilities import log
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+
+class AsyncBridgeAPI(object):
+    """Asynchronous wrapper client for bridge api.
+
+    Mirrors BridgeAPI with coroutines. Every request goes through a single
+    pooled httpx client, so many map requests can run concurrently from one
+    event loop::
+
+        async with AsyncBridgeAPI(*credentials) as bridge_api:
+            maps = await asyncio.gather(*[
+                bridge_api.get_field_map(...) for ... in ...])
+
+    The wrapper only holds the credentials, it builds an asynchronous
+    endpoint client for every request. The access token is requested when
+    entering the context, or by awaiting authenticate(), and refreshed
+    before each endpoint client is handed out. Tokens are shared with
+    BridgeAPI through TokenStore, the request data is built by the static
+    methods of BridgeAPI.
+    """
+
+    # Catalog cache lookup and batch support shared with BridgeAPI.
+    _cached_catalog_imagery = BridgeAPI._cached_catalog_imagery
+    _catalog_batch_support = BridgeAPI._catalog_batch_support
+    catalog_batch_size = BridgeAPI.catalog_batch_size
+    record_catalog_batch_support = BridgeAPI.record_catalog_batch_support
+
+    def __init__(
+            self,
+            username,
+            password,
+            region,
+            client_id,
+            client_secret,
+            use_testing_service=False,
+            identity_url=None,
+            server_url=None,
+            proxies=None,
+            client=None):
+        """Asynchronous wrapper implementation for bridge api.
+
+        See BridgeAPI for the parameters. Unlike BridgeAPI, the constructor
+        does not authenticate.
+
+        :param client: Shared HTTP client, owned by the caller. A client is
+            created, and closed by aclose(), when not given.
+        :type client: httpx.AsyncClient
+        """
+        self.username = username
+        self.password = password
+        self.region = region
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.use_testing_service = use_testing_service
+        self.access_token = None
+        self.authenticated = False
+        self.authentication_message = None
+        # Shared with the downloads of the maps, updated in place.
+        self.headers = {'authorization': 'Bearer %s' % self.access_token}
+
+        proxy_client = ApiClient()
+        if proxies:
+            proxy_client.set_proxy(*proxies)
+        self.proxy = proxy_client.proxy
+
+        self.identity_server, self.bridge_server = BridgeAPI.server_urls(
+            region, use_testing_service, identity_url, server_url)
+
+        self._client = client
+        self._owns_client = client is None
+        self._renew_lock = None
+
+    @property
+    def client(self):
+        """HTTP client shared by every request of the wrapper.
+
+        :rtype: httpx.AsyncClient
+        """
+        if self._client is None:
+            self._client = AsyncApiClient.create_client(self.proxy)
+        return self._client
+
+    async def aclose(self):
+        """Close the HTTP client, unless it is shared."""
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        """Authenticate when entering the context.
+
+        :raises: AuthenticationError - when the credentials are rejected.
+        """
+        if not await self.refresh_authentication():
+            await self.aclose()
+            raise AuthenticationError(self.authentication_message)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Close the HTTP client when leaving the context."""
+        await self.aclose()
+
+    def set_access_token(self, access_token):
+        """Use a new access token for the next requests.
+
+        :param access_token: The access token.
+        :type access_token: str
+        """
+        self.access_token = access_token
+        self.headers['authorization'] = 'Bearer %s' % access_token
+
+    async def field_level_maps_client(self):
+        """Field level maps client sharing this wrapper's token and client.
+
+        Long pipelines outlive a token, it is renewed before it expires. A
+        token rejected by the server is renewed once.
+
+        :raises: AuthenticationError - when no valid token can be obtained.
+
+        :return: Asynchronous field level maps API client.
+        :rtype: AsyncFieldLevelMapsAPIClient
+        """
+        if not await self.refresh_authentication():
+            raise AuthenticationError(self.authentication_message)
+        api_client = AsyncFieldLevelMapsAPIClient(
+            self.access_token, self.bridge_server, client=self.client)
+        api_client.unauthorized_callback = self.renew_access_token
+        return api_client
+
+    async def refresh_authentication(self):
+        """Get the access token from the token store again.
+
+        The identity server is only called when the cached token is about
+        to expire.
+
+        :return: Whether a valid access token is available.
+        :rtype: bool
+        """
+        self.authenticated, self.authentication_message = (
+            await self.authenticate())
+        return self.authenticated
+
+    async def renew_access_token(self):
+        """Replace an access token rejected by the server.
+
+        Coroutines rejected at the same time share a single renewal.
+
+        :return: The new access token, None when authentication failed.
+        :rtype: str
+        """
+        if self._renew_lock is None:
+            # Bound to the running event loop, so created lazily.
+            self._renew_lock = asyncio.Lock()
+        rejected_token = self.access_token
+        async with self._renew_lock:
+            if self.access_token == rejected_token:
+                TokenStore.invalidate(
+                    self.identity_server, self.username, self.client_id)
+            if await self.refresh_authentication():
+                return self.access_token
+        return None
+
+    async def authenticate(self):
+        """Authenticate user using given credentials.
+
+        :return: Authentication status and message.
+        :rtype: tuple
+        """
+        api_client = AsyncConnectionAPIClient(
+            self.identity_server, client=self.client)
+        response = await TokenStore.get_token_async(
+            api_client,
+            self.username,
+            self.password,
+            self.client_id,
+            self.client_secret)
+        if response.get('access_token'):
+            self.set_access_token(response['access_token'])
+            return True, 'Authentication succeeded.'
+
+        message = (
+            'Ensure your username, password, client id, and client '
+            'secret are valid for the selected region service and then'
+            'try again.')
+        return False, message
+
+    async def get_content(self, url, params=None, data=None):
+        """Get the response content, e.g. a thumbnail.
+
+        :param url: API url.
+        :type url: str
+
+        :param params: Request parameters.
+        :type params: dict
+
+        :param data: Request data.
+        :type data: dict
+
+        :return: Response content.
+        :rtype: bytes
+        """
+        api_client = await self.field_level_maps_client()
+        return await api_client.get_content(url, params=params, data=data)
+
+    async def get_catalog_imagery(
+            self, geometry, crop, sowing_date, filters=None, cache=None,
+            refresh=False):
+        """Get catalog imagery for given parameters.
+
+        See BridgeAPI.get_catalog_imagery.
+
+        :return: JSON response.
+            List of maps data specification based on given criteria.
+        :rtype: list
+        """
+        responses = await self.get_catalog_imagery_batch(
+            [geometry], crop, sowing_date, filters=filters, cache=cache,
+            refresh=refresh)
+        return responses[0]
+
+    async def get_catalog_imagery_batch(
+            self, geometries, crop, sowing_date, filters=None, cache=None,
+            refresh=False, batch_size=CATALOG_BATCH_SIZE):
+        """Get catalog imagery of many fields, batches run concurrently.
+
+        See BridgeAPI.get_catalog_imagery_batch. Until the server is known
+        to echo the customerExternalId of the fields, the first batch is
+        sent alone.
+
+        :return: JSON response of every field, in the order of geometries.
+        :rtype: list
+        """
+        responses, cache_keys, missing = self._cached_catalog_imagery(
+            geometries, crop, sowing_date, filters, cache, refresh)
+
+        batches = []
+        if (self._catalog_batch_support.get(self.bridge_server) is None
+                and self.catalog_batch_size(batch_size) > 1):
+            batches.append(missing[:self.catalog_batch_size(batch_size)])
+            missing = missing[len(batches[0]):]
+        while batches or missing:
+            batch_responses = await asyncio.gather(*[
+                self._catalog_imagery_request(
+                    [geometries[index] for index in batch], crop,
+                    sowing_date, filters)
+                for batch in batches])
+            for batch, batch_response in zip(batches, batch_responses):
+                BridgeAPI._store_catalog_imagery(
+                    responses, cache_keys, batch, batch_response, filters,
+                    cache)
+            size = self.catalog_batch_size(batch_size)
+            batches = [
+                missing[start:start + size]
+                for start in range(0, len(missing), size)]
+            missing = []
+
+        return responses
+
+    async def _catalog_imagery_request(
+            self, geometries, crop, sowing_date, filters):
+        """Send a single catalog-imagery request for the given fields.
+
+        :return: JSON response of every field, in the order of geometries.
+        :rtype: list
+        """
+        api_client = await self.field_level_maps_client()
+        coverages_json = await api_client.get_catalog_imagery(
+            BridgeAPI.catalog_imagery_request_data(geometries, crop, sowing_date),
+            filters=filters)
+
+        responses = BridgeAPI.split_catalog_imagery(coverages_json, len(geometries))
+        if len(geometries) > 1:
+            self.record_catalog_batch_support(coverages_json, responses)
+        if responses is not None:
+            return responses
+
+        log('Catalog batch of {} fields could not be split, requesting '
+            'them one by one.'.format(len(geometries)))
+        responses = await asyncio.gather(*[
+            self._catalog_imagery_request(
+                [geometry], crop, sowing_date, filters)
+            for geometry in geometries])
+        return [response for response, in responses]
+
+    async def _get_field_map(
+            self,
+            map_type_key,
+            request_data,
+            n_planned=None,
+            yield_val=None,
+            min_yield_val=None,
+            max_yield_val=None,
+            sample_field_id=None,
+            params=None,
+            zone_count=None
+    ):
+        """Actual method to call field map creation request.
+
+        :return: JSON response.
+            Map data specification based on given criteria.
+        :rtype: dict
+        """
+        api_client = await self.field_level_maps_client()
+        return await api_client.get_field_map(
+            map_type_key,
+            request_data,
+            n_planned,
+            yield_val,
+            min_yield_val,
+            max_yield_val,
+            sample_field_id,
+            params,
+            zone_count=zone_count)
+
+    async def get_hotspot(self, url, params=None, data=None):
+        """Get zone hotspots.
+
+        :return: JSON response.
+            Map data specification based on given parameters.
+        :rtype: dict
+        """
+        api_client = await self.field_level_maps_client()
+        return await api_client.get_hotspot(url, params, data)
+
+    async def get_field_map(
+            self,
+            map_type_key,
+            season_field_id,
+            season_field_geom,
+            image_date,
+            image_id=None,
+            n_planned=1.0,
+            yield_val=0,
+            min_yield_val=0,
+            max_yield_val=0,
+            sample_map_data=None,
+            sample_map_id=None,
+            zone_count=None,
+            **kwargs):
+        """Get requested field map.
+
+        See BridgeAPI.get_field_map.
+
+        :return: JSON response.
+            Map data specification based on given criteria.
+        :rtype: dict
+        """
+        request_data, params = BridgeAPI.field_map_request_data(
+            map_type_key, season_field_id, season_field_geom, image_id,
+            n_planned, sample_map_data, sample_map_id, **kwargs)
+
+        return await self._get_field_map(
+            map_type_key,
+            request_data,
+            n_planned,
+            yield_val,
+            min_yield_val,
+            max_yield_val,
+            sample_map_id,
+            params, zone_count=zone_count)
+
+    async def get_difference_map(
+            self, map_type_key, season_field_geometry,
+            earliest_image_date, latest_image_date, **kwargs):
+        """Get requested difference map.
+
+        See BridgeAPI.get_difference_map.
+
+        :return: JSON response.
+            Map data specification based on given criteria.
+        :rtype: dict
+        """
+        map_type_key, request_data, params = (
+            BridgeAPI.difference_map_request_data(
+                map_type_key, season_field_geometry, earliest_image_date,
+                latest_image_date, **kwargs))
+
+        return await self._get_field_map(
+            map_type_key, request_data, params=params)
+
+    async def get_samz_map(
+            self,
+            geometry,
+            list_of_image_ids,
+            list_of_image_date=None,
+            zone_count=0,
+            **kwargs):
+        """Get requested SAMZ map.
+
+        See BridgeAPI.get_samz_map.
+
+        :return: JSON response.
+            Map data specification based on given criteria.
+        :rtype: dict
+        """
+        request_data = BridgeAPI.samz_map_request_data(
+            geometry, list_of_image_ids, zone_count)
+
+        return await self._get_field_map(SAMZ['key'], request_data)
+
+    async def get_rx_map(self, url, source_map_id, zone_count=0, **kwargs):
+        """Get requested RX map.
+
+        See BridgeAPI.get_rx_map.
+
+        :return: JSON response.
+            Map data specification based on given criteria.
+        :rtype: dict
+        """
+        api_client = await self.field_level_maps_client()
+        request_data = {
+            "SourceMapId": source_map_id,
+            "zoneCount": zone_count
+        }
+        request_data.update(kwargs)
+
+        return await api_client.get_rx_map(url, request_data)
+
+    async def patch_rx_map(self, source_map_id, patch_data=None, **kwargs):
+        """Patch requested RX map.
+
+        :return: JSON response.
+            Map data specification based on given criteria.
+        :rtype: dict
+        """
+        api_client = await self.field_level_maps_client()
+        return await api_client.patch_rx_map(source_map_id, patch_data)
+
+    async def get_rx_generated(self, url, source_map_id, **kwargs):
+        """Get RX map generated.
+
+        :return: JSON response.
+            Map data specification based on given criteria.
+        :rtype: dict
+        """
+        api_client = await self.field_level_maps_client()
+        return await api_client.get_rx_generated(url, source_map_id)
@@ -2,9 +2,18 @@
 """Abstract class implementation of Bridge API Interface.
 """
 import os
-
-from requests import get, post, patch
-
+import threading
+import time
+from urllib.parse import urlsplit
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+
+from geosys.bridge_api.default import HTTP_POOL_SIZE
+from geosys.bridge_api.retry import (
+    IDEMPOTENT_METHODS, RateLimiter, RetryPolicy, retry_after_seconds)
+from geosys.utilities.settings import setting
 from geosys.utilities.utilities import log
 
 __copyright__ = "Copyright 2019, Kartoza"
@@ -18,6 +27,14 @@ class ApiClient(object):
 
     VERSION = 0
 
+    # Keep-alive sessions shared by every client, keyed by scheme and host.
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+    # Connections per host, read from the http_pool_size setting unless set.
+    _pool_size = None
+    # Retry policy of every client.
+    retry_policy = RetryPolicy()
+
     def __init__(self, access_token='', endpoint_url=''):
         """Base class for API client.
 
@@ -33,6 +50,21 @@ class ApiClient(object):
             'authorization': 'Bearer %s' % self.access_token
         }
         self.proxy = {}
+        # Called once after a request was rejected as unauthorized, returns
+        # a new access token or None.
+        self.unauthorized_callback = None
+
+    def set_access_token(self, access_token):
+        """Use a new access token for the next requests.
+
+        The headers are updated in place, as they may be shared with the
+        downloads of the client.
+
+        :param access_token: The access token.
+        :type access_token: str
+        """
+        self.access_token = access_token
+        self.headers['authorization'] = 'Bearer %s' % access_token
 
     def set_proxy(self, proxy_host, proxy_port, proxy_user, proxy_password):
         """Set proxy server.
@@ -66,6 +98,58 @@ class ApiClient(object):
             for protocol in ['http', 'https', 'ftp']:
                 self.proxy[protocol] = '%s://%s' % (protocol, proxy_url)
 
+    @classmethod
+    def set_pool_size(cls, pool_size):
+        """Set the number of pooled connections kept per host.
+
+        The next requests use new sessions of the new size. The existing
+        sessions are not closed, as other threads may still be using them;
+        they are closed once they are no longer referenced.
+
+        :param pool_size: Maximum number of connections per host, None to
+            read it from the http_pool_size setting.
+        :type pool_size: int
+        """
+        with cls._sessions_lock:
+            ApiClient._pool_size = (
+                None if pool_size is None else max(1, int(pool_size)))
+            ApiClient._sessions = {}
+
+    @classmethod
+    def set_retry_policy(cls, retry_policy):
+        """Set the retry policy of every client.
+
+        :param retry_policy: The retry policy.
+        :type retry_policy: RetryPolicy
+        """
+        ApiClient.retry_policy = retry_policy
+
+    @classmethod
+    def session(cls, url):
+        """Get the shared keep-alive session of the url's host.
+
+        :param url: Request url.
+        :type url: str
+
+        :return: Pooled session for the host.
+        :rtype: requests.Session
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        with cls._sessions_lock:
+            session = ApiClient._sessions.get(key)
+            if session is None:
+                pool_size = ApiClient._pool_size or setting(
+                    'http_pool_size', HTTP_POOL_SIZE, expected_type=int)
+                session = Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=max(1, pool_size))
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                ApiClient._sessions[key] = session
+            return session
+
     @property
     def base_url(self):
         """Base url of the API.
@@ -88,13 +172,25 @@ class ApiClient(object):
 
         return full_url
 
-    def get(self, url, **kwargs):
-        """Fetch JSON response from get request to the API.
+    def request(self, method, url, idempotent=None, **kwargs):
+        """Send a request to the API, retrying transient failures.
+
+        Requests are rate limited per host. Failed attempts are sent again
+        according to the retry policy, waiting as long as the Retry-After
+        header of the response asks. An unauthorized request is sent again
+        once with the access token given by the unauthorized_callback.
+
+        :param method: HTTP method.
+        :type method: str
 
         :param url: API url.
         :type url: str
 
-        :param kwargs: requests.get parameters
+        :param idempotent: Whether the request can be sent twice safely,
+            e.g. a POST only reading data. Defaults to the method semantic.
+        :type idempotent: bool
+
+        :param kwargs: requests.request parameters
         :type kwargs: dict
 
         :return: The API response.
@@ -102,9 +198,60 @@ class ApiClient(object):
         """
         if kwargs.get('headers'):
             kwargs['headers'].update(self.headers)
+        if idempotent is None:
+            idempotent = method.lower() in IDEMPOTENT_METHODS
+
+        attempt = 0
+        renewed_token = False
+        while True:
+            attempt += 1
+            time.sleep(RateLimiter.reserve(url))
+            try:
+                response = self.session(url).request(
+                    method, url, proxies=self.proxy, **kwargs)
+            except (ConnectionError, Timeout) as e:
+                if not self.retry_policy.should_retry(
+                        attempt, idempotent=idempotent,
+                        connection_error=True):
+                    raise
+                delay = self.retry_policy.delay(attempt)
+                reason = str(e)
+            else:
+                if (response.status_code == 401 and not renewed_token and
+                        self.unauthorized_callback is not None):
+                    renewed_token = True
+                    access_token = self.unauthorized_callback()
+                    if access_token:
+                        self.set_access_token(access_token)
+                        if kwargs.get('headers') is not None:
+                            kwargs['headers'].update(self.headers)
+                        response.close()
+                        continue
+                if not self.retry_policy.should_retry(
+                        attempt, response.status_code, idempotent):
+                    return response
+                delay = self.retry_policy.delay(
+                    attempt,
+                    retry_after_seconds(response.headers.get('Retry-After')))
+                reason = response.status_code
+                response.close()
+            log('{} {} failed ({}), retrying in {:.1f} seconds.'.format(
+                method.upper(), url, reason, delay), info=False, notify=False)
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        """Fetch JSON response from get request to the API.
+
+        :param url: API url.
+        :type url: str
+
+        :param kwargs: requests.get parameters
+        :type kwargs: dict
 
-        response = get(url, proxies=self.proxy, **kwargs)
-        return response
+        :return: The API response.
+        :rtype: response object
+        """
+        return self.request('get', url, **kwargs)
 
     def post(self, url, **kwargs):
         """Fetch JSON response from post request to the API.
@@ -118,12 +265,19 @@ class ApiClient(object):
         :return: The API response.
         :rtype: response object
         """
-        if kwargs.get('headers'):
-            kwargs['headers'].update(self.headers)
+        return self.request('post', url, **kwargs)
+
+    def send(self, request):
+        """Send a request built by one of the request methods of a client.
 
-        response = post(url, proxies=self.proxy, **kwargs)
+        :param request: Tuple of HTTP method, url and request parameters.
+        :type request: tuple
 
-        return response
+        :return: The API response.
+        :rtype: response object
+        """
+        method, url, kwargs = request
+        return getattr(self, method)(url, **kwargs)
 
     def get_content(self, url, params=None, data=None):
         """Get the response content.
@@ -138,12 +292,14 @@ class ApiClient(object):
         :rtype: bytes
         """
 
+        # Thumbnails and other contents are only read.
         response = self.post(
             url,
             headers=self.headers,
             params=params,
             json=data,
-            stream=True
+            stream=True,
+            idempotent=True
         )
         return response.content
 
@@ -159,8 +315,4 @@ class ApiClient(object):
         :return: The API response.
         :rtype: response object
         """
-        if kwargs.get('headers'):
-            kwargs['headers'].update(self.headers)
-
-        response = patch(url, proxies=self.proxy, **kwargs)
-        return response
+        return self.request('patch', url, **kwargs)
@@ -0,0 +1,264 @@
+# coding=utf-8
+"""Asynchronous implementation of the Bridge API Interface.
+
+The asynchronous clients use httpx and are meant for headless pipelines
+running many requests from a single event loop.
+"""
+import asyncio
+import importlib.util
+
+import httpx
+
+from geosys.bridge_api.api_abstract import ApiClient
+from geosys.bridge_api.default import (
+    ASYNC_HTTP_MAX_CONNECTIONS,
+    ASYNC_HTTP_POOL_TIMEOUT,
+    ASYNC_HTTP_TIMEOUT,
+    HTTP_POOL_SIZE)
+from geosys.bridge_api.retry import (
+    IDEMPOTENT_METHODS, RateLimiter, retry_after_seconds)
+from geosys.utilities.settings import setting
+from geosys.utilities.utilities import log
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+# HTTP/2 needs the optional h2 package.
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+
+class AsyncApiClient(ApiClient):
+    """Abstract class for asynchronous API Client.
+
+    The request methods are coroutines returning httpx responses. Clients
+    sharing an httpx.AsyncClient share its connection pool, otherwise a
+    client is created on the first request and closed by aclose().
+    """
+
+    def __init__(self, access_token='', endpoint_url='', client=None):
+        """Base class for asynchronous API client.
+
+        :param access_token: The access token.
+        :type access_token: str
+
+        :param endpoint_url: API base url.
+        :type endpoint_url: str
+
+        :param client: Shared HTTP client, owned by the caller.
+        :type client: httpx.AsyncClient
+        """
+        # Concrete clients have their own constructor signature.
+        ApiClient.__init__(self, access_token, endpoint_url)
+        self._client = client
+        self._owns_client = client is None
+
+    @staticmethod
+    def create_client(
+            proxy=None,
+            max_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+            keepalive_connections=HTTP_POOL_SIZE,
+            timeout=None,
+            pool_timeout=None):
+        """Create a pooled HTTP client, using HTTP/2 when available.
+
+        The timeouts default to the async_http_timeout and
+        async_http_pool_timeout settings, so a stalled connection or a
+        full pool fails the request instead of blocking it forever.
+
+        :param proxy: Proxy definition, as set by ApiClient.set_proxy.
+        :type proxy: dict
+
+        :param max_connections: Maximum number of open connections.
+        :type max_connections: int
+
+        :param keepalive_connections: Idle connections kept alive.
+        :type keepalive_connections: int
+
+        :param timeout: Seconds to connect, read and write.
+        :type timeout: float
+
+        :param pool_timeout: Seconds to wait for a pooled connection.
+        :type pool_timeout: float
+
+        :return: The HTTP client.
+        :rtype: httpx.AsyncClient
+        """
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=keepalive_connections)
+        proxy = proxy or {}
+        mounts = {}
+        for protocol in ['http', 'https']:
+            mounts['{}://'.format(protocol)] = httpx.AsyncHTTPTransport(
+                http2=HTTP2_AVAILABLE,
+                limits=limits,
+                proxy=proxy.get(protocol))
+        if timeout is None:
+            timeout = setting(
+                'async_http_timeout', ASYNC_HTTP_TIMEOUT, expected_type=float)
+        if pool_timeout is None:
+            pool_timeout = setting(
+                'async_http_pool_timeout', ASYNC_HTTP_POOL_TIMEOUT,
+                expected_type=float)
+        return httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE, limits=limits, mounts=mounts,
+            timeout=httpx.Timeout(timeout, pool=pool_timeout))
+
+    @property
+    def client(self):
+        """HTTP client sending the requests.
+
+        :rtype: httpx.AsyncClient
+        """
+        if self._client is None:
+            self._client = self.create_client(self.proxy)
+        return self._client
+
+    async def aclose(self):
+        """Close the HTTP client, unless it is shared."""
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(self, method, url, idempotent=None, **kwargs):
+        """Send a request to the API, retrying transient failures.
+
+        Same rate limiting, retry policy and unauthorized request handling
+        as ApiClient.request, waiting without blocking the event loop. The
+        unauthorized_callback is a coroutine function.
+
+        :param method: HTTP method.
+        :type method: str
+
+        :param url: API url.
+        :type url: str
+
+        :param idempotent: Whether the request can be sent twice safely.
+            Defaults to the method semantic.
+        :type idempotent: bool
+
+        :param kwargs: httpx request parameters
+        :type kwargs: dict
+
+        :return: The API response.
+        :rtype: httpx.Response
+        """
+        if kwargs.get('headers'):
+            kwargs['headers'].update(self.headers)
+        if idempotent is None:
+            idempotent = method.lower() in IDEMPOTENT_METHODS
+
+        attempt = 0
+        renewed_token = False
+        while True:
+            attempt += 1
+            await asyncio.sleep(RateLimiter.reserve(url))
+            try:
+                response = await self.client.request(
+                    method.upper(), url, **kwargs)
+            except httpx.TransportError as e:
+                if not self.retry_policy.should_retry(
+                        attempt, idempotent=idempotent,
+                        connection_error=True):
+                    raise
+                delay = self.retry_policy.delay(attempt)
+                reason = str(e)
+            else:
+                if (response.status_code == 401 and not renewed_token and
+                        self.unauthorized_callback is not None):
+                    renewed_token = True
+                    access_token = await self.unauthorized_callback()
+                    if access_token:
+                        self.set_access_token(access_token)
+                        if kwargs.get('headers') is not None:
+                            kwargs['headers'].update(self.headers)
+                        await response.aclose()
+                        continue
+                if not self.retry_policy.should_retry(
+                        attempt, response.status_code, idempotent):
+                    return response
+                delay = self.retry_policy.delay(
+                    attempt,
+                    retry_after_seconds(response.headers.get('Retry-After')))
+                reason = response.status_code
+                await response.aclose()
+            log('{} {} failed ({}), retrying in {:.1f} seconds.'.format(
+                method.upper(), url, reason, delay), info=False, notify=False)
+            await asyncio.sleep(delay)
+
+    async def get(self, url, **kwargs):
+        """Send a get request to the API.
+
+        :param url: API url.
+        :type url: str
+
+        :param kwargs: httpx request parameters
+        :type kwargs: dict
+
+        :return: The API response.
+        :rtype: httpx.Response
+        """
+        return await self.request('get', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        """Send a post request to the API.
+
+        :param url: API url.
+        :type url: str
+
+        :param kwargs: httpx request parameters
+        :type kwargs: dict
+
+        :return: The API response.
+        :rtype: httpx.Response
+        """
+        return await self.request('post', url, **kwargs)
+
+    async def patch(self, url, **kwargs):
+        """Send a patch request to the API.
+
+        :param url: API url.
+        :type url: str
+
+        :param kwargs: httpx request parameters
+        :type kwargs: dict
+
+        :return: The API response.
+        :rtype: httpx.Response
+        """
+        return await self.request('patch', url, **kwargs)
+
+    async def send(self, request):
+        """Send a request built by one of the request methods of a client.
+
+        :param request: Tuple of HTTP method, url and request parameters.
+        :type request: tuple
+
+        :return: The API response.
+        :rtype: httpx.Response
+        """
+        method, url, kwargs = request
+        return await self.request(method, url, **kwargs)
+
+    async def get_content(self, url, params=None, data=None):
+        """Get the response content.
+
+        :param url: API url.
+        :type url: str
+
+        :param params: Request parameters.
+        :type params: str
+
+        :return: Response content.
+        :rtype: bytes
+        """
+        # Thumbnails and other contents are only read.
+        response = await self.post(
+            url,
+            headers=dict(self.headers),
+            params=params,
+            json=data,
+            idempotent=True)
+        return response.content
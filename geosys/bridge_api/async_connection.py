@@ -0,0 +1,70 @@
+# coding=utf-8
+"""Asynchronous implementation of Bridge API connection.
+"""
+from geosys.bridge_api.async_api_abstract import AsyncApiClient
+from geosys.bridge_api.connection import ConnectionAPIClient
+from geosys.bridge_api.default import IDENTITY_URLS
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+
+class AsyncConnectionAPIClient(AsyncApiClient, ConnectionAPIClient):
+    """Asynchronous Connection API Client
+
+    Managing connection/authentication to geosys identity server, with the
+    requests of ConnectionAPIClient.
+
+    """
+
+    def __init__(
+            self, endpoint_url=IDENTITY_URLS['na']['prod'], client=None):
+        super(AsyncConnectionAPIClient, self).__init__(
+            endpoint_url=endpoint_url, client=client)
+
+    async def get_access_token(
+            self, username, password, client_id, client_secret):
+        """Retrieve access token from geosys identity server.
+
+        :param username: Username
+        :type username: str
+
+        :param password: Password
+        :type password: str
+
+        :param client_id: Client ID
+        :type client_id: str
+
+        :param client_secret: Client Secret
+        :type client_secret: str
+
+        :return: JSON response
+        :rtype: dict
+        """
+        response = await self.send(self.access_token_request(
+            username, password, client_id, client_secret))
+
+        return response.json()
+
+    async def refresh_access_token(
+            self, refresh_token, client_id, client_secret):
+        """Exchange a refresh token for a new access token.
+
+        :param refresh_token: Refresh token from a previous token response.
+        :type refresh_token: str
+
+        :param client_id: Client ID
+        :type client_id: str
+
+        :param client_secret: Client Secret
+        :type client_secret: str
+
+        :return: JSON response
+        :rtype: dict
+        """
+        response = await self.send(self.refresh_access_token_request(
+            refresh_token, client_id, client_secret))
+
+        return response.json()
@@ -0,0 +1,141 @@
+# coding=utf-8
+"""Asynchronous implementation of Bridge API field-level-maps endpoint.
+"""
+from geosys.bridge_api.async_api_abstract import AsyncApiClient
+from geosys.bridge_api.default import BRIDGE_URLS
+from geosys.bridge_api.field_level_maps import FieldLevelMapsAPIClient
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+
+class AsyncFieldLevelMapsAPIClient(AsyncApiClient, FieldLevelMapsAPIClient):
+    """Asynchronous Field Level Maps API Client
+
+    Managing field-level-maps request to geosys bridge server, with the
+    requests of FieldLevelMapsAPIClient.
+
+    """
+
+    def __init__(
+            self, access_token, endpoint_url=BRIDGE_URLS['na']['prod'],
+            client=None):
+        """Implementation of asynchronous field-level-maps API client.
+
+        This API call requires access_token from identity server.
+
+        :param access_token: The access token.
+        :type access_token: str
+
+        :param endpoint_url: The API base url.
+        :type endpoint_url: str
+
+        :param client: Shared HTTP client, owned by the caller.
+        :type client: httpx.AsyncClient
+        """
+        super(AsyncFieldLevelMapsAPIClient, self).__init__(
+            access_token, endpoint_url, client=client)
+
+    async def get_catalog_imagery(self, data, filters=None):
+        """Get catalog-imagery based on given parameters.
+
+        :param data: Data passed to the API to get specific coverage.
+        :type data: dict
+
+        :param filters: Filter coverage results.
+        :type filters: dict
+
+        :return: JSON response.
+            List of maps data specification based on given criteria.
+        :rtype: list
+        """
+        response = await self.send(
+            self.catalog_imagery_request(data, filters))
+        return response.json()
+
+    async def get_field_map(
+            self,
+            map_type_key,
+            data,
+            n_planned=1.0,
+            yield_val=None,
+            min_yield_val=None,
+            max_yield_val=None,
+            sample_field_id=None,
+            params=None,
+            zone_count=None,
+    ):
+        """Get requested field map.
+
+        :param map_type_key: Map type key.
+        :type map_type_key: str
+
+        :param data: Map creation data.
+        :type data: dict
+
+        :param params: Map creation parameters.
+        :type params: dict
+
+        :return: JSON response.
+            Map data specification based on given parameters.
+        :rtype: dict
+        """
+        request = self.field_map_request(
+            map_type_key, data, sample_field_id, params, zone_count)
+        if request is None:
+            return {}
+        response = await self.send(request)
+        return response.json()
+
+    async def get_hotspot(self, url, params=None, data=None):
+        """Get zone hotspots.
+
+        :return: JSON response, or the response itself when it failed.
+        :rtype: dict
+        """
+        response = await self.send(self.hotspot_request(url, params, data))
+
+        if response.status_code == 200:
+            return response.json()
+
+        return response
+
+    async def get_rx_map(self, url, request_data, params=None):
+        """Get RX Map data from the server.
+
+        :param request_data: RX map creation data.
+        :type request_data: dict
+
+        :return: JSON response.
+        :rtype: dict
+        """
+        response = await self.send(self.rx_map_request(request_data))
+        return response.json()
+
+    async def patch_rx_map(self, source_map_id, patch_data):
+        """Patch an RX map.
+
+        :return: JSON response.
+        :rtype: dict
+        """
+        response = await self.send(
+            self.patch_rx_map_request(source_map_id, patch_data))
+
+        if response.is_success:
+            return response.json()
+
+        return {}
+
+    async def get_rx_generated(self, url, source_map_id, params=None):
+        """Get a generated RX Map from the server.
+
+        :param source_map_id: ID of the RX map.
+        :type source_map_id: str
+
+        :return: JSON response.
+        :rtype: dict
+        """
+        response = await self.send(self.rx_generated_request(source_map_id))
+        return response.json()
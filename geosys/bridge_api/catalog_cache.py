@@ -0,0 +1,153 @@
+# coding=utf-8
+"""Persistent cache of catalog-imagery responses.
+"""
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from geosys.bridge_api.default import (
+    IMAGE_DATE, CATALOG_CACHE_TTL, CATALOG_CACHE_PAST_TTL)
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+
+class CatalogCache(object):
+    """SQLite store of catalog-imagery responses with a per entry TTL.
+
+    Images of a date range that ended before today do not change anymore,
+    so those responses are kept for past_ttl seconds instead of ttl.
+    A connection is opened per call, the cache can be used from any thread.
+    """
+
+    def __init__(
+            self, path, ttl=CATALOG_CACHE_TTL, past_ttl=CATALOG_CACHE_PAST_TTL):
+        """Constructor.
+
+        :param path: Path of the SQLite database, created when needed.
+        :type path: str
+
+        :param ttl: Lifetime in seconds of a response for a date range
+            including today.
+        :type ttl: int
+
+        :param past_ttl: Lifetime in seconds of a response for a date range
+            in the past.
+        :type past_ttl: int
+        """
+        self.path = path
+        self.ttl = ttl
+        self.past_ttl = past_ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS catalog ('
+                'key TEXT PRIMARY KEY, '
+                'response TEXT NOT NULL, '
+                'expires_at REAL NOT NULL)')
+
+    @contextmanager
+    def connect(self):
+        """Connection to the database, committed and closed on exit.
+
+        :rtype: sqlite3.Connection
+        """
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def key(*parts):
+        """Cache key of a catalog request.
+
+        :param parts: JSON serializable parts of the request, e.g. server,
+            user, geometry, crop, sowing date and filters.
+        :type parts: tuple
+
+        :returns: Hex digest identifying the request.
+        :rtype: str
+        """
+        content = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def ttl_for(self, filters, today=None):
+        """Lifetime of a response, based on the image date filter.
+
+        :param filters: Catalog filters, e.g.
+            {'Image.Date': '$between:2019-01-01|2019-06-01'}
+        :type filters: dict
+
+        :param today: Current date, mostly for tests.
+        :type today: datetime.date
+
+        :returns: Lifetime in seconds.
+        :rtype: int
+        """
+        today = today or datetime.date.today()
+        date_filter = (filters or {}).get(IMAGE_DATE) or ''
+        if ':' not in date_filter:
+            # Open ended, new images may show up at any time.
+            return self.ttl
+        operator, value = date_filter.split(':', 1)
+        if operator == '$between':
+            value = value.split('|')[-1]
+        elif operator not in ('$lte', '$lt'):
+            return self.ttl
+        try:
+            end_date = datetime.datetime.strptime(
+                value.strip()[:10], '%Y-%m-%d').date()
+        except ValueError:
+            return self.ttl
+        return self.past_ttl if end_date < today else self.ttl
+
+    def get(self, key):
+        """Get a response that has not expired yet.
+
+        :param key: Cache key.
+        :type key: str
+
+        :returns: The cached response, None when missing or expired.
+        :rtype: list, None
+        """
+        with self.connect() as connection:
+            row = connection.execute(
+                'SELECT response FROM catalog '
+                'WHERE key = ? AND expires_at > ?',
+                (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, response, ttl):
+        """Store a response.
+
+        :param key: Cache key.
+        :type key: str
+
+        :param response: JSON response.
+        :type response: list
+
+        :param ttl: Lifetime of the response in seconds.
+        :type ttl: int
+        """
+        now = time.time()
+        with self.connect() as connection:
+            connection.execute(
+                'DELETE FROM catalog WHERE expires_at <= ?', (now,))
+            connection.execute(
+                'INSERT OR REPLACE INTO catalog VALUES (?, ?, ?)',
+                (key, json.dumps(response), now + ttl))
+
+    def clear(self):
+        """Remove every cached response."""
+        with self.connect() as connection:
+            connection.execute('DELETE FROM catalog')
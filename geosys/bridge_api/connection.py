@@ -2,7 +2,13 @@
 """Implementation of Bridge API connection.
 """
 from geosys.bridge_api.api_abstract import ApiClient
-from geosys.bridge_api.default import IDENTITY_URLS, GRANT_TYPE, SCOPE
+from geosys.bridge_api.default import (
+    IDENTITY_URLS, GRANT_TYPE, REFRESH_GRANT_TYPE, SCOPE)
+
+# Headers of the identity server token requests.
+FORM_HEADERS = {
+    'content-type': 'application/x-www-form-urlencoded'
+}
 
 __copyright__ = "Copyright 2019, Kartoza"
 __license__ = "GPL version 3"
@@ -31,6 +37,15 @@ class ConnectionAPIClient(ApiClient):
         return '%s/v%s/' % (
             self.endpoint_url, self.VERSION)
 
+    @property
+    def token_url(self):
+        """Url of the token endpoint.
+
+        :return: Token url.
+        :rtype: str
+        """
+        return '{}{}/{}'.format(self.base_url, 'connect', 'token')
+
     def get_access_token(self, username, password, client_id, client_secret):
         """Retrieve access token from geosys identity server.
 
@@ -49,6 +64,18 @@ class ConnectionAPIClient(ApiClient):
         :return: JSON response
         :rtype: dict
         """
+        response = self.send(self.access_token_request(
+            username, password, client_id, client_secret))
+
+        return response.json()
+
+    def access_token_request(
+            self, username, password, client_id, client_secret):
+        """Build the password grant token request.
+
+        :return: Tuple of HTTP method, url and request parameters.
+        :rtype: tuple
+        """
         data = {
             'username': username,
             'password': password,
@@ -57,15 +84,44 @@ class ConnectionAPIClient(ApiClient):
             'grant_type': GRANT_TYPE,
             'scope': SCOPE
         }
+        return 'post', self.token_url, {
+            'headers': dict(FORM_HEADERS), 'data': data, 'timeout': 10}
 
-        headers = {
-            'content-type': 'application/x-www-form-urlencoded'
-        }
+    def refresh_access_token(self, refresh_token, client_id, client_secret):
+        """Exchange a refresh token for a new access token.
 
-        url = '{}{}/{}'.format(self.base_url, 'connect', 'token')
+        The refresh token is issued by the identity server because the
+        password grant requests the `offline_access` scope.
 
-        response = self.post(
-            url,
-            headers=headers, data=data, timeout=10)
+        :param refresh_token: Refresh token from a previous token response.
+        :type refresh_token: str
+
+        :param client_id: Client ID
+        :type client_id: str
+
+        :param client_secret: Client Secret
+        :type client_secret: str
+
+        :return: JSON response
+        :rtype: dict
+        """
+        response = self.send(self.refresh_access_token_request(
+            refresh_token, client_id, client_secret))
 
         return response.json()
+
+    def refresh_access_token_request(
+            self, refresh_token, client_id, client_secret):
+        """Build the refresh token grant request.
+
+        :return: Tuple of HTTP method, url and request parameters.
+        :rtype: tuple
+        """
+        data = {
+            'refresh_token': refresh_token,
+            'client_id': client_id,
+            'client_secret': client_secret,
+            'grant_type': REFRESH_GRANT_TYPE
+        }
+        return 'post', self.token_url, {
+            'headers': dict(FORM_HEADERS), 'data': data, 'timeout': 10}
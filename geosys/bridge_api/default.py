@@ -43,6 +43,49 @@ BRIDGE_URLS = {
     }
 }
 
+# Connections kept alive per host by the Bridge API clients.
+HTTP_POOL_SIZE = 10
+# Retries of a failed Bridge API request, the base delay in seconds (doubled
+# after every attempt, with jitter) and the maximum delay.
+API_RETRIES = 3
+API_BACKOFF = 1
+API_MAX_BACKOFF = 60
+# Status codes retried for idempotent requests. Throttled requests were not
+# processed by the server, so they are retried whatever the method.
+RETRY_STATUS_CODES = (408, 429, 500, 502, 503, 504, 509)
+THROTTLED_STATUS_CODES = (429,)
+# Requests per second sent to a Bridge API host, and the burst allowed.
+API_RATE_LIMIT = 10
+API_RATE_BURST = 20
+# Concurrent connections opened by an asynchronous Bridge API client.
+ASYNC_HTTP_MAX_CONNECTIONS = 100
+# Seconds an asynchronous request waits to connect, read or write, and to
+# get a connection from the pool.
+ASYNC_HTTP_TIMEOUT = 30
+ASYNC_HTTP_POOL_TIMEOUT = 120
+# Concurrent thumbnail requests made by a coverage search.
+THUMBNAIL_MAX_WORKERS = 8
+# Thumbnails kept in memory by the thumbnail cache.
+THUMBNAIL_MEMORY_CACHE_SIZE = 512
+# Size in megabytes of the thumbnails kept on disk by the thumbnail cache.
+THUMBNAIL_DISK_CACHE_SIZE = 100
+# Maps created at the same time by the map creation queue.
+MAP_CREATION_MAX_WORKERS = 4
+# Concurrent hotspot requests of the maps being created.
+HOTSPOT_MAX_WORKERS = 4
+# Retries of an interrupted file download, and the base delay in seconds
+# between them (doubled after every attempt, with jitter).
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_BACKOFF = 2
+# Size in megabytes of the local cache of downloaded map products.
+PRODUCT_CACHE_SIZE = 1024
+# Seconds a catalog-imagery response is cached, for a date range including
+# today and for a date range in the past.
+CATALOG_CACHE_TTL = 60 * 60
+CATALOG_CACHE_PAST_TTL = 30 * 24 * 60 * 60
+# Fields sent in a single catalog-imagery request.
+CATALOG_BATCH_SIZE = 20
+
 HOTSPOT_URL = 'https://hotspots.aws.geosys.com/hotspots-processor'
 
 VEGETATION_ENDPOINT = 'vegetation'
@@ -52,8 +95,23 @@ ELEVATION_ENDPOINT = 'topology-map'
 CLIENT_ID = 'mapproduct_api'
 CLIENT_SECRET = 'mapproduct_api.secret'
 GRANT_TYPE = 'password'
+REFRESH_GRANT_TYPE = 'refresh_token'
 SCOPE = 'openid offline_access'
+# Headers of the JSON requests sent to the field-level-maps API.
+JSON_HEADERS = {
+    'accept': 'application/json',
+    'content-type': 'application/json'
+}
+# Seconds before the reported expiry at which a cached token is refreshed.
+TOKEN_EXPIRY_MARGIN = 60
 MAX_FEATURE_NUMBERS = 10
+# Field geometries can be simplified with a tolerance of this ratio of the
+# sensor resolution, below the pixel size of the maps.
+SIMPLIFY_RESOLUTION_RATIO = 0.5
+# Decimals of the coordinates of simplified geometries, about 0.1 m.
+WKT_PRECISION = 6
+# Approximate length in meters of a degree of latitude.
+METERS_PER_DEGREE = 111320
 DEFAULT_N_PLANNED = 0.01
 DEFAULT_COVERAGE_PERCENT = 100
 
@@ -155,6 +213,8 @@ PNG_KMZ_EXT = '.png.kmz'
 PNG_EXT = '.png'
 TIFF_EXT = '.tiff'
 SHP_EXT = '.shp'
+GPKG_EXT = '.gpkg'
+ZIP_EXT = '.zip'
 KMZ_EXT = '.kmz'
 KML_EXT = '.kml'
 LEGEND_EXT = '.legend.png'
@@ -386,19 +386,22 @@ DIFFERENCE_MAPS = [
 ]
 
 # Sensor definition
+# The resolution is the ground resolution in meters of the products.
 
 DEIMOS = {
     'key': 'DEIMOS',
     'name': 'DEIMOS',
     'description': 'Commercial data at 22 m ground resolution with an '
-                   'approximate 2-day revisit (combined).'
+                   'approximate 2-day revisit (combined).',
+    'resolution': 22
 }
 
 DMC = {
     'key': 'DMC',
     'name': 'DMC',
     'description': 'Images comparable to Landsat in resolution but with '
-                   'higher image intervals.'
+                   'higher image intervals.',
+    'resolution': 22
 }
 
 LANDSAT_8 = {
@@ -406,7 +409,8 @@ LANDSAT_8 = {
     'name': 'LANDSAT_8',
     'description': 'Providing moderate-resolution imagery at 30 meters '
                    'resampled to 15 meters by Geosys. Revisiting every '
-                   '16 days.'
+                   '16 days.',
+    'resolution': 15
 }
 
 LANDSAT_9 = {
@@ -414,7 +418,8 @@ LANDSAT_9 = {
     'name': 'LANDSAT_9',
     'description': 'Providing moderate-resolution imagery at 30 meters '
                    'resampled to 15 meters by Geosys. Revisiting every '
-                   '16 days.'
+                   '16 days.',
+    'resolution': 15
 }
 
 RESOURCESAT2 = {
@@ -423,7 +428,8 @@ RESOURCESAT2 = {
     'description': 'The Linear Imaging Self-Scanning Sensor (LISS-III) '
                    'with 23.5-meter spatial resolution LISS-IV Camera with '
                    '5.8-meter spatial resolution. '
-                   'Revisiting every 24 days.'
+                   'Revisiting every 24 days.',
+    'resolution': 5.8
 }
 
 SENTINEL_2 = {
@@ -433,20 +439,23 @@ SENTINEL_2 = {
                    'Revisiting every 5 days under the same viewing angles. '
                    'Multi-spectral data '
                    'with 13 bands in the visible, near infrared, and short '
-                   'wave infrared part of the spectrum.'
+                   'wave infrared part of the spectrum.',
+    'resolution': 10
 }
 
 ALSAT_1B = {
     'key': 'ALSAT_1B',
     'name': 'ALSAT_1B',
     'description': 'Algeria Satellite-1B with a spatial resolution at 24 m ground '
-    'resolution, up to 3 days of revisit.'}
+    'resolution, up to 3 days of revisit.',
+    'resolution': 24}
 
 GAOFEN = {
     'key': 'GAOFEN',
     'name': 'GAOFEN',
     'description': 'Have respectively a ground resolution equal to 16 meters '
-                   'with a revisited equal to 4 days.'
+                   'with a revisited equal to 4 days.',
+    'resolution': 16
 }
 
 CBERS_4 = {
@@ -455,7 +464,8 @@ CBERS_4 = {
     'description': 'The China-Brazil Earth Resources Satellite Program with '
                    '20 meters spatial resolution and a revisit capacity of '
                    '26 days. Images are available only in Brazil via the '
-                   'Geosys virtual constellation.'
+                   'Geosys virtual constellation.',
+    'resolution': 20
 }
 
 HUANJING = {
@@ -463,7 +473,8 @@ HUANJING = {
     'name': 'HUANJING',
     'description': 'Provides imagery with a ground resolution of 16 meters'
                    'and a revisit interval of approximately 4 days.'
-                   'Suitable for environmental and disaster monitoring.'
+                   'Suitable for environmental and disaster monitoring.',
+    'resolution': 16
 }
 
 SENSORS = [
@@ -4,7 +4,8 @@
 import requests
 
 from geosys.bridge_api.api_abstract import ApiClient
-from geosys.bridge_api.default import BRIDGE_URLS, FIELD_MAPS_API_VERSION
+from geosys.bridge_api.default import (
+    BRIDGE_URLS, FIELD_MAPS_API_VERSION, JSON_HEADERS)
 from geosys.bridge_api.definitions import (
     COLOR_COMPOSITION,
     REFLECTANCE,
@@ -89,20 +90,29 @@ class FieldLevelMapsAPIClient(ApiClient):
             List of maps data specification based on given criteria.
         :rtype: list
         """
+        response = self.send(self.catalog_imagery_request(data, filters))
+        return response.json()
 
-        filters = filters if filters else {}
-        headers = {
-            'accept': 'application/json',
-            'content-type': 'application/json'
-        }
+    def catalog_imagery_request(self, data, filters=None):
+        """Build the catalog-imagery request.
 
-        response = self.post(
-            self.full_url('season-fields', 'catalog-imagery'),
-            headers=headers,
-            params=filters,
-            json=data)
+        :param data: Data passed to the API to get specific coverage.
+        :type data: dict
 
-        return response.json()
+        :param filters: Filter coverage results.
+        :type filters: dict
+
+        :return: Tuple of HTTP method, url and request parameters.
+        :rtype: tuple
+        """
+        filters = filters if filters else {}
+        # The catalog search only reads data, it can be sent again.
+        return 'post', self.full_url('season-fields', 'catalog-imagery'), {
+            'headers': dict(JSON_HEADERS),
+            'params': filters,
+            'json': data,
+            'idempotent': True
+        }
 
     def get_field_map(
             self,
@@ -151,165 +161,127 @@ class FieldLevelMapsAPIClient(ApiClient):
             Map data specification based on given parameters.
         :rtype: dict
         """
+        request = self.field_map_request(
+            map_type_key, data, sample_field_id, params, zone_count)
+        if request is None:
+            return {}
+        return self.send(request).json()
+
+    def field_map_request(
+            self,
+            map_type_key,
+            data,
+            sample_field_id=None,
+            params=None,
+            zone_count=None):
+        """Build the map creation request of a map type.
+
+        :param map_type_key: Map type key.
+        :type map_type_key: str
+
+        :param data: Map creation data.
+        :type data: dict
+
+        :param sample_field_id: Sample map ID, set once the sample map has
+            been created.
+        :type sample_field_id: str
+
+        :param params: Map creation parameters.
+        :type params: dict
+
+        :param zone_count: Number of zones of zoned maps.
+        :type zone_count: int
+
+        :return: Tuple of HTTP method, url and request parameters, or None
+            when no request is needed.
+        :rtype: tuple
+        """
         params = params if params else {}
-        headers = {
-            'accept': 'application/json',
-            'content-type': 'application/json'
-        }
         map_type = get_definition(map_type_key)
-        if map_type:
-            map_type == COLOR_COMPOSITION and params.update({
-                'mapType': COLOR_COMPOSITION['name']
-            })
-            map_family = map_type['map_family']
-            nitrogen_maps = [
-                INSEASONFIELD_AVERAGE_NDVI['key'],
-                INSEASONFIELD_AVERAGE_LAI['key'],
-                INSEASONFIELD_AVERAGE_REVERSE_NDVI['key'],
-                INSEASONFIELD_AVERAGE_REVERSE_LAI['key']
-            ]
-
-            if data:
-                image_id = data['Image']['Id'] if data.get(
-                    'Image', None) else None
-                seasonfield_id = data['SeasonField']['Id'] if data.get(
-                    'SeasonField', None) else None
-            else:
-                image_id = None
-                seasonfield_id = None
-
-            if (map_type['key'] == REFLECTANCE['key']
-                    or map_type['key'] == S2REP['key']):
-                # Reflectance and S2REP maps needs to make use of the
-                # catalog-imagery API
-                full_url = self.full_url(
-                    'maps',
-                    map_family['endpoint'],
-                    map_type['key'],
-                    '?directLinks=true'
-                )
-
-                response = self.post(
-                    full_url,
-                    headers=headers,
-                    params=params,
-                    json=data
-                )
-            elif map_type['key'] in nitrogen_maps:
-                full_url = self.full_url(
-                    'maps',
-                    map_family['endpoint'],
-                    map_type['key'],
-                    '?storeRequest=true&directLinks=true'
-                )
-                if zone_count:
-                    full_url = f'{full_url}&zoning=true&zoneCount={zone_count}'
-
-                response = self.post(
-                    full_url,
-                    headers=headers,
-                    params=params,
-                    json=data
-                )
-            elif map_type['key'] == YVM['key']:
-                full_url = self.full_url(
-                    'maps',
-                    map_family['endpoint'],
-                    map_type['key'],
-                    '?directLinks=true'
-                )
-
-                response = self.post(
-                    full_url,
-                    headers=headers,
-                    params=params,
-                    json=data
-                )
-            elif map_type['key'] == YGM['key']:
-                full_url = self.full_url(
-                    'maps',
-                    map_family['endpoint'],
-                    map_type['key'],
-                    '?directLinks=true'
-                )
-                response = self.post(
-                    full_url,
-                    headers=headers,
-                    params=params,
-                    json=data
-                )
-            elif map_type['key'] == SAMZ['key']:
-                full_url = self.full_url(
-                    'maps',
-                    'management-zones-map',
-                    'SAMZ?storeRequest=true&directLinks=true'
-                )
-
-                response = self.post(
-                    full_url,
-                    headers=headers,
-                    # params=params,
-                    json=data
-                )
-            elif map_type['key'] == SOIL['key']:
-                # Body required by soilmap
-                data = {
-                    "seasonField": {
-                        "geometry": data.get('SeasonField', {}).get('geometry')
-                    }
+        if not map_type:
+            return None
+
+        map_type == COLOR_COMPOSITION and params.update({
+            'mapType': COLOR_COMPOSITION['name']
+        })
+        map_family = map_type['map_family']
+        nitrogen_maps = [
+            INSEASONFIELD_AVERAGE_NDVI['key'],
+            INSEASONFIELD_AVERAGE_LAI['key'],
+            INSEASONFIELD_AVERAGE_REVERSE_NDVI['key'],
+            INSEASONFIELD_AVERAGE_REVERSE_LAI['key']
+        ]
+
+        if map_type['key'] in (
+                REFLECTANCE['key'], S2REP['key'], YVM['key'], YGM['key']):
+            # Reflectance and S2REP maps needs to make use of the
+            # catalog-imagery API
+            full_url = self.full_url(
+                'maps',
+                map_family['endpoint'],
+                map_type['key'],
+                '?directLinks=true'
+            )
+        elif map_type['key'] in nitrogen_maps:
+            full_url = self.full_url(
+                'maps',
+                map_family['endpoint'],
+                map_type['key'],
+                '?storeRequest=true&directLinks=true'
+            )
+            if zone_count:
+                full_url = f'{full_url}&zoning=true&zoneCount={zone_count}'
+        elif map_type['key'] == SAMZ['key']:
+            full_url = self.full_url(
+                'maps',
+                'management-zones-map',
+                'SAMZ?storeRequest=true&directLinks=true'
+            )
+            return 'post', full_url, {
+                'headers': dict(JSON_HEADERS),
+                'json': data
+            }
+        elif map_type['key'] == SOIL['key']:
+            # Body required by soilmap
+            data = {
+                "seasonField": {
+                    "geometry": data.get('SeasonField', {}).get('geometry')
                 }
+            }
 
-                full_url = self.full_url(
-                    'maps',
-                    map_family['endpoint'],
-                    map_type['key'],
-                    '?directLinks=true'
-                )
-
-                response = self.post(
-                    full_url,
-                    headers=headers,
-                    params=params,
-                    json=data
-                )
-            elif map_type['key'] == SAMPLE_MAP['key']:
-                if sample_field_id is None:
-                    full_url = self.full_url(
-                        'maps',
-                        map_family['endpoint'],
-                        map_type['key']
-                    )
-
-                    response = self.post(
-                        full_url,
-                        headers=headers,
-                        params=params,
-                        json=data
-                    )
-                else:
-                    # This returns an empty json object
-                    # This step is required to set up the headers for Sample map
-                    # creation, which is required by the downloading step which
-                    # follows
-                    return {}
-            else:
-                full_url = self.full_url(
-                    'maps',
-                    map_family['endpoint'],
-                    map_type['name'],
-                    '?storeRequest=true&directLinks=true'
-                )
-                if zone_count:
-                    full_url = f'{full_url}&zoning=true&zoneCount={zone_count}'
-                    
-                response = self.post(
-                    f"{full_url}",
-                    headers=headers,
-                    params=params,
-                    json=data
-                )
-            return response.json()
-        return {}
+            full_url = self.full_url(
+                'maps',
+                map_family['endpoint'],
+                map_type['key'],
+                '?directLinks=true'
+            )
+        elif map_type['key'] == SAMPLE_MAP['key']:
+            if sample_field_id is not None:
+                # This returns an empty json object
+                # This step is required to set up the headers for Sample map
+                # creation, which is required by the downloading step which
+                # follows
+                return None
+            full_url = self.full_url(
+                'maps',
+                map_family['endpoint'],
+                map_type['key']
+            )
+        else:
+            full_url = self.full_url(
+                'maps',
+                map_family['endpoint'],
+                map_type['name'],
+                '?storeRequest=true&directLinks=true'
+            )
+            if zone_count:
+                full_url = f'{full_url}&zoning=true&zoneCount={zone_count}'
+
+        return 'post', full_url, {
+            'headers': dict(JSON_HEADERS),
+            'params': params,
+            'json': data
+        }
 
     def get_hotspot(self, url, params=None, data=None):
         """ Actual method to get zone hotspots.
@@ -318,30 +290,41 @@ class FieldLevelMapsAPIClient(ApiClient):
             Map data specification based on given parameters.
         :rtype: dict
         """
-        params = params if params else {}
-        headers = {
-            'accept': 'application/json',
-            'content-type': 'application/json'
-        }
-        if data:
-            response = self.post(
-                url,
-                headers=headers,
-                params=params,
-                json=data,
-            )
-        else:
-            response = self.get(
-                url,
-                headers=headers,
-                params=params
-            )
+        response = self.send(self.hotspot_request(url, params, data))
 
         if response.status_code == 200:
             return response.json()
 
         return response
 
+    @staticmethod
+    def hotspot_request(url, params=None, data=None):
+        """Build the zone hotspots request, a POST when data is given.
+
+        :param url: Hotspots url.
+        :type url: str
+
+        :param params: Request parameters.
+        :type params: dict
+
+        :param data: Hotspots request data.
+        :type data: dict
+
+        :return: Tuple of HTTP method, url and request parameters.
+        :rtype: tuple
+        """
+        params = params if params else {}
+        if data:
+            return 'post', url, {
+                'headers': dict(JSON_HEADERS),
+                'params': params,
+                'json': data
+            }
+        return 'get', url, {
+            'headers': dict(JSON_HEADERS),
+            'params': params
+        }
+
     def get_rx_map(
             self,
             url,
@@ -365,26 +348,26 @@ class FieldLevelMapsAPIClient(ApiClient):
         :return: JSON response.
         :rtype: dict
         """
-        params = params if params else {}
-        headers = {
-            'accept': 'application/json',
-            'content-type': 'application/json'
-        }
+        return self.send(self.rx_map_request(request_data)).json()
+
+    def rx_map_request(self, request_data):
+        """Build the RX map creation request.
+
+        :param request_data: RX map creation data.
+        :type request_data: dict
 
+        :return: Tuple of HTTP method, url and request parameters.
+        :rtype: tuple
+        """
         # Construct the full URL for the RX Map endpoint
         full_url = self.full_url(
             'maps',
             'rx-map?colorMapId=RX&storeRequest=true&directLinks=true&zoning=true&minZoneSize=0.0247'
         )
-
-        # Send the request to the server
-        response = self.post(
-            full_url,
-            headers=headers,
-            json=request_data
-        )
-
-        return response.json()
+        return 'post', full_url, {
+            'headers': dict(JSON_HEADERS),
+            'json': request_data
+        }
 
     def patch_rx_map(self, source_map_id, patch_data):
         """ Actual method to get zone hotspots.
@@ -393,28 +376,36 @@ class FieldLevelMapsAPIClient(ApiClient):
             Map data specification based on given parameters.
         :rtype: dict
         """
-        headers = {
-            'accept': 'application/json',
-            'content-type': 'application/json'
-        }
+        response = self.send(
+            self.patch_rx_map_request(source_map_id, patch_data))
+
+        if response:
+            return response.json()
+
+        return {}
+
+    def patch_rx_map_request(self, source_map_id, patch_data):
+        """Build the RX map patch request.
+
+        :param source_map_id: ID of the RX map.
+        :type source_map_id: str
+
+        :param patch_data: Patch data.
+        :type patch_data: dict
 
+        :return: Tuple of HTTP method, url and request parameters.
+        :rtype: tuple
+        """
         patch_url = self.full_url(
             'maps',
             source_map_id,
             'rx-map'
         )
+        return 'patch', patch_url, {
+            'headers': dict(JSON_HEADERS),
+            'json': patch_data
+        }
 
-        response = self.patch(
-            patch_url,
-            headers=headers,
-            json=patch_data,
-        )
-
-        if response:
-            return response.json()
-
-        return {}
-    
     def get_rx_generated(
             self,
             url,
@@ -432,22 +423,20 @@ class FieldLevelMapsAPIClient(ApiClient):
         :return: JSON response.
         :rtype: dict
         """
-        params = params if params else {}
-        headers = {
-            'accept': 'application/json',
-            'content-type': 'application/json'
-        }
+        return self.send(self.rx_generated_request(source_map_id)).json()
+
+    def rx_generated_request(self, source_map_id):
+        """Build the request of a generated RX map.
+
+        :param source_map_id: ID of the RX map.
+        :type source_map_id: str
 
+        :return: Tuple of HTTP method, url and request parameters.
+        :rtype: tuple
+        """
         # Construct the full URL for the RX Map endpoint
         full_url = self.full_url(
             'maps',
             f'{source_map_id}?directLinks=true'
         )
-
-        # Send the request to the server
-        response = self.get(
-            full_url,
-            headers=headers
-        )
-
-        return response.json()
+        return 'get', full_url, {'headers': dict(JSON_HEADERS)}
@@ -0,0 +1,237 @@
+# coding=utf-8
+"""Retry policy and per host rate limiting of the Bridge API requests.
+"""
+import email.utils
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from geosys.bridge_api.default import (
+    API_BACKOFF, API_MAX_BACKOFF, API_RATE_BURST, API_RATE_LIMIT,
+    API_RETRIES, RETRY_STATUS_CODES, THROTTLED_STATUS_CODES)
+from geosys.utilities.settings import setting
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+# Methods which can be sent again without side effects.
+IDEMPOTENT_METHODS = ('get', 'head', 'options', 'put', 'delete')
+
+
+def retry_after_seconds(value, now=None):
+    """Parse the value of a Retry-After header.
+
+    :param value: Header value, either seconds or an HTTP date.
+    :type value: str
+
+    :param now: Current timestamp, mostly for tests.
+    :type now: float
+
+    :returns: Seconds to wait, None when the value is missing or invalid.
+    :rtype: float
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, date.timestamp() - now)
+
+
+class RetryPolicy(object):
+    """When and how long to wait before sending a failed request again.
+
+    Idempotent requests are retried after a connection error or one of the
+    status_codes. Other requests are only retried when throttled, as the
+    server did not process them. The delay grows exponentially with full
+    jitter, unless the server sent a Retry-After header.
+    """
+
+    def __init__(
+            self,
+            retries=API_RETRIES,
+            backoff=API_BACKOFF,
+            max_backoff=API_MAX_BACKOFF,
+            status_codes=RETRY_STATUS_CODES):
+        """Constructor.
+
+        :param retries: Maximum number of retries of a request.
+        :type retries: int
+
+        :param backoff: Base delay in seconds, doubled after every attempt.
+        :type backoff: float
+
+        :param max_backoff: Maximum delay in seconds.
+        :type max_backoff: float
+
+        :param status_codes: HTTP status codes retried for idempotent
+            requests.
+        :type status_codes: tuple
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.status_codes = status_codes
+
+    def should_retry(
+            self, attempt, status_code=None, idempotent=True,
+            connection_error=False):
+        """Whether a failed attempt is sent again.
+
+        :param attempt: Number of the failed attempt, starting at 1.
+        :type attempt: int
+
+        :param status_code: HTTP status code of the response, if any.
+        :type status_code: int
+
+        :param idempotent: Whether the request can be sent twice safely.
+        :type idempotent: bool
+
+        :param connection_error: Whether no response was received.
+        :type connection_error: bool
+
+        :rtype: bool
+        """
+        if attempt > self.retries:
+            return False
+        if status_code in THROTTLED_STATUS_CODES:
+            return True
+        if not idempotent:
+            return False
+        return connection_error or status_code in self.status_codes
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before the next attempt.
+
+        :param attempt: Number of the failed attempt, starting at 1.
+        :type attempt: int
+
+        :param retry_after: Delay requested by the server.
+        :type retry_after: float
+
+        :rtype: float
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket.
+
+    Tokens are added at rate per second up to capacity. A request reserves a
+    token and waits until the bucket would have held it, so callers can
+    wait the way that suits them (sleep, asyncio or a Qt timer).
+    """
+
+    def __init__(self, rate, capacity):
+        """Constructor.
+
+        :param rate: Tokens added per second.
+        :type rate: float
+
+        :param capacity: Maximum number of tokens, i.e. the burst size.
+        :type capacity: float
+        """
+        self.rate = float(rate)
+        self.capacity = float(max(1, capacity))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token.
+
+        :returns: Seconds to wait before using the token.
+        :rtype: float
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class RateLimiter(object):
+    """Process-wide token buckets of the Bridge API hosts.
+
+    Unless configured, the rate limit is read from the api_rate_limit and
+    api_rate_burst settings by the first request.
+    """
+
+    _lock = threading.Lock()
+    _buckets = {}
+    _rate = None
+    _burst = None
+
+    @classmethod
+    def configure(cls, rate, burst):
+        """Set the rate limit of every host.
+
+        :param rate: Requests per second, 0 disables the rate limiting and
+            None reads it from the settings again.
+        :type rate: float
+
+        :param burst: Requests sent at once before being limited.
+        :type burst: int
+        """
+        with cls._lock:
+            cls._rate = rate
+            cls._burst = burst
+            cls._buckets.clear()
+
+    @classmethod
+    def configure_from_settings(cls, qsettings=None):
+        """Set the rate limit of every host from the user settings.
+
+        :param qsettings: A custom QSettings to use.
+        :type qsettings: qgis.PyQt.QtCore.QSettings
+        """
+        cls.configure(
+            setting(
+                'api_rate_limit', API_RATE_LIMIT, expected_type=float,
+                qsettings=qsettings),
+            setting(
+                'api_rate_burst', API_RATE_BURST, expected_type=int,
+                qsettings=qsettings))
+
+    @classmethod
+    def reserve(cls, url):
+        """Reserve a request to the host of url.
+
+        :param url: Request url.
+        :type url: str
+
+        :returns: Seconds to wait before sending the request.
+        :rtype: float
+        """
+        if cls._rate is None:
+            cls.configure_from_settings()
+        if not cls._rate or cls._rate <= 0:
+            return 0.0
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        with cls._lock:
+            bucket = cls._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(cls._rate, cls._burst)
+                cls._buckets[key] = bucket
+        return bucket.reserve()
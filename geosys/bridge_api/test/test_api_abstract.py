@@ -0,0 +1,78 @@
+# coding=utf-8
+"""Bridge API abstract client test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import unittest
+from unittest import mock
+
+from geosys.bridge_api.api_abstract import ApiClient
+from geosys.bridge_api.connection import ConnectionAPIClient
+from geosys.bridge_api.default import BRIDGE_URLS, IDENTITY_URLS
+from geosys.bridge_api.field_level_maps import FieldLevelMapsAPIClient
+from geosys.utilities.settings import delete_setting, set_setting
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+
+class ApiClientTest(unittest.TestCase):
+    """Test the shared keep-alive sessions of the API clients."""
+
+    def tearDown(self):
+        """Runs after each test."""
+        ApiClient.set_pool_size(None)
+
+    def test_session_shared_per_host(self):
+        """Test clients of the same host share one session."""
+        first = FieldLevelMapsAPIClient('token', BRIDGE_URLS['na']['prod'])
+        second = FieldLevelMapsAPIClient('other', BRIDGE_URLS['na']['prod'])
+        self.assertIs(
+            first.session(first.full_url('season-fields')),
+            second.session(second.full_url('maps')))
+
+    def test_session_per_host(self):
+        """Test clients of different hosts use different sessions."""
+        bridge = FieldLevelMapsAPIClient('token', BRIDGE_URLS['na']['prod'])
+        identity = ConnectionAPIClient(IDENTITY_URLS['na']['prod'])
+        self.assertIsNot(
+            bridge.session(bridge.base_url),
+            identity.session(identity.base_url))
+
+    def test_pool_size(self):
+        """Test the pool size applies to new sessions."""
+        ApiClient.set_pool_size(3)
+        session = ApiClient.session(BRIDGE_URLS['eu']['prod'])
+        adapter = session.get_adapter(BRIDGE_URLS['eu']['prod'])
+        self.assertEqual(adapter._pool_maxsize, 3)
+
+    def test_pool_size_setting(self):
+        """Test the pool size is read from the settings."""
+        set_setting('http_pool_size', 5)
+        try:
+            ApiClient.set_pool_size(None)
+            session = ApiClient.session(BRIDGE_URLS['eu']['prod'])
+        finally:
+            delete_setting('http_pool_size')
+        adapter = session.get_adapter(BRIDGE_URLS['eu']['prod'])
+        self.assertEqual(adapter._pool_maxsize, 5)
+
+    def test_pool_size_keeps_sessions_open(self):
+        """Test sessions in use are not closed by a new pool size."""
+        session = ApiClient.session(BRIDGE_URLS['na']['prod'])
+        with mock.patch.object(session, 'close') as close:
+            ApiClient.set_pool_size(2)
+        close.assert_not_called()
+        self.assertIsNot(
+            ApiClient.session(BRIDGE_URLS['na']['prod']), session)
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ApiClientTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
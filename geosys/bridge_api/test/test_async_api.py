@@ -0,0 +1,195 @@
+# coding=utf-8
+"""Asynchronous Bridge API clients test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import asyncio
+import json
+import unittest
+
+import httpx
+
+from geosys.async_bridge_api_wrapper import AsyncBridgeAPI
+from geosys.bridge_api.async_api_abstract import AsyncApiClient
+from geosys.bridge_api.async_field_level_maps import (
+    AsyncFieldLevelMapsAPIClient)
+from geosys.bridge_api.token_store import TokenStore
+from geosys.bridge_api_wrapper import BridgeAPI
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+
+class AsyncBridgeAPITest(unittest.TestCase):
+    """Test the asynchronous Bridge API clients work."""
+
+    def setUp(self):
+        """Runs before each test."""
+        TokenStore.clear()
+        BridgeAPI._catalog_batch_support.clear()
+        self.requests = []
+        self.tokens = iter(['token'] * 10)
+        self.rejected_tokens = []
+        self.expires_in = 3600
+        self.echo = True
+
+    def tearDown(self):
+        """Runs after each test."""
+        TokenStore.clear()
+        BridgeAPI._catalog_batch_support.clear()
+
+    def handler(self, request):
+        """Mock Bridge API server."""
+        self.requests.append(request)
+        if request.url.path.endswith('/connect/token'):
+            return httpx.Response(200, json={
+                'access_token': next(self.tokens),
+                'expires_in': self.expires_in})
+        token = request.headers.get('authorization', '')[len('Bearer '):]
+        if token in self.rejected_tokens:
+            return httpx.Response(401)
+        if request.url.path.endswith('/thumbnail'):
+            return httpx.Response(200, content=b'thumbnail')
+        if request.url.path.endswith('/catalog-imagery'):
+            season_fields = json.loads(request.content)['seasonFields']
+            return httpx.Response(200, json=[
+                {
+                    'image': {'id': season_field['geometry']},
+                    'seasonField': {
+                        'customerExternalId': season_field.get(
+                            'customerExternalId') if self.echo else None
+                    }
+                } for season_field in season_fields])
+        return httpx.Response(200, json={
+            'authorization': request.headers.get('authorization'),
+            'url': str(request.url)
+        })
+
+    def client(self):
+        """HTTP client sending the requests to the mock server."""
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+    def test_client_timeouts(self):
+        """Test the HTTP client never waits forever."""
+        client = AsyncApiClient.create_client(timeout=5, pool_timeout=7)
+        self.assertEqual(client.timeout.read, 5)
+        self.assertEqual(client.timeout.connect, 5)
+        self.assertEqual(client.timeout.pool, 7)
+        asyncio.run(client.aclose())
+
+        client = AsyncApiClient.create_client()
+        self.assertIsNotNone(client.timeout.read)
+        self.assertIsNotNone(client.timeout.pool)
+        asyncio.run(client.aclose())
+
+    def test_field_level_maps_client(self):
+        """Test the field map request is shared with the sync client."""
+        async def get_field_map():
+            async with self.client() as client:
+                api_client = AsyncFieldLevelMapsAPIClient(
+                    'token', 'https://bridge', client=client)
+                return await api_client.get_field_map(
+                    'NDVI', {'SeasonField': {'geometry': 'POINT (0 0)'}})
+
+        field_map = asyncio.run(get_field_map())
+        self.assertEqual(field_map['authorization'], 'Bearer token')
+        self.assertIn(
+            '/field-level-maps/v5/maps/base-reference-map/NDVI',
+            field_map['url'])
+
+    def test_bridge_api(self):
+        """Test the wrapper authenticates and runs concurrent requests."""
+        async def run():
+            async with self.client() as client:
+                async with AsyncBridgeAPI(
+                        'user', 'password', 'na', 'client', 'secret',
+                        identity_url='https://identity',
+                        server_url='https://bridge',
+                        client=client) as bridge_api:
+                    return await asyncio.gather(
+                        bridge_api.get_catalog_imagery_batch(
+                            ['field_1', 'field_2', 'field_3'], 'CORN',
+                            '2024-01-01', batch_size=2),
+                        bridge_api.get_samz_map('POINT (0 0)', ['image_1']))
+
+        coverages, samz_map = asyncio.run(run())
+        self.assertEqual(
+            [coverage[0]['image']['id'] for coverage in coverages],
+            ['field_1', 'field_2', 'field_3'])
+        self.assertEqual(samz_map['authorization'], 'Bearer token')
+        # One token request and two catalog batches.
+        self.assertEqual(len(self.requests), 4)
+
+    def test_batch_without_echo(self):
+        """Test fields are sent one by one once the server does not echo."""
+        self.echo = False
+
+        async def run():
+            async with self.client() as client:
+                async with self.bridge_api(client) as bridge_api:
+                    return await bridge_api.get_catalog_imagery_batch(
+                        ['field_{}'.format(index) for index in range(5)],
+                        'CORN', '2024-01-01', batch_size=2)
+
+        coverages = asyncio.run(run())
+        self.assertEqual(
+            [coverage[0]['image']['id'] for coverage in coverages],
+            ['field_{}'.format(index) for index in range(5)])
+        # One token request, the first batch and its 2 fields, then the
+        # 3 other fields one by one.
+        self.assertEqual(len(self.requests), 7)
+
+    def bridge_api(self, client):
+        """Asynchronous wrapper using the mock server."""
+        return AsyncBridgeAPI(
+            'user', 'password', 'na', 'client', 'secret',
+            identity_url='https://identity', server_url='https://bridge',
+            client=client)
+
+    def test_token_refreshed(self):
+        """Test an expired token is renewed before the next request."""
+        self.tokens = iter(['token_1', 'token_2', 'token_3'])
+        # Tokens expire within the expiry margin, they are never reused.
+        self.expires_in = 1
+
+        async def run():
+            async with self.client() as client:
+                async with self.bridge_api(client) as bridge_api:
+                    self.assertTrue(
+                        await bridge_api.refresh_authentication())
+                    return await bridge_api.get_samz_map(
+                        'POINT (0 0)', ['image_1'])
+
+        samz_map = asyncio.run(run())
+        self.assertEqual(samz_map['authorization'], 'Bearer token_3')
+
+    def test_rejected_token_renewed(self):
+        """Test a request rejected as unauthorized is sent again once."""
+        self.tokens = iter(['token_1', 'token_2'])
+        self.rejected_tokens = ['token_1']
+
+        async def run():
+            async with self.client() as client:
+                async with self.bridge_api(client) as bridge_api:
+                    return (
+                        await bridge_api.get_content(
+                            'https://bridge/thumbnail'),
+                        bridge_api.headers['authorization'])
+
+        content, authorization = asyncio.run(run())
+        self.assertEqual(content, b'thumbnail')
+        self.assertEqual(authorization, 'Bearer token_2')
+        # Token, rejected thumbnail, new token and thumbnail again.
+        self.assertEqual(len(self.requests), 4)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(AsyncBridgeAPITest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,88 @@
+# coding=utf-8
+"""Catalog-imagery response cache test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from geosys.bridge_api.catalog_cache import CatalogCache
+from geosys.bridge_api_wrapper import BridgeAPI
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+
+class CatalogCacheTest(unittest.TestCase):
+    """Test the catalog-imagery response cache works."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.directory = tempfile.mkdtemp()
+        self.cache = CatalogCache(
+            os.path.join(self.directory, 'catalog.db'), ttl=60, past_ttl=600)
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_put_and_get(self):
+        """Test a stored response is returned until it expires."""
+        key = CatalogCache.key('server', 'user', 'POINT (0 0)', {})
+        self.assertIsNone(self.cache.get(key))
+
+        self.cache.put(key, [{'image': {'id': 'image_1'}}], 60)
+        self.assertEqual(self.cache.get(key), [{'image': {'id': 'image_1'}}])
+
+        self.cache.put(key, [], -1)
+        self.assertIsNone(self.cache.get(key))
+
+    def test_key_per_api_client(self):
+        """Test API clients of the same user do not share responses."""
+        def cached_catalog_imagery(client_id):
+            client = mock.Mock(
+                bridge_server='server', username='user', client_id=client_id)
+            return BridgeAPI._cached_catalog_imagery(
+                client, ['POINT (0 0)'], 'CORN', '2024-01-01', {},
+                self.cache, False)
+
+        _, cache_keys, _ = cached_catalog_imagery('client_1')
+        self.cache.put(cache_keys[0], [{'image': {'id': 'image_1'}}], 60)
+        self.assertEqual(
+            cached_catalog_imagery('client_1')[0],
+            [[{'image': {'id': 'image_1'}}]])
+        self.assertEqual(cached_catalog_imagery('client_2')[0], [None])
+
+    def test_ttl_for(self):
+        """Test past date ranges are kept longer."""
+        today = datetime.date(2020, 6, 1)
+        self.assertEqual(
+            self.cache.ttl_for(
+                {'Image.Date': '$between:2019-01-01|2019-12-31'}, today),
+            600)
+        self.assertEqual(
+            self.cache.ttl_for(
+                {'Image.Date': '$between:2020-01-01|2020-06-01'}, today),
+            60)
+        self.assertEqual(
+            self.cache.ttl_for({'Image.Date': '$lte:2020-05-31'}, today),
+            600)
+        self.assertEqual(
+            self.cache.ttl_for({'Image.Date': '$gte:2019-01-01'}, today), 60)
+        self.assertEqual(self.cache.ttl_for({}, today), 60)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(CatalogCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
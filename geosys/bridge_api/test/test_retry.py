@@ -0,0 +1,147 @@
+# coding=utf-8
+"""Bridge API retry policy test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import unittest
+from unittest import mock
+
+from geosys.bridge_api.api_abstract import ApiClient
+from geosys.bridge_api.retry import (
+    RateLimiter, RetryPolicy, TokenBucket, retry_after_seconds)
+from geosys.utilities.settings import delete_setting, set_setting
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+
+class RetryPolicyTest(unittest.TestCase):
+    """Test the retry policy and the rate limiting work."""
+
+    def tearDown(self):
+        """Runs after each test."""
+        ApiClient.set_retry_policy(RetryPolicy())
+        RateLimiter.configure(None, None)
+
+    def test_retry_after(self):
+        """Test both formats of the Retry-After header are parsed."""
+        self.assertEqual(retry_after_seconds('120'), 120)
+        self.assertEqual(
+            retry_after_seconds(
+                'Wed, 21 Oct 2015 07:28:30 GMT', now=1445412480),
+            30)
+        self.assertIsNone(retry_after_seconds('soon'))
+        self.assertIsNone(retry_after_seconds(None))
+
+    def test_should_retry(self):
+        """Test only idempotent requests are retried, unless throttled."""
+        policy = RetryPolicy(retries=2)
+        self.assertTrue(policy.should_retry(1, 503))
+        self.assertTrue(policy.should_retry(1, connection_error=True))
+        self.assertFalse(policy.should_retry(1, 404))
+        self.assertFalse(policy.should_retry(1, 503, idempotent=False))
+        self.assertTrue(policy.should_retry(1, 429, idempotent=False))
+        self.assertFalse(policy.should_retry(3, 429))
+
+    def test_delay(self):
+        """Test the delay grows with jitter and honours Retry-After."""
+        policy = RetryPolicy(backoff=1, max_backoff=10)
+        for attempt in range(1, 8):
+            self.assertLessEqual(
+                policy.delay(attempt), min(10, 2 ** (attempt - 1)))
+        self.assertEqual(policy.delay(1, retry_after=5), 5)
+        self.assertEqual(policy.delay(1, retry_after=50), 10)
+
+    def test_token_bucket(self):
+        """Test requests wait once the burst is used."""
+        bucket = TokenBucket(rate=10, capacity=2)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+
+    def test_rate_limit_setting(self):
+        """Test the rate limit is read from the settings, 0 disables it."""
+        set_setting('api_rate_limit', 0)
+        try:
+            RateLimiter.configure(None, None)
+            for _ in range(50):
+                self.assertEqual(RateLimiter.reserve('https://host/maps'), 0)
+
+            set_setting('api_rate_limit', 1)
+            set_setting('api_rate_burst', 1)
+            RateLimiter.configure(None, None)
+            self.assertEqual(RateLimiter.reserve('https://host/maps'), 0)
+            self.assertGreater(RateLimiter.reserve('https://host/maps'), 0)
+        finally:
+            delete_setting('api_rate_limit')
+            delete_setting('api_rate_burst')
+
+    def test_client_retries(self):
+        """Test the client retries a throttled request."""
+        ApiClient.set_retry_policy(RetryPolicy(retries=2, backoff=0))
+        RateLimiter.configure(0, 0)
+        throttled = mock.Mock(status_code=429, headers={'Retry-After': '0'})
+        success = mock.Mock(status_code=200, headers={})
+        session = mock.Mock()
+        session.request.side_effect = [throttled, success]
+
+        with mock.patch.object(ApiClient, 'session', return_value=session):
+            response = ApiClient().post('https://host/maps', json={})
+
+        self.assertIs(response, success)
+        self.assertEqual(session.request.call_count, 2)
+
+    def test_client_renews_rejected_token(self):
+        """Test an unauthorized request is sent once with a new token."""
+        RateLimiter.configure(0, 0)
+        unauthorized = mock.Mock(status_code=401, headers={})
+        success = mock.Mock(status_code=200, headers={})
+        session = mock.Mock()
+        session.request.side_effect = [unauthorized, success]
+        client = ApiClient('expired')
+        client.unauthorized_callback = mock.Mock(return_value='renewed')
+
+        with mock.patch.object(ApiClient, 'session', return_value=session):
+            response = client.post(
+                'https://host/maps', headers=client.headers, json={})
+
+        self.assertIs(response, success)
+        self.assertEqual(client.headers['authorization'], 'Bearer renewed')
+        self.assertEqual(
+            session.request.call_args[1]['headers']['authorization'],
+            'Bearer renewed')
+
+        session.request.side_effect = None
+        session.request.return_value = unauthorized
+        with mock.patch.object(ApiClient, 'session', return_value=session):
+            response = client.post('https://host/maps', json={})
+        self.assertIs(response, unauthorized)
+        self.assertEqual(client.unauthorized_callback.call_count, 2)
+
+    def test_client_does_not_retry_post(self):
+        """Test a failed map creation request is not sent twice."""
+        ApiClient.set_retry_policy(RetryPolicy(retries=2, backoff=0))
+        RateLimiter.configure(0, 0)
+        failed = mock.Mock(status_code=503, headers={})
+        session = mock.Mock()
+        session.request.return_value = failed
+
+        with mock.patch.object(ApiClient, 'session', return_value=session):
+            response = ApiClient().post('https://host/maps', json={})
+            self.assertIs(response, failed)
+            self.assertEqual(session.request.call_count, 1)
+
+            ApiClient().post('https://host/catalog', idempotent=True)
+            self.assertEqual(session.request.call_count, 4)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(RetryPolicyTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,132 @@
+# coding=utf-8
+"""Bridge API token store test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+from geosys.bridge_api.token_store import TokenStore
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+IDENTITY_SERVER = 'http://localhost:5000'
+
+
+class TokenStoreTest(unittest.TestCase):
+    """Test the process-wide token store works."""
+
+    def setUp(self):
+        """Runs before each test."""
+        TokenStore.clear()
+        patcher = mock.patch(
+            'geosys.bridge_api.token_store.ConnectionAPIClient')
+        self.client_class = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = self.client_class.return_value
+        self.client.proxy = {}
+
+    def tearDown(self):
+        """Runs after each test."""
+        TokenStore.clear()
+
+    def test_token_is_reused(self):
+        """Test a warm token does not call the identity server."""
+        self.client.get_access_token.return_value = {
+            'access_token': 'token',
+            'refresh_token': 'refresh',
+            'expires_in': 3600
+        }
+        for _ in range(3):
+            response = TokenStore.get_token(
+                IDENTITY_SERVER, 'test', 'test', 'test', 'test.secret')
+            self.assertEqual(response['access_token'], 'token')
+        self.assertEqual(self.client.get_access_token.call_count, 1)
+
+    def test_expired_token_is_refreshed(self):
+        """Test an expired token is renewed with the refresh token."""
+        self.client.get_access_token.return_value = {
+            'access_token': 'token',
+            'refresh_token': 'refresh',
+            'expires_in': 0
+        }
+        self.client.refresh_access_token.return_value = {
+            'access_token': 'new_token',
+            'expires_in': 3600
+        }
+        TokenStore.get_token(
+            IDENTITY_SERVER, 'test', 'test', 'test', 'test.secret')
+        response = TokenStore.get_token(
+            IDENTITY_SERVER, 'test', 'test', 'test', 'test.secret')
+
+        self.assertEqual(response['access_token'], 'new_token')
+        self.assertEqual(response['refresh_token'], 'refresh')
+        self.client.refresh_access_token.assert_called_once_with(
+            'refresh', 'test', 'test.secret')
+        self.assertEqual(self.client.get_access_token.call_count, 1)
+
+    def test_changed_password_requests_new_token(self):
+        """Test a different password does not reuse the cached token."""
+        self.client.get_access_token.return_value = {
+            'access_token': 'token',
+            'expires_in': 3600
+        }
+        TokenStore.get_token(
+            IDENTITY_SERVER, 'test', 'test', 'test', 'test.secret')
+        TokenStore.get_token(
+            IDENTITY_SERVER, 'test', 'other', 'test', 'test.secret')
+        self.assertEqual(self.client.get_access_token.call_count, 2)
+
+    def test_failed_authentication_is_not_cached(self):
+        """Test an error response is not kept in the store."""
+        self.client.get_access_token.return_value = {
+            'error': 'invalid_request'
+        }
+        TokenStore.get_token(
+            IDENTITY_SERVER, 'test', 'test', 'test', 'test.secret')
+        TokenStore.get_token(
+            IDENTITY_SERVER, 'test', 'test', 'test', 'test.secret')
+        self.assertEqual(self.client.get_access_token.call_count, 2)
+
+    def test_concurrent_coroutines_share_token(self):
+        """Test coroutines with a cold cache request a single token."""
+        api_client = mock.Mock(endpoint_url=IDENTITY_SERVER)
+
+        async def get_access_token(*args):
+            await asyncio.sleep(0.01)
+            return {'access_token': 'token', 'expires_in': 3600}
+
+        api_client.get_access_token.side_effect = get_access_token
+
+        async def get_tokens():
+            return await asyncio.gather(*[
+                TokenStore.get_token_async(
+                    api_client, 'test', 'test', 'test', 'test.secret')
+                for _ in range(5)])
+
+        loop = asyncio.new_event_loop()
+        try:
+            asyncio.set_event_loop(loop)
+            responses = loop.run_until_complete(get_tokens())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+        self.assertEqual(
+            [response['access_token'] for response in responses],
+            ['token'] * 5)
+        self.assertEqual(api_client.get_access_token.call_count, 1)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TokenStoreTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,78 @@
+# coding=utf-8
+"""Bridge API utilities test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import unittest
+
+from geosys.bridge_api import definitions
+from geosys.bridge_api.definitions import (
+    ARCHIVE_MAP_PRODUCTS, DIFFERENCE_NDVI, NDVI, SAMPLE_MAP, SENTINEL_2,
+    ALL_SENSORS, base_reference_map, samplemap)
+from geosys.bridge_api.utilities import get_definition, registry
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+
+def scan_definition(keyword, key=None):
+    """Reference lookup walking the definitions module."""
+    for item in dir(definitions):
+        if not item.startswith("__"):
+            var = getattr(definitions, item)
+            if isinstance(var, dict):
+                if var.get('key') == keyword or var.get(key) == keyword:
+                    return var
+    return None
+
+
+class DefinitionRegistryTest(unittest.TestCase):
+    """Test the definition registry works."""
+
+    def test_get_definition(self):
+        """Test get_definition matches the module scan."""
+        for map_product in ARCHIVE_MAP_PRODUCTS:
+            self.assertIs(
+                get_definition(map_product['key']),
+                scan_definition(map_product['key']))
+            self.assertIs(
+                get_definition(map_product['name'], 'name'),
+                scan_definition(map_product['name'], 'name'))
+        # The map product is found before the map family with the same key.
+        self.assertIs(get_definition('samplemap'), SAMPLE_MAP)
+        self.assertIs(
+            get_definition('difference-map', 'endpoint'),
+            scan_definition('difference-map', 'endpoint'))
+        self.assertIsNone(get_definition('unknown'))
+        self.assertIsNone(get_definition(['unhashable']))
+
+    def test_lookup_api(self):
+        """Test the lookups of each group of definitions."""
+        self.assertIs(registry.map_product('NDVI'), NDVI)
+        self.assertIs(registry.map_product('SAMPLEMAP'), SAMPLE_MAP)
+        self.assertIsNone(registry.map_product('DIFFERENCE_NDVI'))
+        self.assertIs(
+            registry.map_family('base-reference-map'), base_reference_map)
+        self.assertIs(registry.map_family('samplemap'), samplemap)
+        self.assertIs(registry.sensor('SENTINEL_2'), SENTINEL_2)
+        self.assertIs(registry.sensor('ALL SENSORS'), ALL_SENSORS)
+        self.assertIs(
+            registry.difference_map('DIFFERENCE_NDVI'), DIFFERENCE_NDVI)
+        self.assertIsNone(registry.sensor('NDVI'))
+
+    def test_registry_is_read_only(self):
+        """Test the registry index cannot be modified."""
+        with self.assertRaises(TypeError):
+            registry._index[('key', 'NEW')] = (0, {})
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DefinitionRegistryTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,266 @@
+# coding=utf-8
+"""Process-wide store of Bridge API access tokens.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+import weakref
+
+from geosys.bridge_api.connection import ConnectionAPIClient
+from geosys.bridge_api.default import TOKEN_EXPIRY_MARGIN
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+
+class TokenStore(object):
+    """Shared cache of access tokens keyed by identity server and client.
+
+    Tokens are reused until they are about to expire, then renewed with the
+    refresh token. The password grant is only used when no token is cached
+    or the refresh fails.
+    """
+
+    _lock = threading.Lock()
+    _key_locks = {}
+    # Locks of the coroutines, per event loop as asyncio locks are bound to
+    # their loop.
+    _async_key_locks = weakref.WeakKeyDictionary()
+    _tokens = {}
+
+    @staticmethod
+    def _password_digest(password):
+        """Digest of the password, used to detect changed credentials.
+
+        :param password: Password
+        :type password: str
+
+        :return: Hex digest of the password.
+        :rtype: str
+        """
+        return hashlib.sha256((password or '').encode('utf-8')).hexdigest()
+
+    @classmethod
+    def _key_lock(cls, key):
+        """Lock serializing token requests for a single key.
+
+        :param key: Token store key.
+        :type key: tuple
+
+        :return: The lock of the key.
+        :rtype: threading.Lock
+        """
+        with cls._lock:
+            return cls._key_locks.setdefault(key, threading.Lock())
+
+    @classmethod
+    def _async_key_lock(cls, key):
+        """Lock serializing the token requests of coroutines for a key.
+
+        :param key: Token store key.
+        :type key: tuple
+
+        :return: The lock of the key in the running event loop.
+        :rtype: asyncio.Lock
+        """
+        loop = asyncio.get_event_loop()
+        with cls._lock:
+            locks = cls._async_key_locks.setdefault(loop, {})
+            if key not in locks:
+                locks[key] = asyncio.Lock()
+            return locks[key]
+
+    @classmethod
+    def get_token(
+            cls,
+            identity_server,
+            username,
+            password,
+            client_id,
+            client_secret,
+            proxy=None):
+        """Get a valid access token, requesting one only when needed.
+
+        :param identity_server: Identity server url.
+        :type identity_server: str
+
+        :param username: Username
+        :type username: str
+
+        :param password: Password
+        :type password: str
+
+        :param client_id: Client ID
+        :type client_id: str
+
+        :param client_secret: Client Secret
+        :type client_secret: str
+
+        :param proxy: Proxy definition used by requests.
+        :type proxy: dict
+
+        :return: JSON token response, either cached or from the server.
+        :rtype: dict
+        """
+        key = (identity_server, username, client_id)
+        password_digest = cls._password_digest(password)
+
+        with cls._key_lock(key):
+            entry = cls._entry(key, password_digest)
+            if entry and entry['expires_at'] > time.time():
+                return entry['response']
+
+            api_client = ConnectionAPIClient(identity_server)
+            api_client.proxy.update(proxy or {})
+
+            response = {}
+            if entry and entry['response'].get('refresh_token'):
+                try:
+                    response = api_client.refresh_access_token(
+                        entry['response']['refresh_token'],
+                        client_id,
+                        client_secret)
+                except ValueError:
+                    # Identity server did not reply with JSON.
+                    response = {}
+
+            if not response.get('access_token'):
+                response = api_client.get_access_token(
+                    username, password, client_id, client_secret)
+
+            return cls._store(key, password_digest, entry, response)
+
+    @classmethod
+    async def get_token_async(
+            cls,
+            api_client,
+            username,
+            password,
+            client_id,
+            client_secret):
+        """Coroutine counterpart of get_token sharing the same tokens.
+
+        :param api_client: Asynchronous client of the identity server.
+        :type api_client: AsyncConnectionAPIClient
+
+        :param username: Username
+        :type username: str
+
+        :param password: Password
+        :type password: str
+
+        :param client_id: Client ID
+        :type client_id: str
+
+        :param client_secret: Client Secret
+        :type client_secret: str
+
+        :return: JSON token response, either cached or from the server.
+        :rtype: dict
+        """
+        key = (api_client.endpoint_url, username, client_id)
+        password_digest = cls._password_digest(password)
+
+        # Concurrent coroutines wait for the first one to get the token.
+        async with cls._async_key_lock(key):
+            entry = cls._entry(key, password_digest)
+            if entry and entry['expires_at'] > time.time():
+                return entry['response']
+
+            response = {}
+            if entry and entry['response'].get('refresh_token'):
+                try:
+                    response = await api_client.refresh_access_token(
+                        entry['response']['refresh_token'],
+                        client_id,
+                        client_secret)
+                except ValueError:
+                    # Identity server did not reply with JSON.
+                    response = {}
+
+            if not response.get('access_token'):
+                response = await api_client.get_access_token(
+                    username, password, client_id, client_secret)
+
+            with cls._key_lock(key):
+                return cls._store(key, password_digest, entry, response)
+
+    @classmethod
+    def _entry(cls, key, password_digest):
+        """Cached entry of a key, unless the password changed since.
+
+        :param key: Token store key.
+        :type key: tuple
+
+        :param password_digest: Digest of the current password.
+        :type password_digest: str
+
+        :return: The entry, possibly expired, or None.
+        :rtype: dict
+        """
+        entry = cls._tokens.get(key)
+        if entry and entry['password_digest'] != password_digest:
+            return None
+        return entry
+
+    @classmethod
+    def _store(cls, key, password_digest, entry, response):
+        """Cache a token response, or forget the key if it has no token.
+
+        :param key: Token store key.
+        :type key: tuple
+
+        :param password_digest: Digest of the current password.
+        :type password_digest: str
+
+        :param entry: Previous entry of the key.
+        :type entry: dict
+
+        :param response: JSON token response.
+        :type response: dict
+
+        :return: The token response.
+        :rtype: dict
+        """
+        if response.get('access_token'):
+            if entry and not response.get('refresh_token'):
+                # Servers may not rotate the refresh token.
+                response['refresh_token'] = (
+                    entry['response'].get('refresh_token'))
+            expires_in = response.get('expires_in') or 0
+            cls._tokens[key] = {
+                'response': response,
+                'password_digest': password_digest,
+                'expires_at': (
+                    time.time() + float(expires_in) -
+                    TOKEN_EXPIRY_MARGIN)
+            }
+        else:
+            cls._tokens.pop(key, None)
+
+        return response
+
+    @classmethod
+    def invalidate(cls, identity_server, username, client_id):
+        """Forget the cached token, e.g. after the server rejected it.
+
+        :param identity_server: Identity server url.
+        :type identity_server: str
+
+        :param username: Username
+        :type username: str
+
+        :param client_id: Client ID
+        :type client_id: str
+        """
+        with cls._lock:
+            cls._tokens.pop((identity_server, username, client_id), None)
+
+    @classmethod
+    def clear(cls):
+        """Forget every cached token."""
+        with cls._lock:
+            cls._tokens.clear()
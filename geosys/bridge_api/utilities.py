@@ -1,6 +1,8 @@
 # coding=utf-8
 """This module contains utilities used by Bridge API Interface.
 """
+from types import MappingProxyType
+
 from geosys.bridge_api import definitions
 
 __copyright__ = "Copyright 2019, Kartoza"
@@ -9,6 +11,184 @@ __email__ = "rohmat@kartoza.com"
 __revision__ = "$Format:%H$"
 
 
+def _is_hashable(value):
+    """Check whether a definition value can be used as an index key.
+
+    :param value: Any definition value.
+    :type value: object
+
+    :rtype: bool
+    """
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _index_by(definition_list, field):
+    """Read only mapping of definitions by one of their fields.
+
+    The first definition wins when several share the same value.
+
+    :param definition_list: List of definitions.
+    :type definition_list: list
+
+    :param field: Definition field, e.g. 'key' or 'name'.
+    :type field: str
+
+    :rtype: MappingProxyType
+    """
+    index = {}
+    for definition in definition_list:
+        if field in definition:
+            index.setdefault(definition[field], definition)
+    return MappingProxyType(index)
+
+
+class DefinitionRegistry(object):
+    """Read only index of the definitions of a module.
+
+    Every dict of the module is indexed once by each of its hashable fields,
+    so any lookup is a dictionary access. Definitions are visited in dir()
+    order, matching the behaviour of the former attribute scan.
+    """
+
+    def __init__(self, module):
+        """Constructor.
+
+        :param module: Module holding the definitions.
+        :type module: module
+        """
+        all_definitions = []
+        index = {}
+        for item in dir(module):
+            if item.startswith('__'):
+                continue
+            var = getattr(module, item)
+            if not isinstance(var, dict):
+                continue
+            position = len(all_definitions)
+            all_definitions.append(var)
+            for field, value in var.items():
+                if _is_hashable(value):
+                    index.setdefault((field, value), (position, var))
+        self._index = MappingProxyType(index)
+        self._definitions = tuple(all_definitions)
+
+        difference_maps = getattr(module, 'DIFFERENCE_MAPS', [])
+        map_products = [
+            var for var in all_definitions
+            if 'map_family' in var and var not in difference_maps]
+        map_families = [
+            var for var in all_definitions
+            if 'endpoint' in var and 'map_family' not in var]
+        sensors = list(getattr(module, 'SENSORS', []))
+        if hasattr(module, 'ALL_SENSORS'):
+            sensors.append(module.ALL_SENSORS)
+
+        self._collections = MappingProxyType({
+            'map_product': self._collection(map_products),
+            'map_family': self._collection(map_families),
+            'sensor': self._collection(sensors),
+            'difference_map': self._collection(difference_maps)
+        })
+
+    @staticmethod
+    def _collection(definition_list):
+        """Indexes of a group of definitions by key and by name.
+
+        :param definition_list: List of definitions.
+        :type definition_list: list
+
+        :rtype: tuple
+        """
+        return (
+            _index_by(definition_list, 'key'),
+            _index_by(definition_list, 'name'))
+
+    def get(self, keyword, key=None):
+        """Get the definition whose key, or given field, equals keyword.
+
+        :param keyword: A keyword key.
+        :type keyword: str
+
+        :param key: A specific field for a deeper search
+        :type key: str
+
+        :returns: The matched definition, otherwise None.
+        :rtype: dict, None
+        """
+        if not _is_hashable(keyword):
+            return None
+        matches = [self._index.get(('key', keyword))]
+        if key is not None:
+            matches.append(self._index.get((key, keyword)))
+        matches = [match for match in matches if match]
+        if not matches:
+            return None
+        return min(matches, key=lambda match: match[0])[1]
+
+    def _lookup(self, collection, keyword):
+        """Look a keyword up by key, then by name, in a collection.
+
+        :param collection: Collection name.
+        :type collection: str
+
+        :param keyword: Key or name of the definition.
+        :type keyword: str
+
+        :returns: The matched definition, otherwise None.
+        :rtype: dict, None
+        """
+        by_key, by_name = self._collections[collection]
+        return by_key.get(keyword) or by_name.get(keyword)
+
+    def map_product(self, keyword):
+        """Get a map product definition from its key or name.
+
+        :param keyword: Key or name of the map product, e.g. 'NDVI'.
+        :type keyword: str
+
+        :rtype: dict, None
+        """
+        return self._lookup('map_product', keyword)
+
+    def map_family(self, keyword):
+        """Get a map family definition from its key.
+
+        :param keyword: Key of the map family, e.g. 'base-reference-map'.
+        :type keyword: str
+
+        :rtype: dict, None
+        """
+        return self._lookup('map_family', keyword)
+
+    def sensor(self, keyword):
+        """Get a sensor definition from its key or name.
+
+        :param keyword: Key or name of the sensor, e.g. 'SENTINEL_2'.
+        :type keyword: str
+
+        :rtype: dict, None
+        """
+        return self._lookup('sensor', keyword)
+
+    def difference_map(self, keyword):
+        """Get a difference map definition from its key or name.
+
+        :param keyword: Key or name of the difference map.
+        :type keyword: str
+
+        :rtype: dict, None
+        """
+        return self._lookup('difference_map', keyword)
+
+
+# Built once, on import.
+registry = DefinitionRegistry(definitions)
+
+
 def get_definition(keyword, key=None):
     """Given a keyword and a key (optional), try to get a definition
     dict for it.
@@ -23,11 +203,4 @@ def get_definition(keyword, key=None):
         from definitions, otherwise None if no match was found.
     :rtype: dict, None
     """
-
-    for item in dir(definitions):
-        if not item.startswith("__"):
-            var = getattr(definitions, item)
-            if isinstance(var, dict):
-                if var.get('key') == keyword or var.get(key) == keyword:
-                    return var
-    return None
+    return registry.get(keyword, key)
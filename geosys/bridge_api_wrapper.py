@@ -2,10 +2,11 @@
 """Implementation of Bridge API Wrapper.
 """
 from geosys.bridge_api.api_abstract import ApiClient
-from geosys.bridge_api.connection import ConnectionAPIClient
-from geosys.bridge_api.default import IDENTITY_URLS, BRIDGE_URLS, ALL_REGIONS
+from geosys.bridge_api.default import (
+    IDENTITY_URLS, BRIDGE_URLS, ALL_REGIONS, CATALOG_BATCH_SIZE)
 from geosys.bridge_api.definitions import CROPS, SAMZ, OM, YVM, YGM
 from geosys.bridge_api.field_level_maps import FieldLevelMapsAPIClient
+from geosys.bridge_api.token_store import TokenStore
 from geosys.bridge_api.utilities import get_definition
 
 from geosys.bridge_api.definitions import (
@@ -76,6 +77,10 @@ class MapProduct(object):
 class BridgeAPI(ApiClient):
     """Wrapper client for bridge api."""
 
+    # Whether the catalog of a server echoes the customerExternalId of the
+    # fields of a batch, per bridge server. Unknown until a batch tells.
+    _catalog_batch_support = {}
+
     def __init__(
             self,
             username,
@@ -123,21 +128,49 @@ class BridgeAPI(ApiClient):
             self.set_proxy(*proxies)
 
         # create server url
-        self.identity_server = (IDENTITY_URLS[self.region]['test']
-                                if self.use_testing_service
-                                else identity_url or IDENTITY_URLS[self.region]['prod'])
-        self.bridge_server = (server_url or BRIDGE_URLS[self.region]['test']
-                              if self.use_testing_service
-                              else server_url or BRIDGE_URLS[self.region]['prod'])
+        self.identity_server, self.bridge_server = self.server_urls(
+            region, use_testing_service, identity_url, server_url)
 
         # authenticate user
         self.authenticated, self.authentication_message = self.authenticate()
 
         if self.authenticated:
+            # Re-initialising resets the proxy, keep the one already set.
+            proxy = self.proxy
             super(BridgeAPI, self).__init__(access_token=self.access_token)
+            self.proxy = proxy
+            self.unauthorized_callback = self.renew_access_token
         else:
             raise AuthenticationError(self.authentication_message)
 
+    @staticmethod
+    def server_urls(
+            region, use_testing_service, identity_url=None, server_url=None):
+        """Identity and bridge server urls of a region.
+
+        :param region: Region of fields.
+        :type region: str
+
+        :param use_testing_service: Testing service flag.
+        :type use_testing_service: bool
+
+        :param identity_url: Custom identity server url.
+        :type identity_url: str
+
+        :param server_url: Custom bridge server url.
+        :type server_url: str
+
+        :return: Tuple of identity server and bridge server urls.
+        :rtype: tuple
+        """
+        identity_server = (IDENTITY_URLS[region]['test']
+                           if use_testing_service
+                           else identity_url or IDENTITY_URLS[region]['prod'])
+        bridge_server = (server_url or BRIDGE_URLS[region]['test']
+                         if use_testing_service
+                         else server_url or BRIDGE_URLS[region]['prod'])
+        return identity_server, bridge_server
+
     @staticmethod
     def get_crops():
         """Get default crops.
@@ -159,6 +192,48 @@ class BridgeAPI(ApiClient):
             regions.append((region['key'], region['description']))
         return regions
 
+    def field_level_maps_client(self):
+        """Field level maps client sharing this wrapper's token and proxy.
+
+        :return: Field level maps API client.
+        :rtype: FieldLevelMapsAPIClient
+        """
+        # Long batches outlive a token, it is renewed before it expires.
+        self.refresh_authentication()
+        api_client = FieldLevelMapsAPIClient(
+            self.access_token, self.bridge_server)
+        api_client.proxy.update(self.proxy)
+        api_client.unauthorized_callback = self.renew_access_token
+        return api_client
+
+    def refresh_authentication(self):
+        """Get the access token from the token store again.
+
+        The identity server is only called when the cached token is about
+        to expire. The headers are updated in place, so downloads using
+        them get the new token.
+
+        :return: Whether a valid access token is available.
+        :rtype: bool
+        """
+        self.authenticated, self.authentication_message = (
+            self.authenticate())
+        if self.authenticated:
+            self.set_access_token(self.access_token)
+        return self.authenticated
+
+    def renew_access_token(self):
+        """Replace an access token rejected by the server.
+
+        :return: The new access token, None when authentication failed.
+        :rtype: str
+        """
+        TokenStore.invalidate(
+            self.identity_server, self.username, self.client_id)
+        if self.refresh_authentication():
+            return self.access_token
+        return None
+
     def authenticate(self):
         """Authenticate user using given credentials.
 
@@ -166,12 +241,15 @@ class BridgeAPI(ApiClient):
         :rtype: tuple
         """
         try:
-            api_client = ConnectionAPIClient(self.identity_server)
-            response = api_client.get_access_token(
+            # Tokens are shared by every client in the process, so the
+            # identity server is only called when the cached one expires.
+            response = TokenStore.get_token(
+                self.identity_server,
                 self.username,
                 self.password,
                 self.client_id,
-                self.client_secret)
+                self.client_secret,
+                proxy=self.proxy)
             if response.get('access_token'):
                 self.access_token = response['access_token']
                 message = 'Authentication succeeded.'
@@ -186,7 +264,9 @@ class BridgeAPI(ApiClient):
             message = 'Please enter a correct region (NA or EU)'
             return False, message
 
-    def get_catalog_imagery(self, geometry, crop, sowing_date, filters=None):
+    def get_catalog_imagery(
+            self, geometry, crop, sowing_date, filters=None, cache=None,
+            refresh=False):
         """Get catalog imagery for given parameters.
 
         :param geometry: A geometry in WKT format.
@@ -205,28 +285,253 @@ class BridgeAPI(ApiClient):
             }
         :type filters: dict
 
+        :param cache: Optional cache of the catalog responses.
+        :type cache: CatalogCache
+
+        :param refresh: Query the catalog even when the cache holds a
+            response, the cache is then updated.
+        :type refresh: bool
+
         :return: JSON response.
             List of maps data specification based on given criteria.
         :rtype: list
         """
-        # Construct parameter
+        return self.get_catalog_imagery_batch(
+            [geometry], crop, sowing_date, filters=filters, cache=cache,
+            refresh=refresh)[0]
 
-        request_data = {
-            "seasonFields": [
-                {
-                    "geometry": geometry,
-                    "crop": crop,
-                    "sowingDate": sowing_date,
-                }
-            ]
-        }
+    def get_catalog_imagery_batch(
+            self, geometries, crop, sowing_date, filters=None, cache=None,
+            refresh=False, batch_size=CATALOG_BATCH_SIZE):
+        """Get catalog imagery of many fields with few requests.
 
-        api_client = FieldLevelMapsAPIClient(
-            self.access_token, self.bridge_server)
-        coverages_json = api_client.get_catalog_imagery(
-            request_data, filters=filters)
+        Up to batch_size fields are sent in the seasonFields array of a
+        single request. Each field is tagged with its position in the batch
+        as customerExternalId, which is used to split the results back per
+        field. A batch failing as a whole, or returning results that cannot
+        be matched to a field, is requested again one field at a time. A
+        server found not to echo the tag is then only sent single fields.
+
+        :param geometries: Geometries of the fields in WKT format.
+        :type geometries: list
+
+        :param crop: Crop type.
+        :type crop: str
+
+        :param sowing_date: Sowing date. YYYY-MM-DD
+        :type sowing_date: str
 
-        return coverages_json
+        :param filters: Filter coverage results.
+        :type filters: dict
+
+        :param cache: Optional cache of the catalog responses, per field.
+        :type cache: CatalogCache
+
+        :param refresh: Query the catalog even when the cache holds a
+            response, the cache is then updated.
+        :type refresh: bool
+
+        :param batch_size: Maximum number of fields per request.
+        :type batch_size: int
+
+        :return: JSON response of every field, in the order of geometries.
+            Either a list of maps data specification or an error dict.
+        :rtype: list
+        """
+        responses, cache_keys, missing = self._cached_catalog_imagery(
+            geometries, crop, sowing_date, filters, cache, refresh)
+
+        start = 0
+        while start < len(missing):
+            batch = missing[start:start + self.catalog_batch_size(batch_size)]
+            start += len(batch)
+            batch_responses = self._catalog_imagery_request(
+                [geometries[index] for index in batch], crop, sowing_date,
+                filters)
+            self._store_catalog_imagery(
+                responses, cache_keys, batch, batch_responses, filters,
+                cache)
+
+        return responses
+
+    def catalog_batch_size(self, batch_size):
+        """Number of fields to send in the next catalog request.
+
+        :param batch_size: Maximum number of fields per request.
+        :type batch_size: int
+
+        :return: The batch size, 1 when the server does not echo the
+            customerExternalId of the fields.
+        :rtype: int
+        """
+        if self._catalog_batch_support.get(self.bridge_server) is False:
+            return 1
+        return max(1, batch_size or 1)
+
+    def record_catalog_batch_support(self, coverages_json, responses):
+        """Record whether the server echoed the fields of a batch.
+
+        :param coverages_json: Response of the batch request.
+        :type coverages_json: list
+
+        :param responses: Response split per field, None when it could not
+            be split.
+        :type responses: list
+        """
+        # An error or an empty response does not tell.
+        if isinstance(coverages_json, list) and coverages_json:
+            self._catalog_batch_support[self.bridge_server] = (
+                responses is not None)
+
+    def _cached_catalog_imagery(
+            self, geometries, crop, sowing_date, filters, cache, refresh):
+        """Look up the catalog responses of the fields in the cache.
+
+        :return: Tuple of the responses (None when not cached), the cache
+            keys and the indexes of the fields to request.
+        :rtype: tuple
+        """
+        responses = [None] * len(geometries)
+        cache_keys = [None] * len(geometries)
+        missing = []
+        for index, geometry in enumerate(geometries):
+            if cache:
+                cache_keys[index] = cache.key(
+                    self.bridge_server, self.username, self.client_id,
+                    geometry, crop, sowing_date, filters)
+                if not refresh:
+                    responses[index] = cache.get(cache_keys[index])
+            if responses[index] is None:
+                missing.append(index)
+        return responses, cache_keys, missing
+
+    @staticmethod
+    def _store_catalog_imagery(
+            responses, cache_keys, batch, batch_responses, filters, cache):
+        """Record the responses of a batch, and cache the successful ones.
+
+        :param responses: Responses of every field, updated in place.
+        :type responses: list
+
+        :param cache_keys: Cache keys of every field.
+        :type cache_keys: list
+
+        :param batch: Indexes of the fields of the batch.
+        :type batch: list
+
+        :param batch_responses: Responses of the batch fields.
+        :type batch_responses: list
+        """
+        for index, coverages_json in zip(batch, batch_responses):
+            responses[index] = coverages_json
+            # Error responses are dicts, only cache the list of results.
+            if cache_keys[index] and isinstance(coverages_json, list):
+                cache.put(
+                    cache_keys[index], coverages_json,
+                    cache.ttl_for(filters))
+
+    @staticmethod
+    def catalog_imagery_request_data(geometries, crop, sowing_date):
+        """Catalog-imagery request data of a batch of fields.
+
+        Fields of a batch are tagged with their position as
+        customerExternalId.
+
+        :param geometries: Geometries of the fields in WKT format.
+        :type geometries: list
+
+        :param crop: Crop type.
+        :type crop: str
+
+        :param sowing_date: Sowing date. YYYY-MM-DD
+        :type sowing_date: str
+
+        :return: Request data.
+        :rtype: dict
+        """
+        season_fields = []
+        for index, geometry in enumerate(geometries):
+            season_field = {
+                "geometry": geometry,
+                "crop": crop,
+                "sowingDate": sowing_date,
+            }
+            if len(geometries) > 1:
+                season_field["customerExternalId"] = str(index)
+            season_fields.append(season_field)
+        return {"seasonFields": season_fields}
+
+    @staticmethod
+    def split_catalog_imagery(coverages_json, count):
+        """Split the response of a batch of fields per field.
+
+        :param coverages_json: Response of the batch request.
+        :type coverages_json: list
+
+        :param count: Number of fields in the batch.
+        :type count: int
+
+        :return: Response of every field, None when a result cannot be
+            matched to a field.
+        :rtype: list
+        """
+        if count == 1:
+            return [coverages_json]
+        if not isinstance(coverages_json, list):
+            return None
+
+        field_ids = [str(index) for index in range(count)]
+        season_fields = []
+        for result in coverages_json:
+            season_field = result.get('seasonField') or {}
+            if season_field.get('customerExternalId') not in field_ids:
+                return None
+            season_fields.append(season_field)
+
+        responses = [[] for _ in field_ids]
+        for result, season_field in zip(coverages_json, season_fields):
+            field_id = season_field['customerExternalId']
+            # The tag only identifies the field inside this request.
+            season_field['customerExternalId'] = None
+            responses[field_ids.index(field_id)].append(result)
+        return responses
+
+    def _catalog_imagery_request(self, geometries, crop, sowing_date, filters):
+        """Send a single catalog-imagery request for the given fields.
+
+        :param geometries: Geometries of the fields in WKT format.
+        :type geometries: list
+
+        :param crop: Crop type.
+        :type crop: str
+
+        :param sowing_date: Sowing date. YYYY-MM-DD
+        :type sowing_date: str
+
+        :param filters: Filter coverage results.
+        :type filters: dict
+
+        :return: JSON response of every field, in the order of geometries.
+        :rtype: list
+        """
+        api_client = self.field_level_maps_client()
+        coverages_json = api_client.get_catalog_imagery(
+            self.catalog_imagery_request_data(geometries, crop, sowing_date),
+            filters=filters)
+
+        responses = self.split_catalog_imagery(coverages_json, len(geometries))
+        if len(geometries) > 1:
+            self.record_catalog_batch_support(coverages_json, responses)
+        if responses is not None:
+            return responses
+
+        log('Catalog batch of {} fields could not be split, requesting '
+            'them one by one.'.format(len(geometries)))
+        responses = []
+        for geometry in geometries:
+            responses.extend(self._catalog_imagery_request(
+                [geometry], crop, sowing_date, filters))
+        return responses
 
     def _get_field_map(
             self,
@@ -258,8 +563,7 @@ class BridgeAPI(ApiClient):
             Map data specification based on given criteria.
         :rtype: dict
         """
-        api_client = FieldLevelMapsAPIClient(
-            self.access_token, self.bridge_server)
+        api_client = self.field_level_maps_client()
         field_map_json = api_client.get_field_map(
             map_type_key,
             request_data,
@@ -280,8 +584,7 @@ class BridgeAPI(ApiClient):
             Map data specification based on given parameters.
         :rtype: dict
         """
-        api_client = FieldLevelMapsAPIClient(
-            self.access_token, self.bridge_server)
+        api_client = self.field_level_maps_client()
         map_json = api_client.get_hotspot(
             url)
 
@@ -294,8 +597,7 @@ class BridgeAPI(ApiClient):
             Map data specification based on given parameters.
         :rtype: dict
         """
-        api_client = FieldLevelMapsAPIClient(
-            self.access_token, self.bridge_server)
+        api_client = self.field_level_maps_client()
         map_json = api_client.get_hotspot(
             url, params, data)
 
@@ -354,6 +656,37 @@ class BridgeAPI(ApiClient):
             Map data specification based on given criteria.
         :rtype: dict
         """
+        request_data, params = self.field_map_request_data(
+            map_type_key, season_field_id, season_field_geom, image_id,
+            n_planned, sample_map_data, sample_map_id, **kwargs)
+
+        return self._get_field_map(
+            map_type_key,
+            request_data,
+            n_planned,
+            yield_val,
+            min_yield_val,
+            max_yield_val,
+            sample_map_id,
+            params, zone_count=zone_count)
+
+    @staticmethod
+    def field_map_request_data(
+            map_type_key,
+            season_field_id,
+            season_field_geom,
+            image_id=None,
+            n_planned=1.0,
+            sample_map_data=None,
+            sample_map_id=None,
+            **kwargs):
+        """Map creation data and parameters of a field map request.
+
+        See get_field_map for the parameters.
+
+        :return: Tuple of request data and request parameters.
+        :rtype: tuple
+        """
         nitrogen_maps = [
             INSEASONFIELD_AVERAGE_NDVI['key'],
             INSEASONFIELD_AVERAGE_LAI['key'],
@@ -447,15 +780,7 @@ class BridgeAPI(ApiClient):
         # Get request parameters
         params = kwargs.get('params')
 
-        return self._get_field_map(
-            map_type_key,
-            request_data,
-            n_planned,
-            yield_val,
-            min_yield_val,
-            max_yield_val,
-            sample_map_id,
-            params, zone_count=zone_count)
+        return request_data, params
 
     def get_difference_map(
             self, map_type_key, season_field_geometry,
@@ -482,6 +807,26 @@ class BridgeAPI(ApiClient):
             Map data specification based on given criteria.
         :rtype: dict
         """
+        map_type_key, request_data, params = (
+            self.difference_map_request_data(
+                map_type_key, season_field_geometry, earliest_image_date,
+                latest_image_date, **kwargs))
+
+        return self._get_field_map(
+            map_type_key, request_data, params=params)
+
+    @staticmethod
+    def difference_map_request_data(
+            map_type_key, season_field_geometry,
+            earliest_image_date, latest_image_date, **kwargs):
+        """Difference map type, creation data and parameters.
+
+        See get_difference_map for the parameters.
+
+        :return: Tuple of difference map type key, request data and
+            request parameters.
+        :rtype: tuple
+        """
         # Construct map creation parameters
         request_data = {
             "SeasonField": {
@@ -503,8 +848,7 @@ class BridgeAPI(ApiClient):
         map_type_definition = get_definition(map_type_key)
         difference_map_definition = map_type_definition['difference_map']
 
-        return self._get_field_map(
-            difference_map_definition['key'], request_data, params=params)
+        return difference_map_definition['key'], request_data, params
 
     def get_samz_map(
             self,
@@ -531,8 +875,29 @@ class BridgeAPI(ApiClient):
             Map data specification based on given criteria.
         :rtype: dict
         """
+        request_data = self.samz_map_request_data(
+            geometry, list_of_image_ids, zone_count)
+
+        return self._get_field_map(SAMZ['key'], request_data)
+
+    @staticmethod
+    def samz_map_request_data(geometry, list_of_image_ids, zone_count=0):
+        """SAMZ map creation data.
+
+        :param geometry: Geometry of the field in WKT format.
+        :type geometry: str
+
+        :param list_of_image_ids: IDs of selected images.
+        :type list_of_image_ids: list
+
+        :param zone_count: Number of zones.
+        :type zone_count: int
+
+        :return: Request data.
+        :rtype: dict
+        """
         # Construct map creation parameters
-        request_data = {
+        return {
             "SeasonField": {
                 "Id": None,
                 "geometry": geometry
@@ -543,8 +908,6 @@ class BridgeAPI(ApiClient):
             "zoneCount": zone_count
         }
 
-        return self._get_field_map(SAMZ['key'], request_data)
-
     def get_rx_map(
             self,
             url,
@@ -570,8 +933,7 @@ class BridgeAPI(ApiClient):
         :rtype: dict
         """
         # Construct map creation parameters
-        api_client = FieldLevelMapsAPIClient(
-            self.access_token, self.bridge_server)
+        api_client = self.field_level_maps_client()
         request_data = {
             "SourceMapId": source_map_id,
             "zoneCount": zone_count
@@ -602,8 +964,7 @@ class BridgeAPI(ApiClient):
         :rtype: dict
         """
         # Construct map creation parameters
-        api_client = FieldLevelMapsAPIClient(
-            self.access_token, self.bridge_server)
+        api_client = self.field_level_maps_client()
         rx_patch = api_client.patch_rx_map(source_map_id, patch_data)
         
         return rx_patch
@@ -618,8 +979,7 @@ class BridgeAPI(ApiClient):
             Map data specification based on given criteria.
         :rtype: dict
         """
-        api_client = FieldLevelMapsAPIClient(
-            self.access_token, self.bridge_server)
+        api_client = self.field_level_maps_client()
         rx_json = api_client.get_rx_generated(url, source_map_id)
 
         return rx_json
@@ -0,0 +1,433 @@
+# coding=utf-8
+"""Headless batch production of field level maps.
+
+Runs the coverage search, map creation and download of the plugin without a
+QGIS desktop session, e.g.::
+
+    python -m geosys.cli fields.gpkg ./maps --product NDVI --product EVI \
+        --start-date 2024-04-01 --end-date 2024-09-30 --concurrency 8
+
+The Bridge API credentials are taken from the options, the GEOSYS_*
+environment variables or the plugin settings of the QGIS profile.
+"""
+import datetime as dt
+import os
+import sys
+import typing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import typer
+from qgis.core import (
+    QgsApplication,
+    QgsCoordinateReferenceSystem,
+    QgsVectorLayer)
+from qgis.PyQt.QtCore import QSettings
+
+from geosys.bridge_api.default import (
+    IMAGE_DATE,
+    IMAGE_SENSOR,
+    KML,
+    MAPS_TYPE,
+    ORGANIC_AVERAGE,
+    PNG,
+    PNG_KMZ,
+    SAMZ_ZONE,
+    YIELD_AVERAGE,
+    YIELD_MAXIMUM,
+    YIELD_MINIMUM,
+    ZIPPED_SHP,
+    ZIPPED_TIFF)
+from geosys.bridge_api.definitions import (
+    ARCHIVE_MAP_PRODUCTS, NDVI, REFLECTANCE, SAMPLE_MAP, SAMZ, SOIL)
+from geosys.bridge_api_wrapper import AuthenticationError, BridgeAPI
+from geosys.utilities.gui_utilities import (
+    geometry_request, geometry_wkt, sensor_simplify_tolerance)
+from geosys.utilities.product_cache import catalog_cache
+from geosys.utilities.settings import setting
+from geosys.utilities.utilities import (
+    check_if_file_exists, clean_filename, write_json)
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+app = typer.Typer()
+
+# Output map formats by command line name.
+OUTPUT_FORMATS = {
+    'tiff': ZIPPED_TIFF,
+    'shp': ZIPPED_SHP,
+    'png': PNG,
+    'kmz': PNG_KMZ,
+    'kml': KML,
+}
+
+# Default number of maps created and downloaded at once.
+DEFAULT_CONCURRENCY = 4
+
+
+def batch_map_products():
+    """Map products which can be produced from a single catalog image.
+
+    SAMZ and sample maps need several images or sample points, they are
+    only available from the dock widget.
+
+    :return: Map product keys.
+    :rtype: list
+    """
+    return [
+        map_product['key'] for map_product in ARCHIVE_MAP_PRODUCTS
+        if map_product not in [SAMZ, SAMPLE_MAP]]
+
+
+def catalog_filters(map_product, start_date, end_date, sensor=None):
+    """Catalog-imagery filters of a map product.
+
+    :param map_product: Map product key.
+    :type map_product: str
+
+    :param start_date: First image date, yyyy-MM-dd.
+    :type start_date: str
+
+    :param end_date: Last image date, yyyy-MM-dd.
+    :type end_date: str
+
+    :param sensor: Sensor key, all sensors when not given.
+    :type sensor: str
+
+    :return: Catalog-imagery filters.
+    :rtype: dict
+    """
+    # Same work-around as the coverage search, these products are not
+    # listed by the catalog.
+    map_type = map_product
+    if map_product in [REFLECTANCE['key'], SOIL['key']]:
+        map_type = NDVI['key']
+
+    if start_date:
+        date_filter = '$between:{}|{}'.format(start_date, end_date)
+    else:
+        date_filter = '$lte:{}'.format(end_date)
+    filters = {
+        MAPS_TYPE: map_type,
+        IMAGE_DATE: date_filter
+    }
+    sensor and filters.update({
+        IMAGE_SENSOR: sensor
+    })
+    return filters
+
+
+def read_fields(path, id_field=None, simplify_tolerance=None):
+    """Read the fields of a vector file as WKT geometries in EPSG:4326.
+
+    :param path: Vector file path.
+    :type path: str
+
+    :param id_field: Attribute identifying the fields, the feature id is
+        used when not given.
+    :type id_field: str
+
+    :param simplify_tolerance: Simplification tolerance in degrees.
+    :type simplify_tolerance: float
+
+    :return: List of (field id, wkt geometry) tuples.
+    :rtype: list
+    """
+    layer = QgsVectorLayer(path, 'fields', 'ogr')
+    if not layer.isValid():
+        raise typer.BadParameter(
+            '{} is not a valid vector file.'.format(path))
+    if id_field and layer.fields().indexOf(id_field) < 0:
+        raise typer.BadParameter(
+            '{} has no {} attribute.'.format(path, id_field))
+
+    request = geometry_request(QgsCoordinateReferenceSystem('EPSG:4326'))
+    if id_field:
+        request.setSubsetOfAttributes([id_field], layer.fields())
+
+    fields = []
+    for feature in layer.getFeatures(request):
+        if not feature.hasGeometry():
+            continue
+        field_id = feature[id_field] if id_field else feature.id()
+        fields.append((
+            str(field_id),
+            geometry_wkt(feature.geometry(), simplify_tolerance)))
+    return fields
+
+
+def map_creation_data(zone_count=None):
+    """Map creation data from the plugin settings.
+
+    :param zone_count: Number of zones of the maps.
+    :type zone_count: int
+
+    :return: Map creation data.
+    :rtype: dict
+    """
+    settings = QSettings()
+    data = {}
+    for key in [YIELD_AVERAGE, YIELD_MINIMUM, YIELD_MAXIMUM,
+                ORGANIC_AVERAGE, SAMZ_ZONE]:
+        data[key] = setting(key, expected_type=int, qsettings=settings)
+    if zone_count is not None:
+        data[SAMZ_ZONE] = zone_count
+    return data
+
+
+def reserve_filename(
+        output_dir, map_specification, map_product, field_id,
+        output_map_format, reserved, zone_count=None):
+    """Reserve the name of the map of a catalog result.
+
+    Maps are written concurrently, so the names are reserved before any
+    file exists; two results of a field on the same day, e.g. from two
+    sensors, get different names.
+
+    :param reserved: Names already reserved by the batch, updated.
+    :type reserved: set
+
+    :return: Filename of the map, without extension.
+    :rtype: str
+    """
+    image = map_specification.get('image', {})
+    filename = clean_filename('{}_{}_{}'.format(
+        map_product, field_id, image.get('date')))
+    if zone_count:
+        filename = '{}_{}_zones'.format(filename, zone_count)
+    candidate = check_if_file_exists(
+        output_dir, filename, output_map_format['extension'])
+    index = 1
+    while candidate in reserved or os.path.exists(os.path.join(
+            output_dir, candidate + output_map_format['extension'])):
+        candidate = '{}_{}'.format(filename, index)
+        index += 1
+    reserved.add(candidate)
+    return candidate
+
+
+def create_field_map(
+        bridge_api, map_specification, map_product, field_id, geometry,
+        output_dir, filename, output_map_format, crop, zone_count=None):
+    """Create and download the map of a single catalog result.
+
+    :return: Summary of the map.
+    :rtype: dict
+    """
+    # Imported once the QGIS application is initialised, the module reads
+    # the settings when imported.
+    from geosys.ui.widgets.geosys_coverage_downloader import create_map
+
+    image = map_specification.get('image', {})
+    summary = {
+        'field': field_id,
+        'product': map_product,
+        'season_field': map_specification.get('seasonField', {}).get('id'),
+        'image_id': image.get('id'),
+        'image_date': image.get('date'),
+        'sensor': image.get('sensor'),
+        'path': os.path.join(
+            output_dir, filename + output_map_format['extension']),
+    }
+    data = map_creation_data(zone_count)
+    try:
+        # create_map refreshes the token, the batch may outlive the one it
+        # started with.
+        is_success, message = create_map(
+            map_specification, map_product, geometry, output_dir,
+            filename, output_map_format, n_planned_value=1.0,
+            yield_val=0, min_yield_val=0, max_yield_val=0, data=data,
+            params=dict(data), crop_type=crop, zone_count=zone_count,
+            bridge_api=bridge_api)
+    except Exception as e:
+        is_success, message = False, str(e)
+    summary.update({
+        'status': 'success' if is_success else 'failed',
+        'message': message
+    })
+    return summary
+
+
+def run_batch(
+        bridge_api, fields, map_products, start_date, end_date, output_dir,
+        output_map_format, crop, sowing_date, sensor=None, zone_count=None,
+        latest_only=False, concurrency=DEFAULT_CONCURRENCY):
+    """Search, create and download the maps of every field.
+
+    :param bridge_api: Authenticated Bridge API client, shared by every
+        request of the batch.
+    :type bridge_api: BridgeAPI
+
+    :param fields: List of (field id, wkt geometry) tuples.
+    :type fields: list
+
+    :return: Summary of the catalog errors and of every map.
+    :rtype: dict
+    """
+    from geosys.ui.widgets.geosys_coverage_downloader import (
+        shutdown_hotspot_executor)
+
+    summary = {
+        'catalog_errors': [],
+        'maps': []
+    }
+    cache = catalog_cache()
+    geometries = [geometry for _, geometry in fields]
+    reserved_filenames = set()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = []
+        for map_product in map_products:
+            typer.echo('Searching {} coverage of {} fields...'.format(
+                map_product, len(fields)))
+            responses = bridge_api.get_catalog_imagery_batch(
+                geometries, crop, sowing_date,
+                filters=catalog_filters(
+                    map_product, start_date, end_date, sensor),
+                cache=cache)
+            for (field_id, geometry), results in zip(fields, responses):
+                if isinstance(results, dict):
+                    summary['catalog_errors'].append({
+                        'field': field_id,
+                        'product': map_product,
+                        'message': results.get('message', str(results))
+                    })
+                    continue
+                results = [result for result in results if result.get(
+                    'maps')]
+                if latest_only and results:
+                    results = [max(
+                        results, key=lambda result: result['image']['date'])]
+                for result in results:
+                    filename = reserve_filename(
+                        output_dir, result, map_product, field_id,
+                        output_map_format, reserved_filenames, zone_count)
+                    futures.append(executor.submit(
+                        create_field_map, bridge_api, result, map_product,
+                        field_id, geometry, output_dir, filename,
+                        output_map_format, crop, zone_count))
+
+        try:
+            for index, future in enumerate(as_completed(futures)):
+                map_summary = future.result()
+                summary['maps'].append(map_summary)
+                typer.echo('[{}/{}] {} {}'.format(
+                    index + 1, len(futures), map_summary['status'],
+                    map_summary['path']))
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            summary['interrupted'] = True
+    shutdown_hotspot_executor()
+    return summary
+
+
+@app.command()
+def produce(
+        fields_path: Path = typer.Argument(
+            ..., exists=True, help='Vector file of the fields.'),
+        output_directory: Path = typer.Argument(
+            ..., help='Directory receiving the maps.'),
+        product: typing.List[str] = typer.Option(
+            ..., help='Map product key, can be repeated.'),
+        end_date: str = typer.Option(
+            dt.date.today().isoformat(), help='Last image date.'),
+        start_date: str = typer.Option(
+            None, help='First image date, no lower bound when not given.'),
+        output_format: str = typer.Option(
+            'tiff', help='One of {}.'.format(', '.join(OUTPUT_FORMATS))),
+        id_field: str = typer.Option(
+            None, help='Attribute identifying the fields.'),
+        crop: str = typer.Option(None, help='Crop type of the fields.'),
+        sowing_date: str = typer.Option(None, help='Sowing date.'),
+        sensor: str = typer.Option(None, help='Sensor, all when not given.'),
+        zone_count: int = typer.Option(None, help='Number of zones.'),
+        latest_only: bool = typer.Option(
+            False, help='Only map the most recent image of every field.'),
+        concurrency: int = typer.Option(
+            DEFAULT_CONCURRENCY, help='Maps created and downloaded at once.'),
+        summary_path: Path = typer.Option(
+            None, help='JSON summary, summary.json in the output directory '
+                       'when not given.'),
+        username: str = typer.Option(None, envvar='GEOSYS_USERNAME'),
+        password: str = typer.Option(None, envvar='GEOSYS_PASSWORD'),
+        client_id: str = typer.Option(None, envvar='GEOSYS_CLIENT_ID'),
+        client_secret: str = typer.Option(
+            None, envvar='GEOSYS_CLIENT_SECRET'),
+        region: str = typer.Option(None, envvar='GEOSYS_REGION'),
+        use_testing_service: bool = typer.Option(
+            None, envvar='GEOSYS_USE_TESTING_SERVICE')):
+    """Produce the maps of every field of a vector file."""
+    if output_format not in OUTPUT_FORMATS:
+        raise typer.BadParameter(
+            'Output format must be one of {}.'.format(
+                ', '.join(OUTPUT_FORMATS)))
+
+    qgis_application = QgsApplication([], False)
+    qgis_application.initQgis()
+
+    try:
+        from geosys.ui.widgets.geosys_coverage_downloader import (
+            credentials_parameters_from_settings)
+        from geosys.utilities.qgis_settings import QGISSettings
+
+        unknown_products = set(product) - set(batch_map_products())
+        if unknown_products:
+            raise typer.BadParameter(
+                'Unsupported map products: {}.'.format(
+                    ', '.join(sorted(unknown_products))))
+
+        credentials = list(credentials_parameters_from_settings())
+        for index, value in enumerate([
+                username, password, region, client_id, client_secret,
+                use_testing_service]):
+            if value is not None:
+                credentials[index] = value
+        crop = crop or setting('crop_type', expected_type=str)
+        sowing_date = sowing_date or setting('sowing_date', expected_type=str)
+
+        started = dt.datetime.now()
+        try:
+            bridge_api = BridgeAPI(
+                *credentials, proxies=QGISSettings.get_qgis_proxy())
+        except AuthenticationError as e:
+            typer.echo('Authentication failed. {}'.format(e), err=True)
+            raise typer.Exit(code=1)
+
+        output_directory.mkdir(parents=True, exist_ok=True)
+        fields = read_fields(
+            str(fields_path), id_field, sensor_simplify_tolerance(sensor))
+        summary = run_batch(
+            bridge_api, fields, product, start_date, end_date,
+            str(output_directory), OUTPUT_FORMATS[output_format],
+            crop, sowing_date, sensor=sensor, zone_count=zone_count,
+            latest_only=latest_only, concurrency=concurrency)
+
+        failed = [
+            map_summary for map_summary in summary['maps']
+            if map_summary['status'] != 'success']
+        summary.update({
+            'started': started.isoformat(),
+            'finished': dt.datetime.now().isoformat(),
+            'fields': len(fields),
+            'products': list(product),
+            'start_date': start_date,
+            'end_date': end_date,
+            'succeeded': len(summary['maps']) - len(failed),
+            'failed': len(failed)
+        })
+        summary_path = summary_path or output_directory / 'summary.json'
+        write_json(summary, str(summary_path))
+        typer.echo('{} maps created, {} failed. Summary written to {}'.format(
+            summary['succeeded'], summary['failed'], summary_path))
+
+        if failed or summary['catalog_errors']:
+            raise typer.Exit(code=1)
+    finally:
+        qgis_application.exitQgis()
+
+
+if __name__ == '__main__':
+    sys.exit(app())
@@ -23,6 +23,7 @@
 """
 import os
 import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from PyQt5.QtCore import QCoreApplication, QDate, QSettings
 from PyQt5.QtWidgets import QDateEdit
@@ -42,14 +43,17 @@ from qgis.core import (
 from geosys.bridge_api.default import (
     ZIPPED_TIFF_KEY, TIFF_EXT, MAPS_TYPE, IMAGE_SENSOR, IMAGE_DATE,
     ZIPPED_TIFF, YIELD_AVERAGE, YIELD_MINIMUM, YIELD_MAXIMUM, ORGANIC_AVERAGE,
-    SAMZ_ZONE)
+    SAMZ_ZONE, MAP_CREATION_MAX_WORKERS)
 from geosys.bridge_api.definitions import ARCHIVE_MAP_PRODUCTS, SENSORS, \
     ALL_SENSORS
 from geosys.bridge_api_wrapper import BridgeAPI
 from geosys.ui.widgets.geosys_coverage_downloader import (
-    credentials_parameters_from_settings, create_map)
+    credentials_parameters_from_settings, create_map,
+    shutdown_hotspot_executor)
 from geosys.utilities.downloader import fetch_data, extract_zip
-from geosys.utilities.gui_utilities import reproject
+from geosys.utilities.gui_utilities import (
+    geometry_request, geometry_wkt, sensor_simplify_tolerance)
+from geosys.utilities.product_cache import catalog_cache
 from geosys.utilities.qgis_settings import QGISSettings
 from geosys.utilities.settings import setting
 
@@ -206,16 +210,13 @@ class MapCoverageDownloader(QgsProcessingAlgorithm):
         # Retrieve the feature source.
         source = self.parameterAsSource(parameters, self.INPUT, context)
 
-        # Reproject layer to EPSG:4326
-        if source.sourceCrs().authid() != 'EPSG:4326':
-            source = reproject(
-                source, QgsCoordinateReferenceSystem('EPSG:4326'))
-
         # Handle multi features
         # Merge features into multi-part polygon
         # TODO use Collect Geometries processing algorithm
+        # Features are reprojected to EPSG:4326 while they are read.
+        request = geometry_request(QgsCoordinateReferenceSystem('EPSG:4326'))
         geom = None
-        for index, feature in enumerate(source.getFeatures()):
+        for index, feature in enumerate(source.getFeatures(request)):
             if not feature.hasGeometry() or not (
                     feature.geometry().isGeosValid()):
                 continue
@@ -224,9 +225,7 @@ class MapCoverageDownloader(QgsProcessingAlgorithm):
             else:
                 geom = geom.combine(feature.geometry())
 
-        if geom:
-            geom_wkt = geom.asWkt()
-        else:
+        if not geom:
             # geometry is not valid
             return False, 'Geometry is not valid.'
 
@@ -245,6 +244,9 @@ class MapCoverageDownloader(QgsProcessingAlgorithm):
         if sensor_type == ALL_SENSORS['key']:
             sensor_type = None
 
+        # Simplified to the sensor resolution if enabled in the settings.
+        geom_wkt = geometry_wkt(geom, sensor_simplify_tolerance(sensor_type))
+
         # Retrieve output layer destination.
         self.output_destination = self.parameterAsOutputLayer(
             parameters, self.OUTPUT, context)
@@ -262,32 +264,54 @@ class MapCoverageDownloader(QgsProcessingAlgorithm):
             *credentials_parameters_from_settings(),
             proxies=QGISSettings.get_qgis_proxy())
 
-        results = bridge_api.get_catalog_imagery(
-            geom_wkt, self.crop_type, self.sowing_date,
-            filters=filters)
+        # All features are merged in a single field, which still goes
+        # through the batched catalog search shared with the dock widget.
+        results = bridge_api.get_catalog_imagery_batch(
+            [geom_wkt], self.crop_type, self.sowing_date,
+            filters=filters, cache=catalog_cache())[0]
 
         if isinstance(results, dict) and results.get('message'):
             # TODO handle model_validation_error
             raise Exception(results['message'])
 
         if len(results) > 0:
+            # Maps are downloaded concurrently, each one to its own file.
+            # They all share the authenticated client of the search.
+            settings = QSettings()
+            max_workers = setting(
+                'map_creation_max_workers', MAP_CREATION_MAX_WORKERS,
+                expected_type=int, qsettings=settings)
+            data = self.map_creation_data(settings)
+            destinations = self.output_destinations(len(results))
+            message = self.tr(
+                'Please check your output directory for the result.')
+
             # Compute the number of steps to display within the progress bar
             total = 100.0 / len(results)
-            for index, result in enumerate(results):
-                # Stop the algorithm if cancel button has been clicked
-                if feedback.isCanceled():
-                    break
-
-                # Update the progress bar
-                progress_text = (
-                    'Downloading {} of {} maps...'.format(
-                        index+1, len(results)))
-                feedback.setProgressText(progress_text)
-
-                downloaded_path, message = self.download_map(result)
-
-                feedback.pushInfo(downloaded_path)
-                feedback.setProgress(int((index+1) * total))
+            feedback.setProgressText(
+                'Downloading {} maps...'.format(len(results)))
+            executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+            with executor:
+                futures = [
+                    executor.submit(
+                        self.download_map, result, destination, bridge_api,
+                        map_product, geom_wkt, dict(data), feedback)
+                    for result, destination in zip(results, destinations)]
+                # Canceling the feedback aborts the running downloads, the
+                # pending ones return right away.
+                for index, future in enumerate(as_completed(futures)):
+                    try:
+                        downloaded_path, message = future.result()
+                    except Exception as e:
+                        if not feedback.isCanceled():
+                            feedback.reportError(str(e))
+                    else:
+                        feedback.pushInfo(downloaded_path)
+                    feedback.setProgressText(
+                        'Downloaded {} of {} maps...'.format(
+                            index + 1, len(results)))
+                    feedback.setProgress(int((index + 1) * total))
+            shutdown_hotspot_executor()
         else:
             message = self.tr(
                 'No coverage result available based on given parameters')
@@ -297,7 +321,50 @@ class MapCoverageDownloader(QgsProcessingAlgorithm):
             'message': message
         }
 
-    def download_map(self, coverage_map_json):
+    def output_destinations(self, count):
+        """Output path of every downloaded map.
+
+        The first map is written to the output layer, the others next to it
+        with their index as suffix.
+
+        :param count: Number of maps.
+        :type count: int
+
+        :return: Output paths.
+        :rtype: list
+        """
+        root, extension = os.path.splitext(self.output_destination)
+        return [self.output_destination] + [
+            '{}_{}{}'.format(root, index, extension)
+            for index in range(1, count)]
+
+    @staticmethod
+    def map_creation_data(settings):
+        """Map creation data from the plugin settings.
+
+        :param settings: Settings to read.
+        :type settings: QSettings
+
+        :return: Map creation data.
+        :rtype: dict
+        """
+        return {
+            YIELD_AVERAGE: setting(
+                YIELD_AVERAGE, expected_type=int, qsettings=settings),
+            YIELD_MINIMUM: setting(
+                YIELD_MINIMUM, expected_type=int, qsettings=settings),
+            YIELD_MAXIMUM: setting(
+                YIELD_MAXIMUM, expected_type=int, qsettings=settings),
+            ORGANIC_AVERAGE: setting(
+                ORGANIC_AVERAGE,
+                expected_type=int, qsettings=settings),
+            SAMZ_ZONE: setting(
+                SAMZ_ZONE, expected_type=int, qsettings=settings),
+        }
+
+    def download_map(
+            self, coverage_map_json, output_destination, bridge_api,
+            map_product, geometry, data, feedback=None):
         """Download map directly from the coverage search result.
 
         :param coverage_map_json: Result of single map coverage.
@@ -329,10 +396,31 @@ class MapCoverageDownloader(QgsProcessingAlgorithm):
                 "coverageType": "CLEAR"
             }
         :type coverage_map_json: dict
+
+        :param output_destination: Output path of the map.
+        :type output_destination: str
+
+        :param bridge_api: Authenticated Bridge API client.
+        :type bridge_api: BridgeAPI
+
+        :param map_product: Map product key.
+        :type map_product: str
+
+        :param geometry: Geometry of the field in WKT.
+        :type geometry: str
+
+        :param data: Map creation data.
+        :type data: dict
+
+        :param feedback: Feedback of the algorithm, canceling it aborts the
+            download.
+        :type feedback: QgsProcessingFeedback
+
+        :return: Output path and message.
+        :rtype: tuple
         """
-        bridge_api = BridgeAPI(
-            *credentials_parameters_from_settings(),
-            proxies=QGISSettings.get_qgis_proxy())
+        if feedback and feedback.isCanceled():
+            return output_destination, self.tr('Download canceled.')
 
         # Get the requested map format. For now, use Raster (.tiff)
         map_format = ZIPPED_TIFF_KEY
@@ -348,30 +436,28 @@ class MapCoverageDownloader(QgsProcessingAlgorithm):
             # Download zipped map and extract it in requested format.
             zip_path = tempfile.mktemp('{}.zip'.format(map_extension))
 
-            fetch_data(url, zip_path, headers=bridge_api.headers)
-            extract_zip(zip_path, self.output_destination)
+            fetch_data(
+                url, zip_path, headers=bridge_api.headers, feedback=feedback)
+            extract_zip(zip_path, output_destination)
         else:
             # download map using get field map request
-            settings = QSettings()
-            data = {
-                YIELD_AVERAGE: setting(
-                    YIELD_AVERAGE, expected_type=int, qsettings=settings),
-                YIELD_MINIMUM: setting(
-                    YIELD_MINIMUM, expected_type=int, qsettings=settings),
-                YIELD_MAXIMUM: setting(
-                    YIELD_MAXIMUM, expected_type=int, qsettings=settings),
-                ORGANIC_AVERAGE: setting(
-                    ORGANIC_AVERAGE,
-                    expected_type=int, qsettings=settings),
-                SAMZ_ZONE: setting(
-                    SAMZ_ZONE, expected_type=int, qsettings=settings),
-            }
             is_success, message = create_map(
                 coverage_map_json,
-                os.path.dirname(self.output_destination),
-                os.path.basename(self.output_destination),
-                ZIPPED_TIFF, data)
+                map_product,
+                geometry,
+                os.path.dirname(output_destination),
+                os.path.basename(output_destination),
+                ZIPPED_TIFF,
+                n_planned_value=1.0,
+                yield_val=data[YIELD_AVERAGE],
+                min_yield_val=data[YIELD_MINIMUM],
+                max_yield_val=data[YIELD_MAXIMUM],
+                data=data,
+                params=dict(data),
+                crop_type=self.crop_type,
+                bridge_api=bridge_api,
+                feedback=feedback)
             if not is_success:
                 message = self.tr('Error creating map. {}').format(message)
 
-        return self.output_destination, message
+        return output_destination, message
@@ -1,6 +1,8 @@
 import logging
+import re
+import time
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 app = Flask(__name__)
 
 # Configure logging
@@ -42,9 +44,18 @@ def field_level_maps_coverage():
         return jsonify({"error": "Invalid headers"}), 400
 
     data = request.get_json()
-    if not data or "Geometry" not in data or "Crop" not in data or "SowingDate" not in data:
+    if data and data.get("seasonFields"):
+        season_fields = data["seasonFields"]
+        for season_field in season_fields:
+            if ("geometry" not in season_field or "crop" not in season_field
+                    or "sowingDate" not in season_field):
+                return jsonify({"error": "Invalid data input"}), 400
+    elif not data or "Geometry" not in data or "Crop" not in data or "SowingDate" not in data:
         return jsonify({"error": "Invalid data input"}), 400
+    else:
+        season_fields = [{}]
 
+    # One coverage per field, the customerExternalId is not echoed back.
     response = [
         {
             "coverageType": "CLEAR",
@@ -55,8 +66,12 @@ def field_level_maps_coverage():
                 "mask": "All",
                 "date": "2024-11-02"
             },
+            "seasonField": {
+                "id": "seasonfield_id",
+                "customerExternalId": None
+            },
             "maps": [{}]
-        }
+        } for _ in season_fields
     ]
     return jsonify(response)
 
@@ -169,3 +184,52 @@ def management_zones_map(map_type):
         "zones": []
     }
     return jsonify(response)
+
+
+# Map image served by the download routes, sent in chunks.
+MAP_FILE_CONTENT = bytes(range(256)) * 4096
+MAP_FILE_ETAG = '"map-file-1"'
+MAP_FILE_CHUNK_SIZE = 64 * 1024
+
+
+def map_file_response(content, status=200, headers=None, delay=0):
+    """Stream the content of a map image in chunks, delay seconds apart."""
+    headers = dict(headers or {}, ETag=MAP_FILE_ETAG)
+
+    def chunks():
+        for start in range(0, len(content), MAP_FILE_CHUNK_SIZE):
+            if start:
+                time.sleep(delay)
+            yield content[start:start + MAP_FILE_CHUNK_SIZE]
+
+    return Response(
+        chunks(), status, headers, mimetype="application/zip")
+
+
+@app.route("/files/map.zip", methods=["GET", "POST"])
+def map_file():
+    """Map image honouring the Range and If-Range headers."""
+    match = re.match(r"bytes=(\d+)-$", request.headers.get("Range", ""))
+    if_range = request.headers.get("If-Range")
+    if not match or (if_range and if_range != MAP_FILE_ETAG):
+        return map_file_response(MAP_FILE_CONTENT)
+
+    start = int(match.group(1))
+    size = len(MAP_FILE_CONTENT)
+    if start >= size:
+        return Response(
+            b"", 416, {"Content-Range": "bytes */{}".format(size)})
+    return map_file_response(MAP_FILE_CONTENT[start:], 206, {
+        "Content-Range": "bytes {}-{}/{}".format(start, size - 1, size)})
+
+
+@app.route("/files/map-without-range.zip", methods=["GET", "POST"])
+def map_file_without_range():
+    """Map image always sent whole, the Range header is ignored."""
+    return map_file_response(MAP_FILE_CONTENT)
+
+
+@app.route("/files/map-slow.zip", methods=["GET", "POST"])
+def map_file_slow():
+    """Map image taking several seconds to be sent."""
+    return map_file_response(MAP_FILE_CONTENT, delay=0.5)
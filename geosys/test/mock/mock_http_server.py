@@ -1,3 +1,5 @@
+import socket
+import time
 from threading import Thread
 
 import requests
@@ -30,5 +32,16 @@ class MockApiServer(Thread):
         requests.get("http://localhost:%s/shutdown" % self.port)
         self.join()
 
+    def wait_until_ready(self, timeout=10):
+        """Wait until the server, started elsewhere, accepts connections."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                socket.create_connection(('localhost', self.port), 1).close()
+                return True
+            except OSError:
+                time.sleep(0.05)
+        return False
+
     def run(self):
         self.app.run(port=self.port)
\ No newline at end of file
@@ -10,7 +10,9 @@
 import os
 import unittest
 from dataclasses import field
+from unittest import mock
 
+from geosys.bridge_api.field_level_maps import FieldLevelMapsAPIClient
 from geosys.bridge_api_wrapper import BridgeAPI
 
 from multiprocessing import Process
@@ -33,11 +35,13 @@ class BridgeAPIWrapperTest(unittest.TestCase):
 
         self.username = 'test'
         self.password = 'test'
+        BridgeAPI._catalog_batch_support.clear()
 
         self.app_server = MockApiServer()
 
         self.server = Process(target=self.app_server.run)
         self.server.start()
+        self.app_server.wait_until_ready()
 
         message = ('API test server and its url need to be defined and available')
 
@@ -109,6 +113,90 @@ class BridgeAPIWrapperTest(unittest.TestCase):
             geometry=geom, crop=crop_type, sowing_date=sowing_date)
         self.assertTrue(len(coverages) > 0)
 
+    def test_get_coverage_batch(self):
+        """Test the coverage of many fields is split back per field."""
+
+        class CatalogClient(object):
+            """Catalog client answering with one result per field."""
+
+            def __init__(self):
+                self.requests = []
+
+            def get_catalog_imagery(self, data, filters=None):
+                self.requests.append(data)
+                return [
+                    {
+                        'image': {'id': season_field['geometry']},
+                        'seasonField': {
+                            'id': season_field['geometry'],
+                            'customerExternalId': season_field.get(
+                                'customerExternalId')
+                        }
+                    } for season_field in data['seasonFields']
+                ]
+
+        bridge_api = BridgeAPI(
+            username=self.username,
+            password=self.password,
+            region='na',
+            client_id='test',
+            client_secret='test.secret',
+            use_testing_service=False,
+            identity_url=self.app_server.url,
+            server_url=self.app_server.url
+        )
+        client = CatalogClient()
+        geometries = ['geometry_{}'.format(index) for index in range(5)]
+        with mock.patch.object(
+                bridge_api, 'field_level_maps_client', return_value=client):
+            coverages = bridge_api.get_catalog_imagery_batch(
+                geometries, 'CORN', '2024-01-01', batch_size=2)
+
+        self.assertEqual(len(client.requests), 3)
+        self.assertEqual(
+            [coverage[0]['image']['id'] for coverage in coverages],
+            geometries)
+        self.assertIsNone(
+            coverages[1][0]['seasonField']['customerExternalId'])
+
+    def test_get_coverage_batch_without_echo(self):
+        """Test fields are sent one by one once the server does not echo."""
+        bridge_api = BridgeAPI(
+            username=self.username,
+            password=self.password,
+            region='na',
+            client_id='test',
+            client_secret='test.secret',
+            use_testing_service=False,
+            identity_url=self.app_server.url,
+            server_url=self.app_server.url
+        )
+        geometries = ['geometry_{}'.format(index) for index in range(5)]
+        get_catalog_imagery = FieldLevelMapsAPIClient.get_catalog_imagery
+        with mock.patch.object(
+                FieldLevelMapsAPIClient, 'get_catalog_imagery',
+                autospec=True,
+                side_effect=get_catalog_imagery) as catalog_request:
+            coverages = bridge_api.get_catalog_imagery_batch(
+                geometries, 'CORN', '2024-01-01', batch_size=2)
+
+        self.assertEqual(len(coverages), 5)
+        for coverage in coverages:
+            self.assertEqual(len(coverage), 1)
+        # The first batch and its 2 fields, then the 3 other fields one by
+        # one instead of another batch of 2 and its fields.
+        self.assertEqual(catalog_request.call_count, 6)
+
+    def test_split_catalog_imagery(self):
+        """Test results are left untouched when a batch cannot be split."""
+        coverages_json = [
+            {'seasonField': {'customerExternalId': '0'}},
+            {'seasonField': {'customerExternalId': None}}
+        ]
+        self.assertIsNone(BridgeAPI.split_catalog_imagery(coverages_json, 2))
+        self.assertEqual(
+            coverages_json[0]['seasonField']['customerExternalId'], '0')
+
     def test_get_field_map(self):
         """Test we can successfully get the field map."""
         map_type_key = 'NDVI'
@@ -0,0 +1,125 @@
+# coding=utf-8
+"""Batch map production test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import tempfile
+import unittest
+from unittest import mock
+
+from typer.testing import CliRunner
+
+from geosys import cli
+from geosys.bridge_api.default import IMAGE_DATE, MAPS_TYPE, ZIPPED_TIFF
+from geosys.bridge_api.definitions import SOIL
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+
+class BatchMapProductionTest(unittest.TestCase):
+    """Test the batch map production works."""
+
+    def test_catalog_filters(self):
+        """Test the catalog filters of a date range."""
+        filters = cli.catalog_filters(SOIL['key'], '2024-01-01', '2024-06-30')
+        self.assertEqual(filters[MAPS_TYPE], 'NDVI')
+        self.assertEqual(
+            filters[IMAGE_DATE], '$between:2024-01-01|2024-06-30')
+        filters = cli.catalog_filters('EVI', None, '2024-06-30')
+        self.assertEqual(filters[MAPS_TYPE], 'EVI')
+        self.assertEqual(filters[IMAGE_DATE], '$lte:2024-06-30')
+
+    def test_run_batch(self):
+        """Test a map is created for every catalog result."""
+        bridge_api = mock.Mock()
+        bridge_api.get_catalog_imagery_batch.return_value = [
+            [
+                {'image': {'date': '2024-01-01'}, 'maps': [{}]},
+                {'image': {'date': '2024-02-01'}, 'maps': [{}]},
+            ],
+            {'message': 'Invalid geometry.'},
+        ]
+        fields = [('1', 'POINT (0 0)'), ('2', 'POINT (1 1)')]
+
+        def create_field_map(
+                bridge_api, map_specification, map_product, field_id,
+                *args):
+            return {
+                'field': field_id,
+                'image_date': map_specification['image']['date'],
+                'path': field_id,
+                'status': 'success'
+            }
+
+        with mock.patch.object(cli, 'catalog_cache', return_value=None), \
+                mock.patch.object(
+                    cli, 'create_field_map', side_effect=create_field_map):
+            summary = cli.run_batch(
+                bridge_api, fields, ['NDVI'], '2024-01-01', '2024-06-30',
+                '/tmp', ZIPPED_TIFF, 'CORN', '2024-01-01', latest_only=True,
+                concurrency=2)
+
+        self.assertEqual(
+            summary['maps'],
+            [{
+                'field': '1', 'image_date': '2024-02-01', 'path': '1',
+                'status': 'success'}])
+        self.assertEqual(summary['catalog_errors'][0]['field'], '2')
+
+    def test_reserve_filename(self):
+        """Test results of a field on the same day get different names."""
+        reserved = set()
+        first = {'image': {'date': '2024-01-01', 'sensor': 'SENTINEL_2'}}
+        second = {'image': {'date': '2024-01-01', 'sensor': 'LANDSAT_8'}}
+        output_dir = tempfile.mkdtemp()
+        names = [
+            cli.reserve_filename(
+                output_dir, result, 'NDVI', '1', ZIPPED_TIFF, reserved)
+            for result in (first, second)]
+        self.assertEqual(names, ['NDVI_1_2024-01-01', 'NDVI_1_2024-01-01_1'])
+
+    def test_create_field_map_shared_client(self):
+        """Test the map is created with the shared client."""
+        bridge_api = mock.Mock()
+        map_specification = {'image': {'date': '2024-01-01'}}
+        with mock.patch(
+                'geosys.ui.widgets.geosys_coverage_downloader.create_map',
+                return_value=(True, '')) as create_map:
+            summary = cli.create_field_map(
+                bridge_api, map_specification, 'NDVI', '1', 'POINT (0 0)',
+                '/tmp', 'NDVI_1_2024-01-01', ZIPPED_TIFF, 'CORN')
+        # create_map refreshes the token itself.
+        bridge_api.refresh_authentication.assert_not_called()
+        self.assertEqual(create_map.call_args[1]['bridge_api'], bridge_api)
+        self.assertEqual(summary['status'], 'success')
+
+        with mock.patch(
+                'geosys.ui.widgets.geosys_coverage_downloader.create_map',
+                return_value=(False, 'Invalid credentials.')):
+            summary = cli.create_field_map(
+                bridge_api, map_specification, 'NDVI', '1', 'POINT (0 0)',
+                '/tmp', 'NDVI_1_2024-01-01', ZIPPED_TIFF, 'CORN')
+        self.assertEqual(summary['status'], 'failed')
+        self.assertEqual(summary['message'], 'Invalid credentials.')
+
+    def test_produce_exits_qgis(self):
+        """Test QGIS is closed when the command fails."""
+        with tempfile.NamedTemporaryFile(suffix='.geojson') as fields, \
+                mock.patch.object(cli, 'QgsApplication') as application:
+            result = CliRunner().invoke(cli.app, [
+                fields.name, tempfile.gettempdir(), '--product', 'UNKNOWN'])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('Unsupported map products', result.output)
+        application.return_value.exitQgis.assert_called_once_with()
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(BatchMapProductionTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,181 @@
+# coding=utf-8
+"""File downloader test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import zipfile
+from multiprocessing import Process
+
+from geosys.test.utilities import get_qgis_app
+from geosys.utilities.downloader import (
+    PARTIAL_SUFFIX,
+    VALIDATOR_SUFFIX,
+    FileDownloader,
+    fetch_all_data,
+    fetch_data,
+    vsizip_path)
+
+from .mock.geosys_api_server_app import MAP_FILE_CONTENT, MAP_FILE_ETAG
+from .mock.mock_http_server import MockApiServer
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+QGIS_APP = get_qgis_app()
+
+
+class FileDownloaderTest(unittest.TestCase):
+    """Test the file downloader writes, resumes and restarts downloads."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.app_server = MockApiServer()
+        self.server = Process(target=self.app_server.run)
+        self.server.start()
+        self.app_server.wait_until_ready()
+
+        self.url = self.app_server.url + '/files/map.zip'
+        self.output_dir = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.output_dir, 'map.zip')
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.server.terminate()
+        self.server.join()
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def partial_file(self, url, size, validator=MAP_FILE_ETAG, **kwargs):
+        """Leave a partial file as an interrupted download does.
+
+        Its bytes differ from the map image, so they are only found in the
+        output when the download was resumed.
+        """
+        with open(self.output_path + PARTIAL_SUFFIX, 'wb') as partial_file:
+            partial_file.write(b'x' * size)
+        downloader = FileDownloader(url, self.output_path, **kwargs)
+        validator_path = self.output_path + PARTIAL_SUFFIX + VALIDATOR_SUFFIX
+        with open(validator_path, 'w') as validator_file:
+            json.dump({
+                'request': downloader.request_digest(),
+                'validator': validator
+            }, validator_file)
+
+    def output(self):
+        """Content of the output file."""
+        with open(self.output_path, 'rb') as output_file:
+            return output_file.read()
+
+    def test_chunked_download(self):
+        """Test the chunks of a download reach the output file."""
+        digest = fetch_data(
+            self.url, self.output_path, hash_algorithm='sha256')
+
+        self.assertEqual(self.output(), MAP_FILE_CONTENT)
+        self.assertEqual(
+            digest, hashlib.sha256(MAP_FILE_CONTENT).hexdigest())
+        self.assertEqual(os.listdir(self.output_dir), ['map.zip'])
+
+    def test_resume(self):
+        """Test a partial file is resumed from a 206 reply."""
+        self.partial_file(self.url, 1000)
+        fetch_data(self.url, self.output_path)
+        self.assertEqual(self.output(), b'x' * 1000 + MAP_FILE_CONTENT[1000:])
+        self.assertEqual(os.listdir(self.output_dir), ['map.zip'])
+
+        # Map images rendered by a POST are resumed too.
+        os.remove(self.output_path)
+        payload = {'seasonField': {'id': 'field_1'}}
+        self.partial_file(
+            self.url, 1000, method='POST', payload=payload, idempotent=True)
+        fetch_data(
+            self.url, self.output_path, method='POST', payload=payload,
+            idempotent=True)
+        self.assertEqual(self.output(), b'x' * 1000 + MAP_FILE_CONTENT[1000:])
+
+    def test_range_ignored(self):
+        """Test a 200 reply to a Range request restarts from zero."""
+        url = self.app_server.url + '/files/map-without-range.zip'
+        self.partial_file(url, 1000)
+        digest = fetch_data(url, self.output_path, hash_algorithm='sha256')
+        self.assertEqual(self.output(), MAP_FILE_CONTENT)
+        self.assertEqual(
+            digest, hashlib.sha256(MAP_FILE_CONTENT).hexdigest())
+
+    def test_range_not_satisfiable(self):
+        """Test a 416 reply resets the partial file."""
+        self.partial_file(self.url, len(MAP_FILE_CONTENT) + 1000)
+        fetch_data(self.url, self.output_path)
+        self.assertEqual(self.output(), MAP_FILE_CONTENT)
+
+    def test_validator_mismatch(self):
+        """Test a partial file of another version is not resumed."""
+        self.partial_file(self.url, 1000, validator='"map-file-0"')
+        fetch_data(self.url, self.output_path)
+        self.assertEqual(self.output(), MAP_FILE_CONTENT)
+
+        # Nor the partial file of another request.
+        os.remove(self.output_path)
+        self.partial_file(self.app_server.url + '/files/other.zip', 1000)
+        fetch_data(self.url, self.output_path)
+        self.assertEqual(self.output(), MAP_FILE_CONTENT)
+
+    def test_fetch_all_data(self):
+        """Test no file is kept when one of the downloads failed."""
+        downloads = [
+            (self.url, self.output_path),
+            (self.app_server.url + '/files/missing.zip',
+             os.path.join(self.output_dir, 'missing.zip'))]
+        with self.assertRaises(Exception):
+            fetch_all_data(downloads)
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+        fetch_all_data(downloads[:1])
+        self.assertEqual(self.output(), MAP_FILE_CONTENT)
+
+    def test_fetch_all_data_cancelled(self):
+        """Test the other downloads are cancelled after a failure."""
+        downloads = [
+            (self.app_server.url + '/files/map-slow.zip', self.output_path),
+            (self.app_server.url + '/files/missing.zip',
+             os.path.join(self.output_dir, 'missing.zip'))]
+        start = time.time()
+        with self.assertRaises(Exception) as context:
+            fetch_all_data(downloads)
+
+        # The slow download takes 8 seconds when it is not cancelled.
+        self.assertLess(time.time() - start, 4)
+        self.assertEqual(
+            str(context.exception),
+            'Sorry, the content was not found on the server.')
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+    def test_vsizip_path(self):
+        """Test a zip member is found by its extension."""
+        zip_path = os.path.join(self.output_dir, 'map.zip')
+        with zipfile.ZipFile(zip_path, 'w') as zip_file:
+            zip_file.writestr('map.SHP', b'')
+            zip_file.writestr('map.dbf', b'')
+
+        self.assertEqual(
+            vsizip_path(zip_path, ['.shp']),
+            '/vsizip/{}/map.SHP'.format(zip_path.replace(os.sep, '/')))
+        self.assertIsNone(vsizip_path(zip_path, ['.tif']))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(FileDownloaderTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,282 @@
+# coding=utf-8
+"""Coverage downloader test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from geosys.bridge_api.default import ZIPPED_TIFF
+from geosys.ui.widgets import geosys_coverage_downloader
+from geosys.utilities.product_cache import ProductCache, ThumbnailCache
+from geosys.utilities.settings import delete_setting, set_setting
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+
+class CreateMapTest(unittest.TestCase):
+    """Test the maps are created with a valid token."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.output_dir = tempfile.mkdtemp()
+        self.map_specification = {
+            'seasonField': {'id': 'field_1'},
+            'image': {'id': 'image_1', 'date': '2024-01-01'},
+            'maps': [{'type': 'NDVI', '_links': {}}]
+        }
+        self.bridge_api = self.client('user_1')
+        self.cache = ProductCache(None, 0)
+        patcher = mock.patch.object(
+            geosys_coverage_downloader, 'product_cache',
+            side_effect=lambda settings: self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def client(username):
+        """Authenticated client of a user."""
+        bridge_api = mock.Mock(
+            region='na', use_testing_service=False, username=username,
+            client_id='client', authenticated=True)
+        bridge_api.get_field_map.return_value = {}
+        return bridge_api
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def create_map(self):
+        """Create a NDVI map with the shared client."""
+        return geosys_coverage_downloader.create_map(
+            self.map_specification, 'NDVI', 'POINT (0 0)', self.output_dir,
+            'NDVI_1', ZIPPED_TIFF, 0, 0, 0, 0, data={},
+            bridge_api=self.bridge_api)
+
+    def test_token_refreshed(self):
+        """Test the shared client token is refreshed before each map."""
+        self.bridge_api.refresh_authentication.return_value = True
+        with mock.patch.object(
+                geosys_coverage_downloader, 'download_field_map',
+                return_value=(True, '')) as download_field_map:
+            self.assertEqual(self.create_map(), (True, ''))
+        self.bridge_api.refresh_authentication.assert_called_once_with()
+        self.assertEqual(
+            download_field_map.call_args[1]['bridge_api'], self.bridge_api)
+
+        self.bridge_api.refresh_authentication.return_value = False
+        self.bridge_api.authenticated = False
+        self.bridge_api.authentication_message = 'Invalid credentials.'
+        with mock.patch.object(
+                geosys_coverage_downloader,
+                'download_field_map') as download_field_map:
+            self.assertEqual(
+                self.create_map(), (False, 'Invalid credentials.'))
+        download_field_map.assert_not_called()
+
+    def test_cache_per_account(self):
+        """Test a cached map is only used by the account of its request."""
+        self.cache = ProductCache(os.path.join(self.output_dir, 'cache'), 1024)
+
+        def download_field_map(**kwargs):
+            with open(kwargs['destination_base_path'] + '.zip', 'wb') as f:
+                f.write(b'map')
+            return True, ''
+
+        with mock.patch.object(
+                geosys_coverage_downloader, 'download_field_map',
+                side_effect=download_field_map) as download:
+            self.create_map()
+            self.create_map()
+            self.assertEqual(download.call_count, 1)
+
+            self.bridge_api = self.client('user_2')
+            self.create_map()
+            self.assertEqual(download.call_count, 2)
+
+            # The credentials are checked before a cached map is used.
+            self.bridge_api.refresh_authentication.return_value = False
+            self.bridge_api.authenticated = False
+            self.bridge_api.authentication_message = 'Invalid credentials.'
+            self.assertEqual(
+                self.create_map(), (False, 'Invalid credentials.'))
+            self.bridge_api.refresh_authentication.assert_called_with()
+
+    def test_samz_map_shared_client(self):
+        """Test a SAMZ map is created with the shared client."""
+        self.bridge_api.get_samz_map.return_value = {}
+        with mock.patch.object(
+                geosys_coverage_downloader, 'BridgeAPI') as bridge_api_class, \
+                mock.patch.object(
+                    geosys_coverage_downloader, 'download_field_map',
+                    return_value=(True, '')) as download_field_map:
+            self.assertEqual(
+                geosys_coverage_downloader.create_samz_map(
+                    'POINT (0 0)', ['image_1'], ['2024-01-01'], 3,
+                    self.output_dir, 'SAMZ_3_zones', ZIPPED_TIFF,
+                    bridge_api=self.bridge_api),
+                (True, ''))
+        bridge_api_class.assert_not_called()
+        self.bridge_api.refresh_authentication.assert_called_once_with()
+        self.assertEqual(
+            download_field_map.call_args[1]['bridge_api'], self.bridge_api)
+
+
+class CoverageSearchTest(unittest.TestCase):
+    """Test the catalog search of many fields."""
+
+    def setUp(self):
+        """Runs before each test."""
+        ThumbnailCache.clear_memory()
+        for name, cache in (
+                ('catalog_cache', None),
+                ('thumbnail_cache', ThumbnailCache(None))):
+            patcher = mock.patch.object(
+                geosys_coverage_downloader, name, return_value=cache)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(ThumbnailCache.clear_memory)
+        self.field_errors = {}
+        self.thumbnails = {}
+        self.searcher_client = mock.Mock()
+        self.searcher_client.get_catalog_imagery_batch.side_effect = (
+            self.get_catalog_imagery_batch)
+        self.searcher_client.get_content.side_effect = self.get_content
+        self.thread = self.search_thread(['field_1', 'field_2', 'field_3'])
+        self.emitted = []
+        self.thread.data_downloaded.connect(
+            lambda result, thumbnail: self.emitted.append(
+                result['image']['id']))
+        self.errors = []
+        self.thread.field_error_occurred.connect(self.errors.append)
+
+    @staticmethod
+    def search_thread(geometries, max_workers=4):
+        """Search thread of a NDVI map of the fields."""
+        thread = geosys_coverage_downloader.CoverageSearchThread(
+            geometries, 'CORN', '2024-01-01', 'NDVI', None, 'All', None,
+            None, None, None, None, None, None, max_workers=max_workers)
+        thread.thumbnail_requests = lambda results, geometry, client: [
+            (result, 'thumbnail/' + result['image']['id'], None)
+            for result in results]
+        return thread
+
+    def get_catalog_imagery_batch(self, geometries, *args, **kwargs):
+        """Catalog results, one image per field."""
+        return [
+            {'message': self.field_errors[geometry]}
+            if geometry in self.field_errors
+            else [{'image': {'id': geometry}, 'seasonField': {}}]
+            for geometry in geometries]
+
+    def get_content(self, url, params=None, data=None):
+        """Thumbnail, waiting for its event when it has one."""
+        image_id = url.split('/')[-1]
+        if image_id in self.thumbnails:
+            self.thumbnails[image_id].wait(5)
+        return b'\x89PNG' + image_id.encode('utf-8')
+
+    def test_result_per_thumbnail(self):
+        """Test each result is emitted as soon as its thumbnail arrives."""
+        self.thumbnails['field_1'] = threading.Event()
+        self.thread.data_downloaded.connect(
+            lambda result, thumbnail: self.thumbnails['field_1'].set())
+        self.thread.search(self.searcher_client)
+
+        # Another field was shown while the first thumbnail was waited for.
+        self.assertNotEqual(self.emitted[0], 'field_1')
+        self.assertCountEqual(self.emitted, ['field_1', 'field_2', 'field_3'])
+
+    def test_failing_field(self):
+        """Test a failing field does not abort the other fields."""
+        self.field_errors['field_2'] = 'Invalid geometry.'
+        self.thread.search(self.searcher_client)
+
+        self.assertCountEqual(self.emitted, ['field_1', 'field_3'])
+        self.assertEqual(self.errors, ['Invalid geometry.'])
+
+    def test_need_stop(self):
+        """Test stopping the search drops the pending thumbnails."""
+        self.searcher_client.get_catalog_imagery_batch.side_effect = (
+            lambda *args, **kwargs: [[
+                {'image': {'id': image_id}, 'seasonField': {}}
+                for image_id in ('image_1', 'image_2', 'image_3')]])
+        self.thread = self.search_thread(['field_1'], max_workers=1)
+        self.thread.data_downloaded.connect(
+            lambda result, thumbnail: self.emitted.append(
+                result['image']['id']))
+        self.thread.data_downloaded.connect(
+            lambda result, thumbnail: setattr(self.thread, 'need_stop', True))
+        self.thumbnails['image_2'] = threading.Event()
+        self.addCleanup(self.thumbnails['image_2'].set)
+        self.thread.search(self.searcher_client)
+        self.thumbnails['image_2'].set()
+
+        self.assertEqual(self.emitted, ['image_1'])
+        # The last thumbnail was waiting for the only worker, it is dropped.
+        self.assertLess(self.searcher_client.get_content.call_count, 3)
+
+    def test_every_field_failing(self):
+        """Test the search only fails when every field failed."""
+        self.field_errors.update({
+            'field_1': 'Error 1.', 'field_2': 'Error 2.',
+            'field_3': 'Error 3.'})
+        with self.assertRaises(Exception) as context:
+            self.thread.search(self.searcher_client)
+        self.assertEqual(
+            str(context.exception), 'Error 1.; Error 2.; Error 3.')
+        self.assertEqual(len(self.errors), 3)
+
+        self.searcher_client.get_catalog_imagery_batch.side_effect = (
+            Exception('Service unavailable.'))
+        with self.assertRaises(Exception):
+            self.thread.search(self.searcher_client)
+
+
+class HotspotExecutorTest(unittest.TestCase):
+    """Test the hotspot thread pool lives as long as a batch of maps."""
+
+    def tearDown(self):
+        """Runs after each test."""
+        delete_setting('hotspot_max_workers')
+        geosys_coverage_downloader.shutdown_hotspot_executor()
+
+    def test_hotspot_executor(self):
+        """Test the pool is created when needed and shut down after."""
+        geosys_coverage_downloader.shutdown_hotspot_executor()
+        set_setting('hotspot_max_workers', 2)
+        future = geosys_coverage_downloader.submit_hotspot_request(
+            lambda value: value, 'hotspots')
+        self.assertEqual(future.result(), 'hotspots')
+        executor = geosys_coverage_downloader._hotspot_executor
+        self.assertEqual(executor._max_workers, 2)
+
+        geosys_coverage_downloader.shutdown_hotspot_executor()
+        self.assertIsNone(geosys_coverage_downloader._hotspot_executor)
+        with self.assertRaises(RuntimeError):
+            executor.submit(print)
+
+        # The next batch gets a new pool.
+        future = geosys_coverage_downloader.submit_hotspot_request(
+            lambda value: value, 'hotspots')
+        self.assertEqual(future.result(), 'hotspots')
+
+
+if __name__ == "__main__":
+    suite = unittest.TestSuite([
+        unittest.makeSuite(CreateMapTest),
+        unittest.makeSuite(CoverageSearchTest),
+        unittest.makeSuite(HotspotExecutorTest)])
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
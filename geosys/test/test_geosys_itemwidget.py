@@ -0,0 +1,91 @@
+# coding=utf-8
+"""Coverage search result model test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import unittest
+
+from qgis.PyQt.QtCore import QBuffer, QByteArray, QIODevice, Qt
+from PyQt5.QtGui import QColor, QImage
+
+from geosys.bridge_api.definitions import SAMPLE_MAP
+from geosys.test.utilities import get_qgis_app
+from geosys.ui.widgets.geosys_itemwidget import (
+    DESCRIPTION_ROLE, THUMBNAIL_SIZE, CoverageSearchResultModel)
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+QGIS_APP = get_qgis_app()
+
+
+class CoverageSearchResultModelTest(unittest.TestCase):
+    """Test the coverage search result model works."""
+
+    def setUp(self):
+        """Runs before each test."""
+        image = QImage(200, 100, QImage.Format_ARGB32)
+        image.fill(QColor('green'))
+        self.thumbnail_ba = QByteArray()
+        buffer = QBuffer(self.thumbnail_ba)
+        buffer.open(QIODevice.WriteOnly)
+        image.save(buffer, 'PNG')
+        self.coverage_map_json = {
+            'image': {
+                'collection': 'SENTINEL_2',
+                'date': '2018-10-18',
+                'sensor': 'SENTINEL_2'
+            },
+            'coverageType': 'CLEAR'
+        }
+
+    def test_rows(self):
+        """Test the results and messages of the model."""
+        model = CoverageSearchResultModel()
+        model.add_message('Searching...')
+        index = model.add_result(
+            self.coverage_map_json, self.thumbnail_ba, 'NDVI')
+        self.assertEqual(model.rowCount(), 2)
+        self.assertFalse(model.flags(model.index(0)) & Qt.ItemIsSelectable)
+        self.assertTrue(model.flags(index) & Qt.ItemIsSelectable)
+        self.assertEqual(index.data(Qt.UserRole), self.coverage_map_json)
+        self.assertEqual(
+            index.data(DESCRIPTION_ROLE),
+            ['SENTINEL_2', '2018-10-18', 'SENTINEL_2', 'CLEAR'])
+
+        model.removeRow(0)
+        self.assertEqual(model.rowCount(), 1)
+        self.assertEqual(model.index(0).data(Qt.UserRole)['coverageType'],
+                         'CLEAR')
+
+        index = model.add_result(
+            self.coverage_map_json, None, SAMPLE_MAP['key'])
+        self.assertEqual(
+            index.data(DESCRIPTION_ROLE), ['SENTINEL_2', SAMPLE_MAP['name']])
+        self.assertIsNone(index.data(Qt.DecorationRole))
+
+        model.clear()
+        self.assertEqual(model.rowCount(), 0)
+
+    def test_thumbnail(self):
+        """Test the thumbnail is scaled once and cached."""
+        model = CoverageSearchResultModel()
+        index = model.add_result(
+            self.coverage_map_json, self.thumbnail_ba, 'NDVI')
+        pixmap = index.data(Qt.DecorationRole)
+        self.assertEqual(pixmap.width(), THUMBNAIL_SIZE)
+        self.assertEqual(pixmap.height(), THUMBNAIL_SIZE // 2)
+        self.assertEqual(
+            index.data(Qt.DecorationRole).cacheKey(), pixmap.cacheKey())
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(CoverageSearchResultModelTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
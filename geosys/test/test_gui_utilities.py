@@ -0,0 +1,158 @@
+# coding=utf-8
+"""GUI utilities test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import tempfile
+import unittest
+
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsGeometry,
+    QgsPointXY,
+    QgsVectorLayer,
+    QgsWkbTypes)
+
+from qgis.PyQt.QtCore import QSettings
+
+from geosys.bridge_api.default import METERS_PER_DEGREE
+from geosys.test.utilities import get_qgis_app
+from geosys.utilities.gui_utilities import (
+    create_hotspot_layer,
+    geometry_wkt,
+    hotspot_layer_fields,
+    hotspot_layer_features,
+    session_geopackage,
+    sensor_simplify_tolerance,
+    wkt_geometries_from_layer)
+from geosys.utilities.settings import set_setting
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+QGIS_APP = get_qgis_app()
+
+
+class GuiUtilitiesTest(unittest.TestCase):
+    """Test the GUI utilities work."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.layer = QgsVectorLayer(
+            'Point?crs=EPSG:3857', 'points', 'memory')
+        features = []
+        for x in range(5):
+            feature = QgsFeature()
+            feature.setGeometry(QgsGeometry.fromPointXY(
+                QgsPointXY(x * 111319.49, 0)))
+            features.append(feature)
+        self.layer.dataProvider().addFeatures(features)
+
+    def test_wkt_geometries_from_layer(self):
+        """Test only the requested features are reprojected."""
+        feature_ids = [feature.id() for feature in self.layer.getFeatures()]
+        geometries = wkt_geometries_from_layer(
+            self.layer, QgsCoordinateReferenceSystem('EPSG:4326'),
+            feature_ids=feature_ids[3:])
+        self.assertEqual(len(geometries), 2)
+        x = QgsGeometry.fromWkt(geometries[0]).asPoint().x()
+        self.assertAlmostEqual(x, 3, places=3)
+
+        geometries = wkt_geometries_from_layer(self.layer, max_features=2)
+        self.assertEqual(len(geometries), 2)
+
+    def test_geometry_wkt(self):
+        """Test the WKT is simplified and its coordinates are trimmed."""
+        geometry = QgsGeometry.fromWkt(
+            'POLYGON ((0 0, 0.5 0.000001, 1 0, 1 1, 0 1, 0 0))')
+        self.assertEqual(geometry_wkt(geometry), geometry.asWkt())
+        self.assertEqual(
+            geometry_wkt(geometry, 0.0001),
+            'Polygon ((0 0, 1 0, 1 1, 0 1, 0 0))')
+        self.assertEqual(
+            geometry_wkt(QgsGeometry.fromWkt('POINT (0.123456789 1)'), 1),
+            'Point (0.123457 1)')
+
+    def test_sensor_simplify_tolerance(self):
+        """Test the tolerance follows the sensor resolution."""
+        settings = QSettings()
+        set_setting('simplify_geometries', False, qsettings=settings)
+        self.assertIsNone(sensor_simplify_tolerance('SENTINEL_2', settings))
+
+        set_setting('simplify_geometries', True, qsettings=settings)
+        self.assertAlmostEqual(
+            sensor_simplify_tolerance('SENTINEL_2', settings),
+            5.0 / METERS_PER_DEGREE)
+        self.assertAlmostEqual(
+            sensor_simplify_tolerance(None, settings),
+            2.9 / METERS_PER_DEGREE)
+        set_setting('simplify_geometries', False, qsettings=settings)
+
+    def test_create_hotspot_layer(self):
+        """Test the zones of a hotspot response are written at once."""
+        zones = [{
+            'id': zone,
+            'segments': [{
+                'id': segment,
+                'geometry': (
+                    'POLYGON (({0} 0, {1} 0, {1} 1, {0} 1, {0} 0))'.format(
+                        segment, segment + 1)),
+                'stats': {
+                    'mean': 1, 'max': 2, 'min': 0, 'area': 1,
+                    'std': None if segment else 0.5}
+            } for segment in range(3)]
+        } for zone in range(4)]
+        fields = hotspot_layer_fields('segments')
+        self.assertEqual(fields.count(), 6)
+        features = hotspot_layer_features(zones, 'segments', fields)
+        self.assertEqual(len(features), 12)
+        self.assertEqual(
+            features[0].geometry().wkbType(), QgsWkbTypes.MultiPolygon)
+
+        output_dir = tempfile.mkdtemp()
+        file_name = create_hotspot_layer(
+            zones, 'segments', 'segments', 'EPSG:4326', output_dir)
+        self.assertEqual(file_name, os.path.join(output_dir, 'segments.shp'))
+        layer = QgsVectorLayer(file_name, 'segments', 'ogr')
+        self.assertEqual(layer.featureCount(), 12)
+        self.assertEqual(layer.fields().count(), 6)
+
+    def test_create_hotspot_layer_geopackage(self):
+        """Test the hotspot layers of a session share a GeoPackage."""
+        spots = [
+            {'geometry': 'POINT ({} 0)'.format(x), 'segmentId': x,
+             'value': x * 10}
+            for x in range(5)]
+        output_dir = tempfile.mkdtemp()
+        set_setting('geopackage_output', True)
+        try:
+            first_uri = create_hotspot_layer(
+                spots, 'hotspots', 'first', 'EPSG:4326', output_dir)
+            second_uri = create_hotspot_layer(
+                spots[:2], 'hotspots', 'second', 'EPSG:4326', output_dir)
+        finally:
+            set_setting('geopackage_output', False)
+
+        geopackage = session_geopackage(output_dir)
+        self.assertTrue(os.path.exists(geopackage))
+        self.assertFalse(
+            [name for name in os.listdir(output_dir) if name.endswith('.shp')])
+        self.assertEqual(first_uri, '{}|layername=first'.format(geopackage))
+        self.assertEqual(
+            QgsVectorLayer(first_uri, 'first', 'ogr').featureCount(), 5)
+        self.assertEqual(
+            QgsVectorLayer(second_uri, 'second', 'ogr').featureCount(), 2)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(GuiUtilitiesTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
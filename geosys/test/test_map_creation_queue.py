@@ -0,0 +1,140 @@
+# coding=utf-8
+"""Map creation queue test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import unittest
+from unittest import mock
+
+from geosys.ui.widgets import geosys_map_creation_queue
+from geosys.ui.widgets.geosys_map_creation_queue import MapCreationQueue
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+
+class TaskManager(object):
+    """Task manager keeping the added tasks until they are run."""
+
+    def __init__(self):
+        """Constructor."""
+        self.tasks = []
+
+    def addTask(self, task):
+        """Record a task handed to the task manager.
+
+        :param task: The task.
+        :type task: QgsTask
+        """
+        self.tasks.append(task)
+
+    def run(self, task):
+        """Run a task and emit its result as the task manager does.
+
+        :param task: The task.
+        :type task: QgsTask
+        """
+        self.tasks.remove(task)
+        if task.run():
+            task.taskCompleted.emit()
+        else:
+            task.taskTerminated.emit()
+
+
+class MapCreationQueueTest(unittest.TestCase):
+    """Test the map creation queue."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.task_manager = TaskManager()
+        patcher = mock.patch.object(
+            geosys_map_creation_queue, 'QgsApplication')
+        application = patcher.start()
+        application.taskManager.return_value = self.task_manager
+        self.addCleanup(patcher.stop)
+        self.queue = MapCreationQueue(max_workers=2)
+        self.finished = []
+        self.queue.queue_finished.connect(self.finished.append)
+
+    @staticmethod
+    def create_map(feedback=None, **kwargs):
+        """Map creation function reporting half of its progress."""
+        feedback.setProgress(50)
+        if feedback.isCanceled():
+            return False, 'Download cancelled.'
+        return True, 'Map created.'
+
+    def submit(self, count):
+        """Submit map creation jobs to the queue."""
+        return [
+            self.queue.submit(
+                'map_{}'.format(index), self.create_map,
+                'map_{}'.format(index))
+            for index in range(count)]
+
+    def test_concurrency_limit(self):
+        """Test only max_workers tasks run at the same time."""
+        tasks = self.submit(3)
+        self.assertEqual(self.task_manager.tasks, tasks[:2])
+        self.assertEqual(self.queue.pending, tasks[2:])
+
+        self.task_manager.run(tasks[0])
+        self.assertEqual(self.task_manager.tasks, tasks[1:])
+        self.assertEqual(self.queue.pending, [])
+        self.assertEqual(self.finished, [])
+
+    def test_queue_finished(self):
+        """Test the queue reports every job once all are finished."""
+        tasks = self.submit(3)
+        self.task_manager.run(tasks[1])
+        self.task_manager.run(tasks[0])
+        self.assertEqual(self.finished, [])
+        self.task_manager.run(tasks[2])
+
+        self.assertEqual(self.finished, [[tasks[1], tasks[0], tasks[2]]])
+        self.assertTrue(all(task.is_success for task in tasks))
+        self.assertFalse(self.queue.is_running())
+
+    def test_feedback(self):
+        """Test the task forwards its feedback to the map function."""
+        task, = self.submit(1)
+        progress = []
+        task.progressChanged.connect(progress.append)
+        self.task_manager.run(task)
+        self.assertIn(50, progress)
+
+        task, = self.submit(1)
+        task.cancel()
+        self.assertTrue(task.feedback.isCanceled())
+
+    def test_cancel(self):
+        """Test cancel drops waiting jobs and aborts the running ones."""
+        tasks = self.submit(3)
+        self.queue.cancel()
+
+        self.assertEqual(self.queue.pending, [])
+        self.assertFalse(tasks[2].is_success)
+        self.assertTrue(tasks[0].feedback.isCanceled())
+        self.assertTrue(tasks[1].feedback.isCanceled())
+        # Reported once the running tasks have stopped.
+        self.assertEqual(self.finished, [])
+
+        self.task_manager.run(tasks[0])
+        self.task_manager.run(tasks[1])
+        self.assertEqual(len(self.finished), 1)
+        self.assertCountEqual(self.finished[0], tasks)
+        for task in tasks:
+            self.assertFalse(task.is_success)
+            self.assertEqual(task.message, 'Map creation cancelled.')
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(MapCreationQueueTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,163 @@
+# coding=utf-8
+"""Product cache test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from geosys.utilities.product_cache import ProductCache, ThumbnailCache
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+
+class ProductCacheTest(unittest.TestCase):
+    """Test the product cache works."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.cache_dir = tempfile.mkdtemp()
+        self.output_dir = tempfile.mkdtemp()
+        self.cache = ProductCache(self.cache_dir, 1024)
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def write_product(self, base_name, size=10):
+        """Write the files of a fake PNG product."""
+        base_path = os.path.join(self.output_dir, base_name)
+        for extension in ['.png', '.pgw', '.legend.png']:
+            with open(base_path + extension, 'wb') as product_file:
+                product_file.write(b'x' * size)
+        return base_path
+
+    def test_key(self):
+        """Test the key only depends on the request content."""
+        self.assertEqual(
+            ProductCache.key('na', 'NDVI', {'a': 1, 'b': 2}),
+            ProductCache.key('na', 'NDVI', {'b': 2, 'a': 1}))
+        self.assertNotEqual(
+            ProductCache.key('na', 'NDVI', 'image_1'),
+            ProductCache.key('na', 'NDVI', 'image_2'))
+
+    def test_put_and_get(self):
+        """Test a cached product is materialised under a new name."""
+        key = ProductCache.key('na', 'NDVI', 'image_1')
+        destination = os.path.join(self.output_dir, 'copy')
+        self.assertFalse(self.cache.get(key, destination))
+
+        self.cache.put(key, self.write_product('NDVI_1'))
+        self.assertTrue(self.cache.get(key, destination))
+        for extension in ['.png', '.pgw', '.legend.png']:
+            self.assertTrue(os.path.exists(destination + extension))
+
+    def test_eviction(self):
+        """Test the least recently used product is evicted first."""
+        first_key = ProductCache.key('first')
+        second_key = ProductCache.key('second')
+        third_key = ProductCache.key('third')
+        destination = os.path.join(self.output_dir, 'copy')
+
+        self.cache.put(first_key, self.write_product('first', 150))
+        time.sleep(0.05)
+        self.cache.put(second_key, self.write_product('second', 150))
+        time.sleep(0.05)
+        # Use the first product, the second one is now the oldest.
+        self.assertTrue(self.cache.get(first_key, destination))
+        time.sleep(0.05)
+        self.cache.put(third_key, self.write_product('third', 150))
+
+        self.assertTrue(self.cache.get(first_key, destination))
+        self.assertFalse(self.cache.get(second_key, destination))
+        self.assertTrue(self.cache.get(third_key, destination))
+
+    def test_disabled(self):
+        """Test nothing is stored when the size is 0."""
+        cache = ProductCache(self.cache_dir, 0)
+        key = ProductCache.key('na', 'NDVI', 'image_1')
+        cache.put(key, self.write_product('NDVI_1'))
+        self.assertFalse(
+            cache.get(key, os.path.join(self.output_dir, 'copy')))
+
+
+class ThumbnailCacheTest(unittest.TestCase):
+    """Test the thumbnail cache works."""
+
+    png = b'\x89PNG\r\n\x1a\n' + b'x' * 10
+
+    def setUp(self):
+        """Runs before each test."""
+        self.cache_dir = tempfile.mkdtemp()
+        ThumbnailCache.clear_memory()
+
+    def tearDown(self):
+        """Runs after each test."""
+        ThumbnailCache.clear_memory()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_memory_and_disk(self):
+        """Test a thumbnail is read back from memory, then from disk."""
+        cache = ThumbnailCache(self.cache_dir)
+        key = cache.key('url', 'image_1', 'POINT (0 0)', {'a': 1})
+        self.assertIsNone(cache.get(key))
+
+        cache.put(key, self.png)
+        self.assertEqual(bytes(cache.get(key)), self.png)
+
+        ThumbnailCache.clear_memory()
+        self.assertEqual(bytes(cache.get(key)), self.png)
+
+    def test_memory_eviction(self):
+        """Test the least recently used thumbnail leaves the memory."""
+        cache = ThumbnailCache(None, memory_size=2)
+        cache.put('first', self.png)
+        cache.put('second', self.png)
+        cache.get('first')
+        cache.put('third', self.png)
+
+        self.assertIsNotNone(cache.get('first'))
+        self.assertIsNone(cache.get('second'))
+        self.assertIsNotNone(cache.get('third'))
+
+    def test_disk_eviction(self):
+        """Test the least recently used thumbnail leaves the disk."""
+        cache = ThumbnailCache(self.cache_dir, disk_size=2 * len(self.png))
+        cache.put('first', self.png)
+        time.sleep(0.05)
+        cache.put('second', self.png)
+        time.sleep(0.05)
+        ThumbnailCache.clear_memory()
+        # Use the first thumbnail, the second one is now the oldest.
+        self.assertIsNotNone(cache.get('first'))
+        time.sleep(0.05)
+        cache.put('third', self.png)
+
+        ThumbnailCache.clear_memory()
+        self.assertIsNotNone(cache.get('first'))
+        self.assertIsNone(cache.get('second'))
+        self.assertIsNotNone(cache.get('third'))
+
+    def test_error_not_cached(self):
+        """Test a response which is not an image is not cached."""
+        cache = ThumbnailCache(self.cache_dir)
+        content = b'{"message": "error"}'
+        self.assertEqual(bytes(cache.put('key', content)), content)
+        self.assertIsNone(cache.get('key'))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ProductCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -4,7 +4,10 @@
 import os
 import sys
 import tempfile
+import threading
 import uuid
+from concurrent.futures import (
+    ThreadPoolExecutor, wait, FIRST_COMPLETED)
 
 from PyQt5.QtCore import QThread, pyqtSignal, QByteArray, QSettings, QDate
 from urllib3 import request
@@ -45,7 +48,11 @@ from geosys.bridge_api.default import (
     NDWI_THUMBNAIL_URL,
     GNDVI_THUMBNAIL_URL,
     OM_THUMBNAIL_URL,
-    SLOPE_THUMBNAIL_URL, LAI_THUMBNAIL_URL)
+    SLOPE_THUMBNAIL_URL, LAI_THUMBNAIL_URL,
+    THUMBNAIL_MAX_WORKERS,
+    HOTSPOT_MAX_WORKERS,
+    CATALOG_BATCH_SIZE,
+    ZIP_EXT)
 from geosys.bridge_api.definitions import (
     SAMZ,
     ELEVATION,
@@ -67,7 +74,10 @@ from geosys.bridge_api.definitions import (
     SAMPLE_MAP, CVI, NDMI, NDWI, GNDVI, SLOPE
 )
 from geosys.bridge_api_wrapper import BridgeAPI
-from geosys.utilities.downloader import fetch_data, extract_zip
+from geosys.utilities.downloader import (
+    fetch_all_data, fetch_data, extract_zip)
+from geosys.utilities.product_cache import (
+    catalog_cache, product_cache, thumbnail_cache)
 from geosys.utilities.qgis_settings import QGISSettings
 from geosys.utilities.settings import setting
 from geosys.utilities.gui_utilities import create_hotspot_layer
@@ -79,7 +89,47 @@ __license__ = "GPL version 3"
 __email__ = "rohmat@kartoza.com"
 __revision__ = "$Format:%H$"
 
-settings = QSettings()
+# Hotspot requests of all the maps being created share this executor, so
+# that they run while the maps are downloaded. It is created by the first
+# request and shut down when the batch of maps ends.
+_hotspot_executor = None
+_hotspot_executor_lock = threading.Lock()
+
+
+def submit_hotspot_request(function, *args, **kwargs):
+    """Run a hotspot request in the shared hotspot thread pool.
+
+    The pool is created when needed, its size is read from the
+    hotspot_max_workers setting.
+
+    :param function: Function making the request.
+    :type function: callable
+
+    :returns: Future of the request.
+    :rtype: concurrent.futures.Future
+    """
+    global _hotspot_executor
+    with _hotspot_executor_lock:
+        if _hotspot_executor is None:
+            max_workers = setting(
+                'hotspot_max_workers', HOTSPOT_MAX_WORKERS,
+                expected_type=int, qsettings=QSettings())
+            _hotspot_executor = ThreadPoolExecutor(
+                max_workers=max(1, max_workers))
+        return _hotspot_executor.submit(function, *args, **kwargs)
+
+
+def shutdown_hotspot_executor():
+    """Shut the hotspot thread pool down once a batch of maps ended.
+
+    The maps wait for their hotspots, so no request is running anymore.
+    A later request creates a new pool.
+    """
+    global _hotspot_executor
+    with _hotspot_executor_lock:
+        executor, _hotspot_executor = _hotspot_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
 
 
 class CoverageSearchThread(QThread):
@@ -89,6 +139,7 @@ class CoverageSearchThread(QThread):
     search_finished = pyqtSignal()
     data_downloaded = pyqtSignal(object, QByteArray)
     error_occurred = pyqtSignal(object)
+    field_error_occurred = pyqtSignal(object)
 
     def __init__(
             self,
@@ -106,6 +157,8 @@ class CoverageSearchThread(QThread):
             mutex,
             coverage_percent,
             n_planned_value=1.0,
+            max_workers=None,
+            refresh=False,
             parent=None):
         """Thread object wrapper for coverage search.
 
@@ -136,6 +189,14 @@ class CoverageSearchThread(QThread):
         :param n_planned_value: Value used by the nitrogen map requests
         :type n_planned_value: Numeric
 
+        :param max_workers: Maximum number of concurrent catalog and
+            thumbnail requests. Defaults to the thumbnail_max_workers
+            setting.
+        :type max_workers: int
+
+        :param refresh: Query the catalog even when its response is cached.
+        :type refresh: bool
+
         :param parent: Parent class.
         :type parent: QWidget
         """
@@ -155,6 +216,10 @@ class CoverageSearchThread(QThread):
         self.coverage_percent = coverage_percent if coverage_percent is not None else DEFAULT_COVERAGE_PERCENT
         self.n_planned_value = n_planned_value
         self.sample_map_data = None
+        self.max_workers = max_workers or setting(
+            'thumbnail_max_workers', THUMBNAIL_MAX_WORKERS,
+            expected_type=int, qsettings=QSettings())
+        self.refresh = refresh
         self.parent = parent
 
         # setup coverage search filters
@@ -279,8 +344,6 @@ class CoverageSearchThread(QThread):
         """Start thread job."""
         self.search_started.emit()
 
-        results = None
-
         # search
         try:
             self.mutex.lock()
@@ -289,349 +352,470 @@ class CoverageSearchThread(QThread):
                 *credentials_parameters_from_settings(),
                 proxies=QGISSettings.get_qgis_proxy())
 
-            catalog_imagery_api = [
-                S2REP['key'],
-                REFLECTANCE['key'],
-                CVIN['key'],
-                INSEASONFIELD_AVERAGE_NDVI['key'],
-                INSEASONFIELD_AVERAGE_LAI['key'],
-                INSEASONFIELD_AVERAGE_REVERSE_NDVI['key'],
-                INSEASONFIELD_AVERAGE_REVERSE_LAI['key'],
-                YGM['key'],
-                YVM['key'],
-                SAMZ['key'],
-                SAMPLE_MAP['key']
-            ]
-            collected_results = []
-            for geometry in self.geometries:
-                results = searcher_client.get_catalog_imagery(
-                    geometry, self.crop_type, self.sowing_date,
-                    filters=self.filters
-                )
+            self.search(searcher_client)
+
+            self.search_finished.emit()
+        except Exception as e:
+            error_text = (self.tr(
+                "Error of processing!\n{0}: {1}")).format(
+                unicode(sys.exc_info()[0].__name__), unicode(
+                    sys.exc_info()[1]))
+
+            error_text = f"{error_text},-- {e}"
+            self.error_occurred.emit(error_text)
+        finally:
+            self.mutex.unlock()
+
+    def search(self, searcher_client):
+        """Search every geometry and fetch the thumbnails concurrently.
 
-                if isinstance(results, dict) and results.get('message'):
-                    # TODO handle model_validation_error
-                    raise Exception(results['message'])
+        Catalog searches of all geometries and the thumbnail requests share
+        one bounded worker pool. The geometries are searched in batches of
+        the catalog_batch_size setting, one request per batch. The
+        thumbnails of a field are requested as soon as its catalog search
+        returns, and each result is emitted as
+        soon as its thumbnail arrives. Thumbnails found in the thumbnail
+        cache are emitted without a request. A failed field is reported
+        through field_error_occurred without stopping the other fields.
 
-                sample_map_ids = []
-                for result in results:
+        :param searcher_client: Authenticated Bridge API client.
+        :type searcher_client: BridgeAPI
 
-                    request_data = None
-                    result['seasonField']['geometry'] = geometry
-                    # Get thumbnail content
+        :raises: Exception - when the catalog search failed for every field.
+        """
+        # QSettings is not thread-safe, the search has its own instance.
+        settings = QSettings()
+        cache = catalog_cache(settings)
+        thumbnails = thumbnail_cache(settings)
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        catalog_futures = {}
+        thumbnail_futures = {}
+        field_errors = []
+        batch_size = max(1, setting(
+            'catalog_batch_size', CATALOG_BATCH_SIZE, expected_type=int,
+            qsettings=settings))
+        try:
+            for start in range(0, len(self.geometries), batch_size):
+                geometries = self.geometries[start:start + batch_size]
+                future = executor.submit(
+                    searcher_client.get_catalog_imagery_batch,
+                    geometries, self.crop_type, self.sowing_date,
+                    filters=self.filters, cache=cache, refresh=self.refresh,
+                    batch_size=batch_size)
+                catalog_futures[future] = geometries
+
+            pending = set(catalog_futures)
+            while pending and not self.need_stop:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
                     if self.need_stop:
                         break
+                    if future in thumbnail_futures:
+                        try:
+                            thumbnail = future.result()
+                        except Exception:
+                            # The result is still shown, without thumbnail.
+                            thumbnail = QByteArray()
+                        self.data_downloaded.emit(
+                            thumbnail_futures[future], thumbnail)
+                        continue
 
-                    requested_map = None
+                    geometries = catalog_futures[future]
+                    try:
+                        batch_results = future.result()
+                    except Exception as e:
+                        batch_results = [e] * len(geometries)
+
+                    for geometry, results in zip(geometries, batch_results):
+                        try:
+                            if isinstance(results, Exception):
+                                raise results
+                            if isinstance(results, dict) and (
+                                    results.get('message')):
+                                # TODO handle model_validation_error
+                                raise Exception(results['message'])
+
+                            thumbnail_requests = self.thumbnail_requests(
+                                results, geometry, searcher_client)
+                        except Exception as e:
+                            field_errors.append(str(e))
+                            self.field_error_occurred.emit(str(e))
+                            continue
+
+                        for result, thumbnail_url, data in (
+                                thumbnail_requests):
+                            if not thumbnail_url:
+                                self.data_downloaded.emit(
+                                    result, QByteArray())
+                                continue
+                            image_id = result.get('image', {}).get('id')
+                            key = thumbnails.key(
+                                thumbnail_url, image_id, geometry, data)
+                            thumbnail = thumbnails.get(key)
+                            if thumbnail is not None:
+                                self.data_downloaded.emit(result, thumbnail)
+                                continue
+                            thumbnail_future = executor.submit(
+                                self.fetch_thumbnail, searcher_client,
+                                thumbnails, key, thumbnail_url, data)
+                            thumbnail_futures[thumbnail_future] = result
+                            pending.add(thumbnail_future)
+        finally:
+            # Drop the requests not started yet when the search is stopped.
+            for future in list(catalog_futures) + list(thumbnail_futures):
+                future.cancel()
+            executor.shutdown(wait=False)
 
-                    nitrogen_products = [
-                        INSEASONFIELD_AVERAGE_NDVI['key'],
-                        INSEASONFIELD_AVERAGE_LAI['key'],
-                        INSEASONFIELD_AVERAGE_REVERSE_NDVI['key'],
-                        INSEASONFIELD_AVERAGE_REVERSE_LAI['key']
-                    ]
+        if field_errors and len(field_errors) == len(self.geometries):
+            raise Exception('; '.join(field_errors))
 
-                    if self.map_product == SAMPLE_MAP['key']:
-                        # Sample maps has a different workflow than other map products
-                        # The sample maps first needs to be created, and then the thumbnails
-                        # can be retrieved.
-
-                        # Required parameters for Sample maps
-                        image = result['image']
-                        image_id = image['id']
-                        image_date = image['date']
-                        season_field = result['seasonField']
-                        result_ids = {
-                            'image_id': image_id,
-                        }
-                        sample_map_ids.append(result_ids)
-
-                        data = []
-                        i = 0
-                        # Create the request data from the points and its
-                        # values
-                        for geom in self.geometries_points:
-                            val = self.attributes_points[i]
-                            data_item = {
-                                "geometry": geom,
-                                "value": val
-                            }
-                            data.append(data_item)
-
-                            i += 1
-                        # The final request data
-                        request_data = {
-                            "seasonField": {
-                                "Id": None,
-                                "geometry": geometry,
-                            },
-                            "properties": {
-                                "nutrientType": self.attribute_field
-                            },
-                            "data": data
-                        }
-
-                        self.sample_map_data = request_data
-
-                        bridge_api = BridgeAPI(
-                            *credentials_parameters_from_settings(),
-                            proxies=QGISSettings.get_qgis_proxy())
-
-                        # Set directLinks to false for Sample maps to receive direct links
-                        # API requires it to be as such
-                        params = {
-                            'directlinks': 'false',
-                            '$epsg-out': '4326'
-                        }
-
-                        # Perform the request
-                        # This step now "creates" the sample map
-                        field_map_json = bridge_api.get_field_map(
-                            SAMPLE_MAP['key'],
-                            None,
-                            image_date,
-                            image_id,
-                            sample_map_data=request_data,
-                            params=params
-                        )
-
-                    elif self.map_product in nitrogen_products:
-                        # Set the requested_map to the nitrogen product key
-                        if self.map_product == INSEASONFIELD_AVERAGE_NDVI['key']:
-                            requested_map = INSEASONFIELD_AVERAGE_NDVI
-                        elif self.map_product == INSEASONFIELD_AVERAGE_LAI['key']:
-                            requested_map = INSEASONFIELD_AVERAGE_LAI
-                        elif self.map_product == INSEASONFIELD_AVERAGE_REVERSE_NDVI['key']:
-                            requested_map = INSEASONFIELD_AVERAGE_REVERSE_NDVI
-                        elif self.map_product == INSEASONFIELD_AVERAGE_REVERSE_LAI['key']:
-                            requested_map = INSEASONFIELD_AVERAGE_REVERSE_LAI
-                    else:
-                        # All other map types
-                        for map_result in result['maps']:
-                            if self.map_product == REFLECTANCE['key'] or self.map_product == SOIL['key']:
-                                # Reflectance map and soil map type will make use of the
-                                # NDVI to show coverage results
-                                # This is a work-around provided by GeoSys
-                                if map_result['type'] == NDVI['key']:
-                                    requested_map = map_result
-                                    break
-                            else:  # Other map types
-                                if map_result['type'] == self.map_product or (
-                                        self.map_product == ELEVATION['key'] or self.map_product == SLOPE['key']):
-                                    requested_map = map_result
-                                    break
-
-                    # Workflow differs for Sample maps
-                    if not requested_map and self.map_product != SAMPLE_MAP['key']:
-                        continue
+    @staticmethod
+    def fetch_thumbnail(searcher_client, thumbnails, key, url, data):
+        """Request a thumbnail and store it in the thumbnail cache.
 
-                    thumbnail_url = None
-
-                    image = result['image']
-                    image_id = image['id']
-
-                    data = {
-                        "image": {
-                            "id": image_id
-                        },
-                        "seasonField":
-                            {
-                                "geometry": geometry,
-                                "crop": self.crop_type
-                        }
-                    }
-
-                    if self.map_product in [REFLECTANCE['key'], NDVI['key']]:
-                        # Reflectance map type should make use of the NDVI thumbnail
-                        # This is a work-around provided by GeoSys
-                        thumbnail_url = (
-                            NDVI_THUMBNAIL_URL.format(
-                                bridge_url=searcher_client.bridge_server
-                            ))
-                    elif self.map_product == EVI['key']:
-                        thumbnail_url = (
-                            EVI_THUMBNAIL_URL.format(
-                                bridge_url=searcher_client.bridge_server
-                            ))
-                    elif self.map_product == CVIN['key']:
-                        thumbnail_url = (
-                            CVIN_THUMBNAIL_URL.format(
-                                bridge_url=searcher_client.bridge_server
-                            ))
-                    elif self.map_product == CVI['key']:
-                        thumbnail_url = (
-                            CVI_THUMBNAIL_URL.format(
-                                bridge_url=searcher_client.bridge_server
-                            ))
-                    elif self.map_product == S2REP['key']:
-                        thumbnail_url = (
-                            S2REP_THUMBNAIL_URL.format(
-                                bridge_url=searcher_client.bridge_server
-                            ))
-                    elif self.map_product == NDMI['key']:
-                        thumbnail_url = (
-                            NDMI_THUMBNAIL_URL.format(
-                                bridge_url=searcher_client.bridge_server
-                            ))
-                    elif self.map_product == NDWI['key']:
-                        thumbnail_url = (
-                            NDWI_THUMBNAIL_URL.format(
-                                bridge_url=searcher_client.bridge_server
-                            ))
-                    elif self.map_product == LAI['key']:
-                        thumbnail_url = (
-                            LAI_THUMBNAIL_URL.format(
-                                bridge_url=searcher_client.bridge_server
-                            ))
-                    elif self.map_product == GNDVI['key']:
-                        thumbnail_url = (
-                            GNDVI_THUMBNAIL_URL.format(
-                                bridge_url=searcher_client.bridge_server
-                            ))
-                    elif self.map_product == SLOPE['key']:
-                        thumbnail_url = (
-                            SLOPE_THUMBNAIL_URL.format(
-                                bridge_url=searcher_client.bridge_server
-                            ))
-                    elif self.map_product == SOIL['key']:
-                        thumbnail_url = (
-                            SAMPLEMAP_THUMBNAIL_URL.format(
-                                bridge_url=searcher_client.bridge_server,
-                                mapType='SOILMAP'
-                            ))
-                    elif self.map_product == OM['key']:
-                        thumbnail_url = (
-                            OM_THUMBNAIL_URL.format(
-                                bridge_url=searcher_client.bridge_server
-                            )
-                        )
-                        data.update({
-                            "AverageOrganicMatter": 100
-                        })
-                    elif self.map_product in nitrogen_products:
-                        # Nitrogen map type
-                        if self.map_product == INSEASONFIELD_AVERAGE_NDVI['key']:
-                            #  AVERAGE NDVI
-                            thumbnail_url = (
-                                NITROGEN_THUMBNAIL_URL.format(
-                                    bridge_url=searcher_client.bridge_server,
-                                    nitrogen_map_type=INSEASONFIELD_AVERAGE_NDVI['key']))
-                            data.update({
-                                "nPlanned": f"{self.n_planned_value}",
-                                "nMin": 0.001,
-                                "nMax": 120,
-                            })
-
-                        elif self.map_product == INSEASONFIELD_AVERAGE_LAI['key']:
-                            #  AVERAGE LAI
-                            thumbnail_url = (
-                                NITROGEN_THUMBNAIL_URL.format(
-                                    bridge_url=searcher_client.bridge_server,
-                                    nitrogen_map_type=INSEASONFIELD_AVERAGE_LAI['key']))
-                            data.update({
-                                "nPlanned": f"{self.n_planned_value}",
-                                "nMin": 0.001,
-                                "nMax": 120,
-                            })
-                        elif self.map_product == INSEASONFIELD_AVERAGE_REVERSE_NDVI['key']:
-                            #  AVERAGE REVERSE NDVI
-                            thumbnail_url = (
-                                NITROGEN_THUMBNAIL_URL.format(
-                                    bridge_url=searcher_client.bridge_server,
-                                    nitrogen_map_type=INSEASONFIELD_AVERAGE_REVERSE_NDVI['key']))
-                            data.update({
-                                "nPlanned": f"{self.n_planned_value}",
-                                "nMin": 0.001,
-                                "nMax": 120,
-                            })
-                        elif self.map_product == INSEASONFIELD_AVERAGE_REVERSE_LAI['key']:
-                            #  AVERAGE REVERSE LAI
-                            thumbnail_url = (
-                                NITROGEN_THUMBNAIL_URL.format(
-                                    bridge_url=searcher_client.bridge_server,
-                                    nitrogen_map_type=INSEASONFIELD_AVERAGE_REVERSE_LAI['key']))
-                            data.update({
-                                "nPlanned": f"{self.n_planned_value}",
-                                "nMin": 0.001,
-                                "nMax": 120,
-                            })
-                    elif self.map_product == YGM['key'] or self.map_product == YVM['key']:
-                        if self.map_product == YGM['key']:
-                            data.update({
-                                "HistoricalYieldAverage": 55,
-                                "MaxYieldGoal": 120,
-                                "MinYieldGoal": 50,
-                            })
-                            thumbnail_url = (
-                                YGM_THUMBNAIL_URL.format(
-                                    bridge_url=searcher_client.bridge_server
-                                ))
-                        else:
-                            data.update({
-                                "historicalyieldaverage": 50,
-                            })
-                            thumbnail_url = (
-                                YPM_THUMBNAIL_URL.format(
-                                    bridge_url=searcher_client.bridge_server
-                                ))
-                    elif self.map_product == SAMZ['key']:
-                        thumbnail_url = (
-                            SAMZ_THUMBNAIL_URL.format(
-                                bridge_url=searcher_client.bridge_server
-                            ))
-                    elif self.map_product == SAMPLE_MAP['key']:
-                        # Sample maps
-                        thumbnail_url = (
-                            SAMPLEMAP_THUMBNAIL_URL.format(
-                                bridge_url=searcher_client.bridge_server,
-                                mapType="SAMPLEMAP"
-                            ))
-
-                        data = request_data
-
-                    elif self.map_product == COLOR_COMPOSITION['key']:
-                        # Sample maps
-                        thumbnail_url = (
-                            COLOR_COMPOSITION_THUMBNAIL_URL.format(
-                                bridge_url=searcher_client.bridge_server
-                            ))
-                    else:  # All other map types
-                        thumbnail_url = None
-
-                    if thumbnail_url:
-                        thumbnail_content = searcher_client.get_content(
-                            thumbnail_url, params={}, data=data)
-                        thumbnail_ba = QByteArray(thumbnail_content)
-                    else:
-
-                        thumbnail_ba = bytes('', 'utf-8')
-
-                    collected_results.append({
-                        'data': result,
-                        'thumbnail': thumbnail_ba
-                    })
+        :param searcher_client: Authenticated Bridge API client.
+        :type searcher_client: BridgeAPI
+
+        :param thumbnails: Thumbnail cache.
+        :type thumbnails: ThumbnailCache
+
+        :param key: Cache key of the thumbnail.
+        :type key: str
+
+        :param url: Thumbnail url.
+        :type url: str
+
+        :param data: Thumbnail request payload.
+        :type data: dict
+
+        :return: The thumbnail.
+        :rtype: QByteArray
+        """
+        content = searcher_client.get_content(url, params={}, data=data)
+        return thumbnails.put(key, content)
+
+    def thumbnail_requests(self, results, geometry, searcher_client):
+        """Build the thumbnail requests of a single field search.
+
+        :param results: Catalog-imagery results of the field.
+        :type results: list
+
+        :param geometry: Geometry of the field in WKT format.
+        :type geometry: str
+
+        :param searcher_client: Authenticated Bridge API client.
+        :type searcher_client: BridgeAPI
+
+        :return: List of (result, thumbnail url, payload).
+        :rtype: list
+        """
+        thumbnail_requests = []
+        for result in results:
+            if self.need_stop:
+                break
+
+            thumbnail_request = self.thumbnail_request(
+                result, geometry, searcher_client)
+            if thumbnail_request is None:
+                continue
+            thumbnail_url, data = thumbnail_request
+            thumbnail_requests.append((result, thumbnail_url, data))
+
+            if self.map_product == SAMPLE_MAP['key']:
+                # Only one sample needs to be shown
+                # One set created from the points
+                break
+
+        return thumbnail_requests
+
+    def thumbnail_request(self, result, geometry, searcher_client):
+        """Build the thumbnail request of a single catalog result.
 
-                    if self.map_product == SAMPLE_MAP['key']:
-                        # Only one sample needs to be shown
-                        # One set created from the points
+        :param result: Single catalog-imagery result.
+        :type result: dict
+
+        :param geometry: Geometry of the result in WKT format.
+        :type geometry: str
+
+        :param searcher_client: Authenticated Bridge API client.
+        :type searcher_client: BridgeAPI
+
+        :return: Tuple of thumbnail url and request payload, or None when the
+            result has no map for the requested product.
+        :rtype: tuple, None
+        """
+        request_data = None
+        result['seasonField']['geometry'] = geometry
+
+        requested_map = None
+
+        nitrogen_products = [
+            INSEASONFIELD_AVERAGE_NDVI['key'],
+            INSEASONFIELD_AVERAGE_LAI['key'],
+            INSEASONFIELD_AVERAGE_REVERSE_NDVI['key'],
+            INSEASONFIELD_AVERAGE_REVERSE_LAI['key']
+        ]
+
+        if self.map_product == SAMPLE_MAP['key']:
+            # Sample maps has a different workflow than other map products
+            # The sample maps first needs to be created, and then the thumbnails
+            # can be retrieved.
+
+            # Required parameters for Sample maps
+            image = result['image']
+            image_id = image['id']
+            image_date = image['date']
+            season_field = result['seasonField']
+
+            data = []
+            i = 0
+            # Create the request data from the points and its
+            # values
+            for geom in self.geometries_points:
+                val = self.attributes_points[i]
+                data_item = {
+                    "geometry": geom,
+                    "value": val
+                }
+                data.append(data_item)
+
+                i += 1
+            # The final request data
+            request_data = {
+                "seasonField": {
+                    "Id": None,
+                    "geometry": geometry,
+                },
+                "properties": {
+                    "nutrientType": self.attribute_field
+                },
+                "data": data
+            }
+
+            self.sample_map_data = request_data
+
+            # Set directLinks to false for Sample maps to receive direct links
+            # API requires it to be as such
+            params = {
+                'directlinks': 'false',
+                '$epsg-out': '4326'
+            }
+
+            # Perform the request
+            # This step now "creates" the sample map
+            field_map_json = searcher_client.get_field_map(
+                SAMPLE_MAP['key'],
+                None,
+                image_date,
+                image_id,
+                sample_map_data=request_data,
+                params=params
+            )
+
+        elif self.map_product in nitrogen_products:
+            # Set the requested_map to the nitrogen product key
+            if self.map_product == INSEASONFIELD_AVERAGE_NDVI['key']:
+                requested_map = INSEASONFIELD_AVERAGE_NDVI
+            elif self.map_product == INSEASONFIELD_AVERAGE_LAI['key']:
+                requested_map = INSEASONFIELD_AVERAGE_LAI
+            elif self.map_product == INSEASONFIELD_AVERAGE_REVERSE_NDVI['key']:
+                requested_map = INSEASONFIELD_AVERAGE_REVERSE_NDVI
+            elif self.map_product == INSEASONFIELD_AVERAGE_REVERSE_LAI['key']:
+                requested_map = INSEASONFIELD_AVERAGE_REVERSE_LAI
+        else:
+            # All other map types
+            for map_result in result['maps']:
+                if self.map_product == REFLECTANCE['key'] or self.map_product == SOIL['key']:
+                    # Reflectance map and soil map type will make use of the
+                    # NDVI to show coverage results
+                    # This is a work-around provided by GeoSys
+                    if map_result['type'] == NDVI['key']:
+                        requested_map = map_result
+                        break
+                else:  # Other map types
+                    if map_result['type'] == self.map_product or (
+                            self.map_product == ELEVATION['key'] or self.map_product == SLOPE['key']):
+                        requested_map = map_result
                         break
 
-            # Using this trick, rendering each list item will not be delayed
-            # by thumbnail request.
-            for result in collected_results:
-                self.data_downloaded.emit(result['data'], result['thumbnail'])
+        # Workflow differs for Sample maps
+        if not requested_map and self.map_product != SAMPLE_MAP['key']:
+            return None
 
-            self.search_finished.emit()
-        except Exception as e:
-            error_text = (self.tr(
-                "Error of processing!\n{0}: {1}")).format(
-                unicode(sys.exc_info()[0].__name__), unicode(
-                    sys.exc_info()[1]))
+        thumbnail_url = None
 
-            error_text = f"{error_text},-- {e}"
-            self.error_occurred.emit(error_text)
-        finally:
-            self.mutex.unlock()
+        image = result['image']
+        image_id = image['id']
+
+        data = {
+            "image": {
+                "id": image_id
+            },
+            "seasonField":
+                {
+                    "geometry": geometry,
+                    "crop": self.crop_type
+            }
+        }
+
+        if self.map_product in [REFLECTANCE['key'], NDVI['key']]:
+            # Reflectance map type should make use of the NDVI thumbnail
+            # This is a work-around provided by GeoSys
+            thumbnail_url = (
+                NDVI_THUMBNAIL_URL.format(
+                    bridge_url=searcher_client.bridge_server
+                ))
+        elif self.map_product == EVI['key']:
+            thumbnail_url = (
+                EVI_THUMBNAIL_URL.format(
+                    bridge_url=searcher_client.bridge_server
+                ))
+        elif self.map_product == CVIN['key']:
+            thumbnail_url = (
+                CVIN_THUMBNAIL_URL.format(
+                    bridge_url=searcher_client.bridge_server
+                ))
+        elif self.map_product == CVI['key']:
+            thumbnail_url = (
+                CVI_THUMBNAIL_URL.format(
+                    bridge_url=searcher_client.bridge_server
+                ))
+        elif self.map_product == S2REP['key']:
+            thumbnail_url = (
+                S2REP_THUMBNAIL_URL.format(
+                    bridge_url=searcher_client.bridge_server
+                ))
+        elif self.map_product == NDMI['key']:
+            thumbnail_url = (
+                NDMI_THUMBNAIL_URL.format(
+                    bridge_url=searcher_client.bridge_server
+                ))
+        elif self.map_product == NDWI['key']:
+            thumbnail_url = (
+                NDWI_THUMBNAIL_URL.format(
+                    bridge_url=searcher_client.bridge_server
+                ))
+        elif self.map_product == LAI['key']:
+            thumbnail_url = (
+                LAI_THUMBNAIL_URL.format(
+                    bridge_url=searcher_client.bridge_server
+                ))
+        elif self.map_product == GNDVI['key']:
+            thumbnail_url = (
+                GNDVI_THUMBNAIL_URL.format(
+                    bridge_url=searcher_client.bridge_server
+                ))
+        elif self.map_product == SLOPE['key']:
+            thumbnail_url = (
+                SLOPE_THUMBNAIL_URL.format(
+                    bridge_url=searcher_client.bridge_server
+                ))
+        elif self.map_product == SOIL['key']:
+            thumbnail_url = (
+                SAMPLEMAP_THUMBNAIL_URL.format(
+                    bridge_url=searcher_client.bridge_server,
+                    mapType='SOILMAP'
+                ))
+        elif self.map_product == OM['key']:
+            thumbnail_url = (
+                OM_THUMBNAIL_URL.format(
+                    bridge_url=searcher_client.bridge_server
+                )
+            )
+            data.update({
+                "AverageOrganicMatter": 100
+            })
+        elif self.map_product in nitrogen_products:
+            # Nitrogen map type
+            if self.map_product == INSEASONFIELD_AVERAGE_NDVI['key']:
+                #  AVERAGE NDVI
+                thumbnail_url = (
+                    NITROGEN_THUMBNAIL_URL.format(
+                        bridge_url=searcher_client.bridge_server,
+                        nitrogen_map_type=INSEASONFIELD_AVERAGE_NDVI['key']))
+                data.update({
+                    "nPlanned": f"{self.n_planned_value}",
+                    "nMin": 0.001,
+                    "nMax": 120,
+                })
+
+            elif self.map_product == INSEASONFIELD_AVERAGE_LAI['key']:
+                #  AVERAGE LAI
+                thumbnail_url = (
+                    NITROGEN_THUMBNAIL_URL.format(
+                        bridge_url=searcher_client.bridge_server,
+                        nitrogen_map_type=INSEASONFIELD_AVERAGE_LAI['key']))
+                data.update({
+                    "nPlanned": f"{self.n_planned_value}",
+                    "nMin": 0.001,
+                    "nMax": 120,
+                })
+            elif self.map_product == INSEASONFIELD_AVERAGE_REVERSE_NDVI['key']:
+                #  AVERAGE REVERSE NDVI
+                thumbnail_url = (
+                    NITROGEN_THUMBNAIL_URL.format(
+                        bridge_url=searcher_client.bridge_server,
+                        nitrogen_map_type=INSEASONFIELD_AVERAGE_REVERSE_NDVI['key']))
+                data.update({
+                    "nPlanned": f"{self.n_planned_value}",
+                    "nMin": 0.001,
+                    "nMax": 120,
+                })
+            elif self.map_product == INSEASONFIELD_AVERAGE_REVERSE_LAI['key']:
+                #  AVERAGE REVERSE LAI
+                thumbnail_url = (
+                    NITROGEN_THUMBNAIL_URL.format(
+                        bridge_url=searcher_client.bridge_server,
+                        nitrogen_map_type=INSEASONFIELD_AVERAGE_REVERSE_LAI['key']))
+                data.update({
+                    "nPlanned": f"{self.n_planned_value}",
+                    "nMin": 0.001,
+                    "nMax": 120,
+                })
+        elif self.map_product == YGM['key'] or self.map_product == YVM['key']:
+            if self.map_product == YGM['key']:
+                data.update({
+                    "HistoricalYieldAverage": 55,
+                    "MaxYieldGoal": 120,
+                    "MinYieldGoal": 50,
+                })
+                thumbnail_url = (
+                    YGM_THUMBNAIL_URL.format(
+                        bridge_url=searcher_client.bridge_server
+                    ))
+            else:
+                data.update({
+                    "historicalyieldaverage": 50,
+                })
+                thumbnail_url = (
+                    YPM_THUMBNAIL_URL.format(
+                        bridge_url=searcher_client.bridge_server
+                    ))
+        elif self.map_product == SAMZ['key']:
+            thumbnail_url = (
+                SAMZ_THUMBNAIL_URL.format(
+                    bridge_url=searcher_client.bridge_server
+                ))
+        elif self.map_product == SAMPLE_MAP['key']:
+            # Sample maps
+            thumbnail_url = (
+                SAMPLEMAP_THUMBNAIL_URL.format(
+                    bridge_url=searcher_client.bridge_server,
+                    mapType="SAMPLEMAP"
+                ))
+
+            data = request_data
+
+        elif self.map_product == COLOR_COMPOSITION['key']:
+            # Sample maps
+            thumbnail_url = (
+                COLOR_COMPOSITION_THUMBNAIL_URL.format(
+                    bridge_url=searcher_client.bridge_server
+                ))
+        else:  # All other map types
+            thumbnail_url = None
+
+        return thumbnail_url, data
 
     def stop(self):
         """Stop thread job."""
@@ -655,7 +839,9 @@ def create_map(
         crop_type=None,
         gain=None,
         offset=None,
-        zone_count=None
+        zone_count=None,
+        bridge_api=None,
+        feedback=None
 ):
     """Create map based on given parameters.
 
@@ -719,6 +905,14 @@ def create_map(
 
     :param params: Map creation parameters.
     :type params: dict
+
+    :param bridge_api: Authenticated Bridge API client, shared by the maps
+        of a batch. Its token is refreshed before the map is created. A
+        client is created from the user settings when not given.
+    :type bridge_api: BridgeAPI
+
+    :param feedback: Optional feedback, canceling it aborts the downloads.
+    :type feedback: QgsFeedback
     """""
     # Construct map creation parameters
     map_specification.update(map_specification['maps'][0])
@@ -789,9 +983,35 @@ def create_map(
         data.update(params or {})
         data.update(request_data)
 
-    bridge_api = BridgeAPI(
-        *credentials_parameters_from_settings(),
-        proxies=QGISSettings.get_qgis_proxy())
+    bridge_api = map_creation_client(bridge_api)
+    if not bridge_api.authenticated:
+        return False, bridge_api.authentication_message
+
+    # A product already downloaded by the same account with the same
+    # request is taken from the product cache. Hotspots are written as
+    # separate layers, so maps requesting them are not cached.
+    settings = QSettings()
+    cache = product_cache(settings)
+    cache_key = None
+    if cache.enabled and not (
+            data and data.get('zoning') and data.get('hotspot')):
+        cache_key = cache.key(
+            bridge_api.region,
+            bridge_api.use_testing_service,
+            bridge_api.username,
+            bridge_api.client_id,
+            map_type_key,
+            image_id,
+            season_field_geom,
+            data,
+            [n_planned_value, yield_val, min_yield_val, max_yield_val,
+             zone_count, crop_type, gain, offset],
+            output_map_format['api_key'],
+            setting(
+                'keep_zipped_products', False, expected_type=bool,
+                qsettings=settings))
+        if cache.get(cache_key, destination_base_path):
+            return True, '{} map loaded from the cache.'.format(map_type_key)
 
     if map_type_key == SAMPLE_MAP['key']:
 
@@ -839,18 +1059,45 @@ def create_map(
         headers=bridge_api.headers,
         map_specification=map_specification,
         data=data,
-        image_id=image_id, zone_count=zone_count)
+        image_id=image_id, zone_count=zone_count,
+        bridge_api=bridge_api, feedback=feedback)
+
+    if result and cache_key:
+        cache.put(cache_key, destination_base_path)
 
     return result, message
 
 
+def map_creation_client(bridge_api=None):
+    """Bridge API client creating a map.
+
+    Batches outlive a token, so the client shared by the maps of a batch
+    gets a valid one from the token store before each map.
+
+    :param bridge_api: Client shared by the maps of a batch. A client is
+        created from the user settings when not given.
+    :type bridge_api: BridgeAPI
+
+    :return: The client, check its authenticated attribute before use.
+    :rtype: BridgeAPI
+    """
+    if bridge_api:
+        bridge_api.refresh_authentication()
+        return bridge_api
+    return BridgeAPI(
+        *credentials_parameters_from_settings(),
+        proxies=QGISSettings.get_qgis_proxy())
+
+
 def create_difference_map(
         map_specifications,
         output_dir,
         filename,
         output_map_format,
         data=None,
-        params=None):
+        params=None,
+        bridge_api=None,
+        feedback=None):
     """Create map based on given parameters.
 
     :param map_specifications: List of map coverage specification.
@@ -898,6 +1145,14 @@ def create_difference_map(
 
     :param params: Map creation parameters.
     :type params: dict
+
+    :param bridge_api: Authenticated Bridge API client, shared by the maps
+        of a batch. Its token is refreshed before the map is created. A
+        client is created from the user settings when not given.
+    :type bridge_api: BridgeAPI
+
+    :param feedback: Optional feedback, canceling it aborts the downloads.
+    :type feedback: QgsFeedback
     """""
     # Difference map only created from 2 map specifications.
     # Map type and season field id should always be the same between two map.
@@ -920,9 +1175,9 @@ def create_difference_map(
         latest_image_date = earliest_date.toString('yyyy-MM-dd')
         earliest_image_date = latest_date.toString('yyyy-MM-dd')
 
-    bridge_api = BridgeAPI(
-        *credentials_parameters_from_settings(),
-        proxies=QGISSettings.get_qgis_proxy())
+    bridge_api = map_creation_client(bridge_api)
+    if not bridge_api.authenticated:
+        return False, bridge_api.authentication_message
     difference_map_json = bridge_api.get_difference_map(
         map_type_key, season_field_id,
         earliest_image_date, latest_image_date, **data)
@@ -933,7 +1188,9 @@ def create_difference_map(
         destination_base_path=destination_base_path,
         output_map_format=output_map_format,
         headers=bridge_api.headers,
-        data=data)
+        data=data,
+        bridge_api=bridge_api,
+        feedback=feedback)
 
 
 def create_samz_map(
@@ -945,7 +1202,9 @@ def create_samz_map(
         filename,
         output_map_format,
         data=None,
-        params=None):
+        params=None,
+        bridge_api=None,
+        feedback=None):
     """Create map based on given parameters.
 
     :param season_field_id: ID of the season field.
@@ -977,6 +1236,14 @@ def create_samz_map(
 
     :param params: Map creation parameters.
     :type params: dict
+
+    :param bridge_api: Authenticated Bridge API client, shared by the maps
+        of a batch. Its token is refreshed before the map is created. A
+        client is created from the user settings when not given.
+    :type bridge_api: BridgeAPI
+
+    :param feedback: Optional feedback, canceling it aborts the downloads.
+    :type feedback: QgsFeedback
     """""
     map_type_key = SAMZ['key']
     filename = clean_filename(filename)
@@ -985,9 +1252,9 @@ def create_samz_map(
     params = params if params else {}
     data.update({'params': params})
 
-    bridge_api = BridgeAPI(
-        *credentials_parameters_from_settings(),
-        proxies=QGISSettings.get_qgis_proxy())
+    bridge_api = map_creation_client(bridge_api)
+    if not bridge_api.authenticated:
+        return False, bridge_api.authentication_message
     samz_map_json = bridge_api.get_samz_map(
         geometry,
         list_of_image_ids,
@@ -1016,7 +1283,9 @@ def create_samz_map(
         destination_base_path=destination_base_path,
         output_map_format=output_map_format,
         headers=bridge_api.headers,
-        data=data)
+        data=data,
+        bridge_api=bridge_api,
+        feedback=feedback)
 
 
 def create_rx_map(
@@ -1028,7 +1297,9 @@ def create_rx_map(
         output_map_format,
         data=None,
         patch_data=None,
-        params=None):
+        params=None,
+        bridge_api=None,
+        feedback=None):
     """Create map based on given parameters.
     
     :param rx_map_json: JSON response from Bridge API field map request.
@@ -1056,6 +1327,14 @@ def create_rx_map(
 
     :param params: Map creation parameters.
     :type params: dict
+
+    :param bridge_api: Authenticated Bridge API client, shared by the maps
+        of a batch. Its token is refreshed before the map is created. A
+        client is created from the user settings when not given.
+    :type bridge_api: BridgeAPI
+
+    :param feedback: Optional feedback, canceling it aborts the downloads.
+    :type feedback: QgsFeedback
     """""
     map_type_key = "rx-map"
     filename = clean_filename(filename)
@@ -1071,9 +1350,9 @@ def create_rx_map(
     params = params if params else {}
     data.update({'params': params})
 
-    bridge_api = BridgeAPI(
-        *credentials_parameters_from_settings(),
-        proxies=QGISSettings.get_qgis_proxy())
+    bridge_api = map_creation_client(bridge_api)
+    if not bridge_api.authenticated:
+        return False, bridge_api.authentication_message
 
     patch_rx_map_json = bridge_api.patch_rx_map(
         source_map_id=source_map_id,
@@ -1091,7 +1370,9 @@ def create_rx_map(
         destination_base_path=destination_base_path,
         output_map_format=output_map_format,
         headers=bridge_api.headers,
-        data=data)
+        data=data,
+        bridge_api=bridge_api,
+        feedback=feedback)
 
 
 def download_field_map(
@@ -1103,7 +1384,9 @@ def download_field_map(
         map_specification=None,
         data=None,
         image_id='',
-        zone_count=None
+        zone_count=None,
+        bridge_api=None,
+        feedback=None
     ):
     """Download field map from requested field map json.
 
@@ -1154,6 +1437,13 @@ def download_field_map(
 
     :param image_id: Image ID used for the catalog-image requests
     :type image_id: str
+
+    :param bridge_api: Authenticated Bridge API client, created from the
+        user settings when not given.
+    :type bridge_api: BridgeAPI
+
+    :param feedback: Optional feedback, canceling it aborts the downloads.
+    :type feedback: QgsFeedback
     """
     message = '{} map successfully created.'.format(map_type_key)
     if not field_map_json.get('seasonField'):
@@ -1168,14 +1458,19 @@ def download_field_map(
 
     request_data = data.get('request_data') if 'request_data' in data else data
 
+    # Retrieve the bridge server URL
+    if bridge_api:
+        bridge_server = bridge_api.bridge_server
+    else:
+        _, _, region, _, _, use_testing_service = (
+            credentials_parameters_from_settings())
+        bridge_server = (BRIDGE_URLS[region]['test']
+                         if use_testing_service
+                         else BRIDGE_URLS[region]['prod'])
+
     try:
         seasonfield_id = field_map_json['seasonField']['id']
         if map_type_key == "SAMZ":  # Handle SAMZ-specific URL construction
-            # Retrieve the bridge server URL
-            username, password, region, client_id, client_secret, use_testing_service = credentials_parameters_from_settings()
-            bridge_server = (BRIDGE_URLS[region]['test']
-                             if use_testing_service
-                             else BRIDGE_URLS[region]['prod'])
             if output_map_format in ZIPPED_FORMAT or output_map_format == KML:
                 url = (f"{bridge_server}/field-level-maps/v5/maps/management-zones-map/"
                        f"{map_type_key}/image{output_map_format['extension']}")
@@ -1186,11 +1481,6 @@ def download_field_map(
             # This is only for reflectance map type
             # Also, reflectance can ONLY make use of tiff.zip format
 
-            # Retrieve the bridge server URL
-            username, password, region, client_id, client_secret, use_testing_service = credentials_parameters_from_settings()
-            bridge_server = (BRIDGE_URLS[region]['test']
-                             if use_testing_service
-                             else BRIDGE_URLS[region]['prod'])
 
             reflectance_map_family = REFLECTANCE['map_family']
             url = (f"{bridge_server}/field-level-maps/v5/maps/{reflectance_map_family['endpoint']}/"
@@ -1198,11 +1488,6 @@ def download_field_map(
             method = 'POST'
         elif map_type_key == "rx-map":
             # Special handling for RX maps
-            # Retrieve the bridge server URL
-            username, password, region, client_id, client_secret, use_testing_service = credentials_parameters_from_settings()
-            bridge_server = (BRIDGE_URLS[region]['test']
-                             if use_testing_service
-                             else BRIDGE_URLS[region]['prod'])
             if output_map_format in ZIPPED_FORMAT or output_map_format == KML:
                 source_map_id = field_map_json.get('id')
                 url = (f"{bridge_server}/field-level-maps/v5/maps/"
@@ -1219,10 +1504,6 @@ def download_field_map(
             map_type = get_definition(map_type_key)
             map_family = map_type['map_family']
 
-            username, password, region, client_id, client_secret, use_testing_service = credentials_parameters_from_settings()
-            bridge_server = (BRIDGE_URLS[region]['test']
-                             if use_testing_service
-                             else BRIDGE_URLS[region]['prod'])
             if output_map_format in ZIPPED_FORMAT or output_map_format == KML:
                 url = (f"{bridge_server}/field-level-maps/v5/maps/{map_family['endpoint']}/"
                        f"{map_type_key}/image{output_map_format['extension']}")
@@ -1238,9 +1519,38 @@ def download_field_map(
                 output_map_format['api_key']))
         return False, message
 
+    hotspot_request = None
+    hotspot_future = None
+    hotspot_message = None
     try:
+        # Hotspots of the zones, if they have been requested by user, are
+        # fetched while the map is downloaded.
+        if data.get('zoning') and data.get('hotspot'):
+            hotspot_request = hotspot_parameters(
+                map_type_key, data, request_data)
+            if hotspot_request:
+                if not bridge_api:
+                    bridge_api = BridgeAPI(
+                        *credentials_parameters_from_settings(),
+                        proxies=QGISSettings.get_qgis_proxy())
+                base_url, params, request_body = hotspot_request
+                hotspot_future = submit_hotspot_request(
+                    bridge_api.get_hotspot,
+                    base_url, params=params, data=request_body)
+            else:
+                hotspot_message = (f"Hotspots support not available"
+                                   f" for {map_type_key} map type ")
+
         if output_map_format in ZIPPED_FORMAT:
-            zip_path = tempfile.mktemp('{}.zip'.format(map_extension))
+            # Zipped products can be kept as they are and loaded through
+            # /vsizip/, see GeosysPluginDockWidget.load_layer.
+            keep_zip = setting(
+                'keep_zipped_products', False, expected_type=bool,
+                qsettings=QSettings())
+            if keep_zip:
+                zip_path = destination_base_path + ZIP_EXT
+            else:
+                zip_path = tempfile.mktemp('{}.zip'.format(map_extension))
             url = '{}.zip'.format(url)
             if zone_count:
                 url = f"{url}?zoning=true&zoneCount={zone_count}"
@@ -1250,8 +1560,12 @@ def download_field_map(
                 zip_path,
                 headers=headers,
                 method=method,
-                payload=request_data)
-            extract_zip(zip_path, destination_base_path)
+                payload=request_data,
+                feedback=feedback,
+                # Map images are rendered, never changed, by the POST.
+                idempotent=True)
+            if not keep_zip:
+                extract_zip(zip_path, destination_base_path)
         elif output_map_format == KML:
             destination_filename = (
                 destination_base_path + output_map_format['extension'])
@@ -1262,11 +1576,14 @@ def download_field_map(
                 destination_filename,
                 headers=headers,
                 method=method,
-                payload=request_data)
+                payload=request_data,
+                feedback=feedback,
+                # Map images are rendered, never changed, by the POST.
+                idempotent=True)
         else:
             destination_filename = (
                 destination_base_path + output_map_format['extension'])
-            fetch_data(url, destination_filename, headers=headers)
+            downloads = [(url, destination_filename)]
             if output_map_format == PNG or output_map_format == PNG_KMZ:
                 # Download associated legend and world-file for geo-referencing
                 # the PNG file.
@@ -1282,116 +1599,169 @@ def download_field_map(
                     # Other maps
                     list_items = [PGW2, LEGEND]
 
+                links = field_map_json.get('_links', {})
                 for item in list_items:
+                    # The world file link key exists in both cases.
+                    item_url = links.get(item['api_key']) or (
+                        item == PGW2 and links.get(PGW['api_key']))
+                    if not item_url:
+                        message = '{} link not found in the {} map.'.format(
+                            item['api_key'], map_type_key)
+                        return False, message
                     destination_filename = '{}{}'.format(
                         destination_base_path, item['extension'])
-                    fetch_data(url, destination_filename, headers=headers)
+                    downloads.append((item_url, destination_filename))
 
-        # Get hotspots for zones if they have been requested by user.
-        bridge_api = BridgeAPI(
-            *credentials_parameters_from_settings(),
-            proxies=QGISSettings.get_qgis_proxy())
+            # The map and its companion files are downloaded together, a
+            # failed download removes the others.
+            fetch_all_data(downloads, headers=headers, feedback=feedback)
 
         data.pop('request_data', None)
 
-        if data.get('zoning') and data.get('hotspot'):
-            vegetation_map_types = [
-                'NDVI',
-                'EVI',
-                'CVI',
-                'CVIN',
-                'GNDVI',
-                'LAI',
-                'NDWI',
-                'S2REP']
-            topology_types = ['EROSION', 'ELEVATION', 'SLOPE']
-            samz_types = ['SAMZ']
-            if map_type_key in vegetation_map_types:
-                base_url = f"{HOTSPOT_URL}/{VEGETATION_ENDPOINT}"
-            elif map_type_key in samz_types:
-                base_url = f"{HOTSPOT_URL}/{SAMZ_ENDPOINT}"
-            elif map_type_key in topology_types:
-                base_url = f"{HOTSPOT_URL}/{ELEVATION_ENDPOINT}"
-            else:
-                message = (f"Hotspots support not available"
-                           f" for {map_type_key} map type ")
+        if hotspot_message:
+            return False, hotspot_message
+        if hotspot_future:
+            base_url, params, request_body = hotspot_request
+            map_json = hotspot_future.result()
+            if not isinstance(map_json, dict):
+                message = (f"Failed to fetch hotspots "
+                           f"{map_json.status_code}, {map_json.text}")
                 return False, message
+            # Hotspot layers are written next to their map.
+            write_hotspot_layers(
+                map_json, params, request_body,
+                os.path.dirname(destination_base_path))
 
-            params = {
-                'Type': data.get('zoningSegmentation', 'Polygon'),
-                'ZonesCount': data.get('zoneCount', 5),
-                '$epsg-out': 4326
-            }
+    except Exception as e:
+        if hotspot_future:
+            hotspot_future.cancel()
+        message = f"Failed to download file. Error: {str(e)}"
+        return False, message
+    return True, message
 
-            if base_url == f"{HOTSPOT_URL}/{VEGETATION_ENDPOINT}":
-                params['MapType'] = map_type_key
-                params['Position'] = data.get('position', 'Average')
 
-            image_data = request_data.get('Image', {}).get('Id')
-            image_id = [image_data]
+def hotspot_parameters(map_type_key, data, request_data):
+    """Parameters of the hotspot request of a map.
 
-            if not image_data:
-                image_id = [image.get("id")
-                            for image in request_data.get('Images', [])
-                            ]
+    :param map_type_key: Map type key of the map.
+    :type map_type_key: str
 
-            request_body = {
-                'geometry': request_data.get(
-                    'SeasonField',
-                    {}).get('geometry'),
-                'image_id': image_id
-            }
+    :param data: Map creation data, with the zoning and hotspot options.
+    :type data: dict
 
-            map_json = bridge_api.get_hotspot(
-                base_url, params=params, data=request_body)
-            output_dir = setting('output_directory', expected_type=str)
+    :param request_data: Request data of the map.
+    :type request_data: dict
 
-            if not isinstance(map_json, dict):
-                message = (f"Failed to fetch hotspots "
-                           f"{map_json.status_code}, {map_json.text}")
-                return False, message
+    :return: The hotspot URL, the request parameters and the request body,
+        or None when the map type has no hotspots.
+    :rtype: tuple
+    """
+    vegetation_map_types = [
+        'NDVI',
+        'EVI',
+        'CVI',
+        'CVIN',
+        'GNDVI',
+        'LAI',
+        'NDWI',
+        'S2REP']
+    topology_types = ['EROSION', 'ELEVATION', 'SLOPE']
+    samz_types = ['SAMZ']
+    if map_type_key in vegetation_map_types:
+        base_url = f"{HOTSPOT_URL}/{VEGETATION_ENDPOINT}"
+    elif map_type_key in samz_types:
+        base_url = f"{HOTSPOT_URL}/{SAMZ_ENDPOINT}"
+    elif map_type_key in topology_types:
+        base_url = f"{HOTSPOT_URL}/{ELEVATION_ENDPOINT}"
+    else:
+        return None
 
-            crs_authid = (
-                f"EPSG:"
-                f"{params.get('$epsg-out', 4326)}"
-            )
+    params = {
+        'Type': data.get('zoningSegmentation', 'Polygon'),
+        'ZonesCount': data.get('zoneCount', 5),
+        '$epsg-out': 4326
+    }
 
-            if map_json.get('OutputData', {}).get('Hotspots'):
-                hotspot_filename = (
-                    f"{'HotspotsPerPart' if params['Type'] == 'Polygon' else 'HotspotsPerPolygon'}_"
-                    f"{params.get('Position').lower() if params.get('Position') else ''}_"
-                    f"{str(request_body.get('image_id')[0])[:4]}_"
-                    f"{str(uuid.uuid4())[:4]}")
-                hotspot_filename = check_if_file_exists(
-                    output_dir, hotspot_filename, SHP_EXT)
-
-                create_hotspot_layer(
-                    map_json['OutputData']['Hotspots'],
-                    'hotspots',
-                    hotspot_filename,
-                    crs_authid
-                )
+    if map_type_key in vegetation_map_types:
+        params['MapType'] = map_type_key
+        params['Position'] = data.get('position', 'Average')
 
-            if map_json.get('OutputData', {}).get('Zones'):
-                segment_filename = (
-                    f"{'SegmentsPerPart' if params['Type'] == 'Polygon' else 'SegmentsPerPolygon'}_"
-                    f"{params.get('Position').lower() if params.get('Position') else ''}_"
-                    f"{str(request_body.get('image_id')[0])[:4]}_"
-                    f"{str(uuid.uuid4())[:4]}")
-                segment_filename = check_if_file_exists(
-                    output_dir, segment_filename, SHP_EXT)
-
-                create_hotspot_layer(
-                    map_json['OutputData']['Zones'],
-                    'segments',
-                    segment_filename,
-                    crs_authid
-                )
+    image_data = request_data.get('Image', {}).get('Id')
+    image_id = [image_data]
 
-    except Exception as e:
-        message = f"Failed to download file. Error: {str(e)}"
-        return False, message
-    return True, message
+    if not image_data:
+        image_id = [image.get("id")
+                    for image in request_data.get('Images', [])
+                    ]
+
+    request_body = {
+        'geometry': request_data.get(
+            'SeasonField',
+            {}).get('geometry'),
+        'image_id': image_id
+    }
+    return base_url, params, request_body
+
+
+def write_hotspot_layers(map_json, params, request_body, output_dir):
+    """Write the hotspots and zones of a hotspot response as layers.
+
+    :param map_json: Hotspot response.
+    :type map_json: dict
+
+    :param params: Parameters of the hotspot request.
+    :type params: dict
+
+    :param request_body: Body of the hotspot request.
+    :type request_body: dict
+
+    :param output_dir: Directory of the layers.
+    :type output_dir: str
+    """
+    crs_authid = (
+        f"EPSG:"
+        f"{params.get('$epsg-out', 4326)}"
+    )
+    # Tables of the session GeoPackage have unique names already.
+    geopackage_output = setting(
+        'geopackage_output', False, expected_type=bool,
+        qsettings=QSettings())
+
+    if map_json.get('OutputData', {}).get('Hotspots'):
+        hotspot_filename = (
+            f"{'HotspotsPerPart' if params['Type'] == 'Polygon' else 'HotspotsPerPolygon'}_"
+            f"{params.get('Position').lower() if params.get('Position') else ''}_"
+            f"{str(request_body.get('image_id')[0])[:4]}_"
+            f"{str(uuid.uuid4())[:4]}")
+        if not geopackage_output:
+            hotspot_filename = check_if_file_exists(
+                output_dir, hotspot_filename, SHP_EXT)
+
+        create_hotspot_layer(
+            map_json['OutputData']['Hotspots'],
+            'hotspots',
+            hotspot_filename,
+            crs_authid,
+            output_dir
+        )
+
+    if map_json.get('OutputData', {}).get('Zones'):
+        segment_filename = (
+            f"{'SegmentsPerPart' if params['Type'] == 'Polygon' else 'SegmentsPerPolygon'}_"
+            f"{params.get('Position').lower() if params.get('Position') else ''}_"
+            f"{str(request_body.get('image_id')[0])[:4]}_"
+            f"{str(uuid.uuid4())[:4]}")
+        if not geopackage_output:
+            segment_filename = check_if_file_exists(
+                output_dir, segment_filename, SHP_EXT)
+
+        create_hotspot_layer(
+            map_json['OutputData']['Zones'],
+            'segments',
+            segment_filename,
+            crs_authid,
+            output_dir
+        )
 
 
 def fetch_ndvi_map(geometry, image_id, data):
@@ -1434,6 +1804,7 @@ def credentials_parameters_from_settings():
     :rtype: tuple
     """
     # Retrieve user's settings credentials.
+    settings = QSettings()
     username = setting(
         'bridge_api_username',
         expected_type=str, qsettings=settings)
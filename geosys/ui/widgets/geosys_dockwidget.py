@@ -27,9 +27,10 @@ import sys
 import json
 
 from PyQt5 import QtGui, QtWidgets
-from PyQt5.QtCore import pyqtSignal, QSettings, QMutex, QDate
+from PyQt5.QtCore import (
+    pyqtSignal, QSettings, QMutex, QDate, QItemSelectionModel)
 from PyQt5.QtGui import QCursor
-from PyQt5.QtWidgets import QLabel, QListWidgetItem, QMessageBox, QApplication
+from PyQt5.QtWidgets import QLabel, QMessageBox, QApplication
 
 from qgis.core import (
     QgsProject,
@@ -70,7 +71,9 @@ from geosys.bridge_api.default import (
     DEFAULT_ORGANIC_AVE,
     DEFAULT_GAIN,
     DEFAULT_OFFSET,
-    DEFAULT_COVERAGE_PERCENT)
+    DEFAULT_COVERAGE_PERCENT,
+    ZIPPED_FORMAT,
+    ZIP_EXT)
 from geosys.bridge_api.definitions import (
     ARCHIVE_MAP_PRODUCTS, ALL_SENSORS, SENSORS, NDVI, EVI,
     SAMZ, SOIL, SLOPE, ELEVATION, REFLECTANCE, LANDSAT_8, LANDSAT_9, SENTINEL_2,
@@ -84,15 +87,20 @@ from geosys.bridge_api.utilities import get_definition
 from geosys.ui.help.help_dialog import HelpDialog
 from geosys.ui.widgets.geosys_coverage_downloader import (
     CoverageSearchThread, create_map, create_difference_map, create_samz_map,
-    create_rx_map, fetch_ndvi_map, credentials_parameters_from_settings
+    create_rx_map, fetch_ndvi_map, credentials_parameters_from_settings,
+    shutdown_hotspot_executor
 )
-from geosys.ui.widgets.geosys_itemwidget import CoverageSearchResultItemWidget
+from geosys.ui.widgets.geosys_itemwidget import (
+    CoverageSearchResultDelegate, CoverageSearchResultModel)
+from geosys.ui.widgets.geosys_map_creation_queue import MapCreationQueue
 from geosys.utilities.gui_utilities import (
     add_ordered_combo_item, layer_icon, is_polygon_layer, layer_from_combo,
-    add_layer_to_canvas, reproject, item_data_from_combo,
-    wkt_geometries_from_feature_iterator, item_text_from_combo,
+    add_layer_to_canvas, item_data_from_combo,
+    wkt_geometries_from_feature_iterator, wkt_geometries_from_layer,
+    item_text_from_combo, sensor_simplify_tolerance,
     is_point_layer, attribute_from_feature_iterator
 )
+from geosys.utilities.downloader import VSIZIP_PREFIX, vsizip_path
 from geosys.utilities.qgis_settings import QGISSettings
 from geosys.utilities.resources import get_ui_class
 from geosys.utilities.settings import setting, set_setting
@@ -119,7 +127,19 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         self.settings = QSettings()
         self.one_process_work = QMutex()
         self.search_threads = None
+        self.map_creation_queue = MapCreationQueue(parent=self)
+        self.map_creation_queue.job_finished.connect(
+            self.map_creation_job_finished)
+        self.map_creation_queue.queue_finished.connect(
+            self.map_creation_finished)
         self.max_stacked_widget_index = self.stacked_widget.count() - 1
+
+        # Coverage results are painted by the delegate, only the visible
+        # rows are drawn.
+        self.coverage_result_model = CoverageSearchResultModel(self)
+        self.coverage_result_list.setModel(self.coverage_result_model)
+        self.coverage_result_list.setItemDelegate(
+            CoverageSearchResultDelegate(self.coverage_result_list))
         self.current_stacked_widget_index = 0
 
         # Coverage parameters from input values
@@ -584,8 +604,9 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         """Update current selection data."""
         # update data based on selected coverage results
         self.selected_coverage_results = []
-        for item in self.coverage_result_list.selectedItems():
-            item_json = item.data(Qt.UserRole)
+        selection_model = self.coverage_result_list.selectionModel()
+        for index in selection_model.selectedIndexes():
+            item_json = index.data(Qt.UserRole)
             if self.map_product == REFLECTANCE['key']:
                 # NDVI used for coverage. This is a workaround suggested by
                 # GeoSys
@@ -751,20 +772,36 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             if wd['widget'].isChecked():
                 return wd['data']
 
-    def load_layer(self, base_path):
+    def load_layer(self, base_path, output_map_format=None):
         """Load layer into QGIS map canvas.
 
         :param base_path: Base path of the layer.
         :type base_path: str
+
+        :param output_map_format: Format of the layer, defaults to the
+            selected output format.
+        :type output_map_format: dict
         """
-        if self.output_map_format in VALID_QGIS_FORMAT:
+        output_map_format = output_map_format or self.output_map_format
+        if output_map_format in VALID_QGIS_FORMAT:
             filename = os.path.basename(base_path)
-            layer = base_path + self.output_map_format['extension']
-
-            if self.output_map_format in VECTOR_FORMAT:
+            layer = base_path + output_map_format['extension']
+
+            zip_path = base_path + ZIP_EXT
+            if (output_map_format in ZIPPED_FORMAT and
+                    not os.path.exists(layer) and os.path.exists(zip_path)):
+                # The product was kept zipped, open it in place.
+                extension = output_map_format['extension']
+                layer = vsizip_path(
+                    zip_path, [extension, extension.replace('.tiff', '.tif')])
+                if not layer:
+                    raise FileNotFoundError(
+                        f"No {extension} file found in: {zip_path}")
+
+            if output_map_format in VECTOR_FORMAT:
                 map_layer = QgsVectorLayer(layer, filename)
             else:
-                if os.path.exists(layer):
+                if layer.startswith(VSIZIP_PREFIX) or os.path.exists(layer):
                     map_layer = QgsRasterLayer(layer, filename)
                 else:
                     if '.tiff' in layer:
@@ -774,6 +811,20 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
                         raise FileNotFoundError(f"File not found: {layer}")
             add_layer_to_canvas(map_layer, filename)
 
+    def output_file_extension(self):
+        """Extension of the file written for the selected output format.
+
+        :returns: The zip extension when zipped products are kept, otherwise
+            the extension of the output format.
+        :rtype: str
+        """
+        keep_zip = setting(
+            'keep_zipped_products', False, expected_type=bool,
+            qsettings=self.settings)
+        if keep_zip and self.output_map_format in ZIPPED_FORMAT:
+            return ZIP_EXT
+        return self.output_map_format['extension']
+
     def save_parameter_values_as_setting(self):
         """Save parameter values as qsettings."""
         for key, form in self.map_creation_parameters_settings.items():
@@ -857,35 +908,32 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
                 layer.selectedFeatureCount() > 0))
         use_single_geometry = self.single_geometry_checkbox.isChecked()
 
-        # Reproject layer to EPSG:4326
-        if layer.crs().authid() != 'EPSG:4326':
-            layer = reproject(
-                layer, QgsCoordinateReferenceSystem('EPSG:4326'))
+        # Get the sensor type
+        self.sensor_type = item_data_from_combo(self.sensor_combo_box)
+        if not self.sensor_type:
+            # sensor type is not valid
+            return False, 'Sensor data is not valid.'
+        if self.sensor_type == ALL_SENSORS['key']:
+            self.sensor_type = None
 
-        feature_iterator = layer.getFeatures()
+        feature_ids = None
         if use_selected_features:
-            request = QgsFeatureRequest()
-            request.setFilterFids(layer.selectedFeatureIds())
-            feature_iterator = layer.getFeatures(request)
+            feature_ids = layer.selectedFeatureIds()
 
         # Handle multi features
         # Merge features into multi-part polygon
         # TODO use Collect Geometries processing algorithm
-        self.wkt_geometries = wkt_geometries_from_feature_iterator(
-            feature_iterator, MAX_FEATURE_NUMBERS, use_single_geometry)
+        # Only the used features are reprojected to EPSG:4326, then
+        # simplified to the sensor resolution if enabled in the settings.
+        self.wkt_geometries = wkt_geometries_from_layer(
+            layer, QgsCoordinateReferenceSystem('EPSG:4326'), feature_ids,
+            MAX_FEATURE_NUMBERS, use_single_geometry,
+            sensor_simplify_tolerance(self.sensor_type))
 
         if not self.wkt_geometries:
             # geometry is not valid
             return False, 'Geometry is not valid.'
 
-        # Get the sensor type
-        self.sensor_type = item_data_from_combo(self.sensor_combo_box)
-        if not self.sensor_type:
-            # sensor type is not valid
-            return False, 'Sensor data is not valid.'
-        if self.sensor_type == ALL_SENSORS['key']:
-            self.sensor_type = None
-
         # Get the mask type
         self.mask_type = item_text_from_combo(self.cb_mask)
         if not self.mask_type:
@@ -1019,6 +1067,18 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
                         POSITION: position
                     })
 
+        # The maps and their hotspots are requested with a single
+        # authenticated client.
+        bridge_api = BridgeAPI(
+            *credentials_parameters_from_settings(),
+            proxies=QGISSettings.get_qgis_proxy())
+        if not bridge_api.authenticated:
+            QMessageBox.critical(
+                self,
+                'Map Creation Status',
+                bridge_api.authentication_message)
+            return
+
         zone_cnt = self.samz_zone_form.value()
         if map_product_definition == SAMZ:
             image_dates = []
@@ -1050,22 +1110,18 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             filename = check_if_file_exists(
                 self.output_directory,
                 filename,
-                self.output_map_format['extension']
+                self.output_file_extension()
             )
 
-            is_success, message = create_samz_map(
-                geometry, image_ids, image_dates, zone_cnt, self.output_directory, filename,
-                output_map_format=self.output_map_format, params=data)
-
-            if not is_success:
-                QMessageBox.critical(
-                    self,
-                    'Map Creation Status',
-                    'Error creating map. {}'.format(message))
-                return
-
-            # Add map to qgis canvas
-            self.load_layer(os.path.join(self.output_directory, filename))
+            # The map is added to qgis canvas when the job is finished
+            self.map_creation_queue.submit(
+                filename, create_samz_map,
+                os.path.join(self.output_directory, filename),
+                geometry=geometry, list_of_image_ids=image_ids,
+                list_of_image_date=image_dates, zone_count=zone_cnt,
+                output_dir=self.output_directory, filename=filename,
+                output_map_format=self.output_map_format, params=data,
+                bridge_api=bridge_api)
         elif self.fetch_rx_group and self.fetch_rx_group.isChecked():  # RX Map Logic
             rx_zone_count = self.fetch_rx_zones.value()
             
@@ -1078,7 +1134,7 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             filename = check_if_file_exists(
                 self.output_directory,
                 filename,
-                self.output_map_format['extension']
+                self.output_file_extension()
             )
 
             # Dynamically generate patch_data
@@ -1096,7 +1152,11 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
 
             #patch_data = json.dumps(patch_data)
 
-            is_success, message = create_rx_map(
+            # The RX map is loaded into the QGIS canvas when the job is
+            # finished
+            self.map_creation_queue.submit(
+                filename, create_rx_map,
+                os.path.join(self.output_directory, filename),
                 rx_map_json=rx_json_map,
                 source_map_id=source_map_id,
                 zone_count=rx_zone_count,
@@ -1104,19 +1164,9 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
                 filename=filename,
                 output_map_format=self.output_map_format,
                 data=data,
-                patch_data=patch_data
+                patch_data=patch_data,
+                bridge_api=bridge_api
             )
-
-            if not is_success:
-                QMessageBox.critical(
-                    self,
-                    'RX Map Creation Error',
-                    f'Error creating RX Map: {message}'
-                )
-                return
-
-            # Load the RX map into the QGIS canvas
-            self.load_layer(os.path.join(self.output_directory, filename))
             return
         else:
             for map_specification in map_specifications:
@@ -1130,7 +1180,7 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
                 filename = check_if_file_exists(
                     self.output_directory,
                     filename,
-                    self.output_map_format['extension']
+                    self.output_file_extension()
                 )
 
                 sample_map_data = None
@@ -1162,26 +1212,57 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
 
                     data = sample_map_data
 
-                is_success, message = create_map(
-                    map_specification, self.map_product, geometry, self.output_directory, filename,
-                    data=data, output_map_format=self.output_map_format,
+                # Maps are created in the background, each one is added to
+                # qgis canvas as soon as its job is finished. create_map
+                # updates its data, so every job gets its own copy.
+                job_data = dict(data)
+                self.map_creation_queue.submit(
+                    filename, create_map,
+                    os.path.join(self.output_directory, filename),
+                    map_specification=map_specification,
+                    map_product=self.map_product, geometry=geometry,
+                    output_dir=self.output_directory, filename=filename,
+                    data=job_data, output_map_format=self.output_map_format,
                     n_planned_value=self.n_planned_value,
                     yield_val=self.yield_average_form.value(),
                     min_yield_val=self.yield_minimum_form.value(),
                     max_yield_val=self.yield_maximum_form.value(),
-                    sample_map_id=None, params=data, crop_type=self.crop_type,
-                    gain=self.gain, offset=self.offset, zone_count=self.samz_zone,
+                    sample_map_id=None, params=job_data,
+                    crop_type=self.crop_type, gain=self.gain,
+                    offset=self.offset, zone_count=self.samz_zone,
+                    bridge_api=bridge_api,
                 )
 
-                if not is_success:
-                    QMessageBox.critical(
-                        self,
-                        'Map Creation Status',
-                        'Error creating map. {}'.format(message))
-                    return
+    def map_creation_job_finished(self, task):
+        """Add the map of a finished map creation job to qgis canvas.
+
+        :param task: The finished job.
+        :type task: MapCreationTask
+        """
+        if not task.is_success:
+            return
+        try:
+            self.load_layer(
+                task.layer_path, task.kwargs['output_map_format'])
+        except FileNotFoundError as e:
+            task.is_success, task.message = False, str(e)
+
+    def map_creation_finished(self, tasks):
+        """Report the failed jobs once the map creation queue is empty.
 
-                # Add map to qgis canvas
-                self.load_layer(os.path.join(self.output_directory, filename))
+        :param tasks: The finished jobs.
+        :type tasks: list
+        """
+        shutdown_hotspot_executor()
+        failed_tasks = [task for task in tasks if not task.is_success]
+        if not failed_tasks:
+            return
+        if len(tasks) == 1:
+            message = 'Error creating map. {}'.format(failed_tasks[0].message)
+        else:
+            message = 'Error creating {} of {} maps. {}'.format(
+                len(failed_tasks), len(tasks), failed_tasks[0].message)
+        QMessageBox.critical(self, 'Map Creation Status', message)
 
     def start_map_creation(self):
         """Map creation starts here."""
@@ -1253,8 +1334,17 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         finally:
             QApplication.restoreOverrideCursor()
 
-    def start_coverage_search(self):
-        """Coverage search starts here."""
+    def refresh_coverage_search(self):
+        """Search the catalog again, bypassing the cached responses."""
+        self.next_push_button.setEnabled(False)
+        self.start_coverage_search(refresh=True)
+
+    def start_coverage_search(self, refresh=False):
+        """Coverage search starts here.
+
+        :param refresh: Query the catalog even when its response is cached.
+        :type refresh: bool
+        """
         # validate coverage parameters before run the coverage searcher
         is_success, message = self.validate_coverage_parameters()
         if not is_success:
@@ -1267,7 +1357,7 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             self.search_threads.search_finished.disconnect()
             self.search_threads.stop()
             self.search_threads.wait()
-            self.coverage_result_list.clear()
+            self.coverage_result_model.clear()
 
         # start search thread
         map_product = COLOR_COMPOSITION['key'] if self.map_product == SAMZ['key'] else self.map_product
@@ -1286,23 +1376,25 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             mutex=self.one_process_work,
             coverage_percent=self.coverage_percent,
             n_planned_value=self.n_planned_value,
+            refresh=refresh,
             parent=self.iface.mainWindow())
         searcher.search_started.connect(self.coverage_search_started)
         searcher.search_finished.connect(self.coverage_search_finished)
         searcher.data_downloaded.connect(self.show_coverage_result)
         searcher.error_occurred.connect(self.show_error)
+        searcher.field_error_occurred.connect(self.show_field_error)
         self.search_threads = searcher
         searcher.start()
 
     def coverage_search_started(self):
         """Action after search thread started."""
-        self.coverage_result_list.clear()
-        self.coverage_result_list.insertItem(0, self.tr('Searching...'))
+        self.coverage_result_model.clear()
+        self.coverage_result_model.add_message(self.tr('Searching...'))
 
     def coverage_search_finished(self):
         """Action after search thread finished."""
-        self.coverage_result_list.takeItem(0)
-        coverage_result_empty = self.coverage_result_list.count() == 0
+        self.coverage_result_model.removeRow(0)
+        coverage_result_empty = self.coverage_result_model.rowCount() == 0
         self.next_push_button.setEnabled(not coverage_result_empty)
         if coverage_result_empty:
             new_widget = QLabel()
@@ -1317,15 +1409,13 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
                     self.tr(
                         u"No coverage results available based on given "
                         u"parameters.")))
-            new_item = QListWidgetItem(self.coverage_result_list)
-            new_item.setSizeHint(new_widget.sizeHint())
-            self.coverage_result_list.addItem(new_item)
-            self.coverage_result_list.setItemWidget(
-                new_item,
-                new_widget
-            )
+            index = self.coverage_result_model.add_message(
+                None, new_widget.sizeHint())
+            self.coverage_result_list.setIndexWidget(index, new_widget)
         else:
-            self.coverage_result_list.setCurrentRow(0)
+            self.coverage_result_list.selectionModel().setCurrentIndex(
+                self.coverage_result_model.index(0),
+                QItemSelectionModel.ClearAndSelect)
 
             # When user selected Elevation or Soil map, we want to skip the coverage
             # results panel and go straight to the map creation panel rather.
@@ -1333,7 +1423,7 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
                 self.show_next_page()
 
     def show_coverage_result(self, coverage_map_json, thumbnail_ba):
-        """Translate coverage map result into widget item.
+        """Add a coverage map result to the coverage result list.
 
         :param coverage_map_json: Result of single map coverage.
             example: {
@@ -1370,19 +1460,11 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         :type thumbnail_ba: QByteArray
         """
         if coverage_map_json:
-            custom_widget = CoverageSearchResultItemWidget(
+            # The thumbnail is decoded when its row is first painted.
+            self.coverage_result_model.add_result(
                 coverage_map_json, thumbnail_ba, self.map_product)
-            new_item = QListWidgetItem(self.coverage_result_list)
-            new_item.setSizeHint(custom_widget.sizeHint())
-            new_item.setData(Qt.UserRole, coverage_map_json)
-            self.coverage_result_list.addItem(new_item)
-            self.coverage_result_list.setItemWidget(new_item, custom_widget)
         else:
-            new_item = QListWidgetItem()
-            new_item.setText(self.tr('No results!'))
-            new_item.setData(Qt.UserRole, None)
-            self.coverage_result_list.addItem(new_item)
-        self.coverage_result_list.update()
+            self.coverage_result_model.add_message(self.tr('No results!'))
 
     def show_error(self, error_message):
         """Show error message as widget item.
@@ -1390,7 +1472,7 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         :param error_message: Error message.
         :type error_message: str
         """
-        self.coverage_result_list.clear()
+        self.coverage_result_model.clear()
         new_widget = QLabel()
         new_widget.setTextFormat(Qt.RichText)
         new_widget.setOpenExternalLinks(True)
@@ -1399,10 +1481,23 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             u"<div align='center'> <strong>{}</strong> </div>"
             u"<div align='center' style='margin-top: 3px'> {} </div>".format(
                 self.tr('Error'), error_message))
-        new_item = QListWidgetItem(self.coverage_result_list)
-        new_item.setSizeHint(new_widget.sizeHint())
-        self.coverage_result_list.addItem(new_item)
-        self.coverage_result_list.setItemWidget(new_item, new_widget)
+        index = self.coverage_result_model.add_message(
+            None, new_widget.sizeHint())
+        self.coverage_result_list.setIndexWidget(index, new_widget)
+
+    def show_field_error(self, error_message):
+        """Report the coverage search error of a single field.
+
+        Results of the other fields stay in the list, so the error is only
+        logged and notified instead of replacing the list.
+
+        :param error_message: Error message.
+        :type error_message: str
+        """
+        log(
+            self.tr('Coverage search failed for a field. {}').format(
+                error_message),
+            info=False)
 
     def connect_layer_listener(self):
         """Establish a signal/slot to listen for layers loaded in QGIS.
@@ -1592,6 +1687,8 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         self.next_push_button.clicked.connect(self.show_next_page)
         self.difference_map_push_button.clicked.connect(
             self.start_difference_map_creation)
+        self.refresh_coverage_button.clicked.connect(
+            self.refresh_coverage_search)
 
         # Product type has changed
         self.map_product_combo_box.currentIndexChanged.connect(
@@ -1603,8 +1700,8 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         # Stacked widget connector
         self.stacked_widget.currentChanged.connect(self.set_next_button_text)
 
-        # List widget item connector
-        self.coverage_result_list.itemSelectionChanged.connect(
+        # Coverage result selection connector
+        self.coverage_result_list.selectionModel().selectionChanged.connect(
             self.update_selection_data)
 
         # If the selected point layer for the Sample maps changes
@@ -1621,5 +1718,6 @@ class GeosysPluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         self.geometry_combo_box.blockSignals(True)
 
     def closeEvent(self, event):
+        self.map_creation_queue.cancel()
         self.closingPlugin.emit()
         event.accept()
@@ -1,13 +1,14 @@
 # coding=utf-8
-"""Implementation of custom GEOSYS item widget.
+"""Implementation of the GEOSYS coverage search result list model and
+delegate.
 """
-from PyQt5.QtGui import QImage, QPixmap
-from PyQt5.QtWidgets import (
-    QWidget, QHBoxLayout, QLabel, QSizePolicy, QGridLayout)
+import itertools
 
-from qgis.PyQt.QtCore import Qt
+from PyQt5.QtGui import QImage, QPixmap, QPixmapCache, QFont
+from PyQt5.QtWidgets import QStyle, QStyledItemDelegate
+
+from qgis.PyQt.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, QRect
 from geosys.bridge_api.definitions import SAMPLE_MAP
-from geosys.utilities.utilities import log
 
 
 __copyright__ = "Copyright 2019, Kartoza"
@@ -15,17 +16,143 @@ __license__ = "GPL version 3"
 __email__ = "rohmat@kartoza.com"
 __revision__ = "$Format:%H$"
 
+# Lines of the description of a coverage result.
+DESCRIPTION_ROLE = Qt.UserRole + 1
+
+THUMBNAIL_SIZE = 96
+# Horizontal and vertical margins of a coverage result.
+ITEM_MARGINS = (5, 10)
+
+
+class CoverageSearchResultModel(QAbstractListModel):
+    """List model of the coverage search results.
+
+    A row is either a coverage result, whose map json is returned for the
+    Qt.UserRole, or a message. Thumbnails are only decoded and scaled when
+    their row is painted, the scaled pixmaps are kept in QPixmapCache.
+    """
+
+    _pixmap_keys = itertools.count()
+
+    def __init__(self, parent=None):
+        """Constructor.
+
+        :param parent: Parent object.
+        :type parent: QObject
+        """
+        super(CoverageSearchResultModel, self).__init__(parent)
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        """Number of rows of the model.
+
+        :param parent: Parent index, the model is a flat list.
+        :type parent: QModelIndex
+
+        :return: Number of rows.
+        :rtype: int
+        """
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        """Data of a row.
+
+        :param index: Index of the row.
+        :type index: QModelIndex
 
-class CoverageSearchResultItemWidget(QWidget):
-    """Custom item widget for coverage search results."""
+        :param role: Data role.
+        :type role: int
 
-    def __init__(
-            self,
-            coverage_map_json,
-            thumbnail_ba,
-            map_product,
-            parent=None):
-        """Custom item widget for coverage search results.
+        :return: The data of the role.
+        """
+        if not index.isValid() or index.row() >= len(self.rows):
+            return None
+        row = self.rows[index.row()]
+        coverage_map_json = row.get('coverage_map_json')
+        if role == Qt.UserRole:
+            return coverage_map_json
+        if role == Qt.SizeHintRole:
+            return row.get('size_hint')
+        if coverage_map_json is None:
+            if role == Qt.DisplayRole:
+                return row.get('text')
+            return None
+        if role == Qt.DisplayRole:
+            return self.description(row)[0]
+        if role == DESCRIPTION_ROLE:
+            return self.description(row)
+        if role == Qt.DecorationRole:
+            return self.thumbnail(row)
+        return None
+
+    def flags(self, index):
+        """Flags of a row, only coverage results can be selected.
+
+        :param index: Index of the row.
+        :type index: QModelIndex
+
+        :return: The item flags.
+        :rtype: Qt.ItemFlags
+        """
+        if not index.isValid():
+            return Qt.NoItemFlags
+        if self.rows[index.row()].get('coverage_map_json') is None:
+            return Qt.ItemIsEnabled
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def removeRows(self, row, count, parent=QModelIndex()):
+        """Remove rows of the model.
+
+        :param row: First row removed.
+        :type row: int
+
+        :param count: Number of rows removed.
+        :type count: int
+
+        :param parent: Parent index, the model is a flat list.
+        :type parent: QModelIndex
+
+        :return: Whether the rows were removed.
+        :rtype: bool
+        """
+        if parent.isValid() or row < 0 or row + count > len(self.rows):
+            return False
+        self.beginRemoveRows(parent, row, row + count - 1)
+        for removed in self.rows[row:row + count]:
+            if removed.get('pixmap_key'):
+                QPixmapCache.remove(removed['pixmap_key'])
+        del self.rows[row:row + count]
+        self.endRemoveRows()
+        return True
+
+    def clear(self):
+        """Remove every row."""
+        self.beginResetModel()
+        for row in self.rows:
+            if row.get('pixmap_key'):
+                QPixmapCache.remove(row['pixmap_key'])
+        self.rows = []
+        self.endResetModel()
+
+    def add_row(self, row):
+        """Append a row.
+
+        :param row: The row data.
+        :type row: dict
+
+        :return: Index of the new row.
+        :rtype: QModelIndex
+        """
+        position = len(self.rows)
+        self.beginInsertRows(QModelIndex(), position, position)
+        self.rows.append(row)
+        self.endInsertRows()
+        return self.index(position)
+
+    def add_result(self, coverage_map_json, thumbnail_ba, map_product):
+        """Append a coverage result.
 
         :param coverage_map_json: Result of single map coverage.
             example: {
@@ -60,74 +187,160 @@ class CoverageSearchResultItemWidget(QWidget):
         :param thumbnail_ba: Thumbnail image data in byte array format.
         :type thumbnail_ba: QByteArray
 
-        :param parent: Parent class.
-        :type parent: QWidget
+        :param map_product: Map product of the search.
+        :type map_product: str
+
+        :return: Index of the new row.
+        :rtype: QModelIndex
+        """
+        return self.add_row({
+            'coverage_map_json': coverage_map_json,
+            'thumbnail_ba': thumbnail_ba,
+            'map_product': map_product,
+            'pixmap_key': 'geosys_coverage_thumbnail_{}'.format(
+                next(self._pixmap_keys))
+        })
+
+    def add_message(self, text, size_hint=None):
+        """Append a message row.
+
+        :param text: Message text.
+        :type text: str
+
+        :param size_hint: Size of the row, for a message shown by a widget.
+        :type size_hint: QSize
+
+        :return: Index of the new row.
+        :rtype: QModelIndex
         """
-        super(CoverageSearchResultItemWidget, self).__init__(parent)
-
-        self.layout = QHBoxLayout(self)
-        self.layout.setContentsMargins(5, 10, 5, 10)
-        self.setLayout(self.layout)
-
-        self.map_thumbnail = QLabel(self)
-        self.map_thumbnail.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
-        self.map_thumbnail.resize(96, 96)
-
-        qimg = QImage.fromData(thumbnail_ba)
-        pixmap = QPixmap.fromImage(qimg).scaled(
-            96,
-            96,
-            Qt.KeepAspectRatio,
-            Qt.SmoothTransformation
-        )
-        self.map_thumbnail.setPixmap(pixmap)
-        self.layout.addWidget(self.map_thumbnail)
-
-        self.map_description_layout = QGridLayout(self)
-        self.map_description_layout.setSpacing(0)
-        self.layout.addLayout(self.map_description_layout)
-
-        season_field_id = coverage_map_json.get(
-            'image', {}).get('collection', '')
-        self.season_field_id = QLabel(self)
-        self.season_field_id.setTextFormat(Qt.RichText)
-        self.season_field_id.setWordWrap(True)
-        self.season_field_id.setText(
-            u"   <strong> {} </strong>".format(season_field_id))
-        self.map_description_layout.addWidget(self.season_field_id, 0, 0, 1, 3)
-
-        if map_product != SAMPLE_MAP['key']:
-            # All of these parameters will be excluded for Sample maps
-            image_description = coverage_map_json.get('image', {})
-            self.image_date = QLabel(self)
-            self.image_date.setTextFormat(Qt.RichText)
-            self.image_date.setWordWrap(True)
-            self.image_date.setText(image_description.get('date', ''))
-            self.map_description_layout.addWidget(self.image_date, 1, 0)
-
-            self.image_sensor = QLabel(self)
-            self.image_sensor.setTextFormat(Qt.RichText)
-            self.image_sensor.setWordWrap(True)
-            self.image_sensor.setText(image_description.get('sensor', ''))
-            self.map_description_layout.addWidget(self.image_sensor, 2, 0)
-
-            self.coverage_type = QLabel(self)
-            self.coverage_type.setTextFormat(Qt.RichText)
-            self.coverage_type.setWordWrap(True)
-            self.coverage_type.setText(
-                coverage_map_json.get(
-                    'coverageType', ''))
-            self.map_description_layout.addWidget(self.coverage_type, 3, 0)
+        return self.add_row({'text': text, 'size_hint': size_hint})
 
+    @staticmethod
+    def description(row):
+        """Lines describing a coverage result.
+
+        :param row: The row data.
+        :type row: dict
+
+        :return: The collection, then the image date, sensor and coverage
+            type, or the sample map name.
+        :rtype: list
+        """
+        coverage_map_json = row['coverage_map_json']
+        image_description = coverage_map_json.get('image', {})
+        lines = [image_description.get('collection', '')]
+        if row['map_product'] != SAMPLE_MAP['key']:
+            lines.extend([
+                image_description.get('date', ''),
+                image_description.get('sensor', ''),
+                coverage_map_json.get('coverageType', '')])
         else:
-            # Add "SAMPLEMAP" to the coverage results item
-            self.image_date = QLabel(self)
-            self.image_date.setTextFormat(Qt.RichText)
-            self.image_date.setWordWrap(True)
-            self.image_date.setText(SAMPLE_MAP['name'])
-            self.map_description_layout.addWidget(self.image_date, 1, 0)
+            lines.append(SAMPLE_MAP['name'])
+        return lines
+
+    @staticmethod
+    def thumbnail(row):
+        """Scaled thumbnail of a coverage result.
+
+        :param row: The row data.
+        :type row: dict
+
+        :return: The thumbnail, None when the result has none.
+        :rtype: QPixmap
+        """
+        if not row.get('thumbnail_ba'):
+            return None
+        pixmap = QPixmapCache.find(row['pixmap_key'])
+        if pixmap is None or pixmap.isNull():
+            image = QImage.fromData(row['thumbnail_ba'])
+            if image.isNull():
+                return None
+            pixmap = QPixmap.fromImage(image.scaled(
+                THUMBNAIL_SIZE,
+                THUMBNAIL_SIZE,
+                Qt.KeepAspectRatio,
+                Qt.SmoothTransformation))
+            QPixmapCache.insert(row['pixmap_key'], pixmap)
+        return pixmap
 
-        self.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Minimum)
 
-        self.coverage_map_json = coverage_map_json
-        self.thumbnail_ba = thumbnail_ba
+class CoverageSearchResultDelegate(QStyledItemDelegate):
+    """Paint the coverage search results, the thumbnail then the
+    description."""
+
+    def paint(self, painter, option, index):
+        """Paint a row.
+
+        :param painter: The painter.
+        :type painter: QPainter
+
+        :param option: Style options of the row.
+        :type option: QStyleOptionViewItem
+
+        :param index: Index of the row.
+        :type index: QModelIndex
+        """
+        lines = index.data(DESCRIPTION_ROLE)
+        if not lines:
+            super(CoverageSearchResultDelegate, self).paint(
+                painter, option, index)
+            return
+
+        self.initStyleOption(option, index)
+        style = option.widget.style() if option.widget else None
+        if style:
+            style.drawPrimitive(
+                QStyle.PE_PanelItemViewItem, option, painter, option.widget)
+
+        painter.save()
+        margin_x, margin_y = ITEM_MARGINS
+        rect = option.rect
+        pixmap = index.data(Qt.DecorationRole)
+        if pixmap is not None:
+            painter.drawPixmap(
+                rect.x() + margin_x,
+                rect.y() + margin_y + (THUMBNAIL_SIZE - pixmap.height()) // 2,
+                pixmap)
+
+        if option.state & QStyle.State_Selected:
+            painter.setPen(option.palette.highlightedText().color())
+        else:
+            painter.setPen(option.palette.text().color())
+        text_x = rect.x() + 2 * margin_x + THUMBNAIL_SIZE
+        line_height = THUMBNAIL_SIZE // 4
+        for line_number, line in enumerate(lines):
+            font = QFont(option.font)
+            # The first line is the collection of the image.
+            font.setBold(line_number == 0)
+            painter.setFont(font)
+            line_rect = QRect(
+                text_x,
+                rect.y() + margin_y + line_number * line_height,
+                rect.right() - text_x - margin_x,
+                line_height)
+            painter.drawText(
+                line_rect,
+                Qt.AlignLeft | Qt.AlignVCenter,
+                painter.fontMetrics().elidedText(
+                    line, Qt.ElideRight, line_rect.width()))
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        """Size of a row.
+
+        :param option: Style options of the row.
+        :type option: QStyleOptionViewItem
+
+        :param index: Index of the row.
+        :type index: QModelIndex
+
+        :return: The row size.
+        :rtype: QSize
+        """
+        if not index.data(DESCRIPTION_ROLE):
+            return super(CoverageSearchResultDelegate, self).sizeHint(
+                option, index)
+        margin_x, margin_y = ITEM_MARGINS
+        return QSize(
+            THUMBNAIL_SIZE + 2 * margin_x,
+            THUMBNAIL_SIZE + 2 * margin_y)
@@ -0,0 +1,182 @@
+# coding=utf-8
+"""Background map creation queue."""
+
+from qgis.core import QgsApplication, QgsFeedback, QgsTask
+from qgis.PyQt.QtCore import QObject, QSettings, pyqtSignal
+
+from geosys.bridge_api.default import MAP_CREATION_MAX_WORKERS
+from geosys.utilities.settings import setting
+from geosys.utilities.utilities import log
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+
+class MapCreationTask(QgsTask):
+    """QGIS task running a single map creation function.
+
+    The function is one of create_map, create_samz_map or create_rx_map and
+    must return a tuple of success flag and message. It is given a feedback
+    reporting the download progress of the task and canceled with it.
+    """
+
+    def __init__(self, description, function, layer_path, **kwargs):
+        """Constructor.
+
+        :param description: Description shown in the QGIS task manager.
+        :type description: str
+
+        :param function: Map creation function.
+        :type function: callable
+
+        :param layer_path: Base path of the layer written by the function.
+        :type layer_path: str
+
+        :param kwargs: Keyword arguments of the function.
+        :type kwargs: dict
+        """
+        super(MapCreationTask, self).__init__(description, QgsTask.CanCancel)
+        # Kept on the Python side, the task manager deletes finished tasks.
+        self.name = description
+        self.function = function
+        self.layer_path = layer_path
+        self.feedback = QgsFeedback()
+        self.feedback.progressChanged.connect(self.setProgress)
+        self.kwargs = dict(kwargs, feedback=self.feedback)
+        self.is_success = False
+        self.message = ''
+
+    def run(self):
+        """Create the map, runs in a background thread.
+
+        :returns: True when the map was created.
+        :rtype: bool
+        """
+        self.setProgress(0)
+        if not self.isCanceled():
+            try:
+                self.is_success, self.message = self.function(**self.kwargs)
+            except Exception as e:
+                self.is_success, self.message = False, str(e)
+        if self.isCanceled():
+            self.is_success, self.message = False, 'Map creation cancelled.'
+        self.setProgress(100)
+        return self.is_success
+
+    def cancel(self):
+        """Cancel the task and abort its running download."""
+        self.feedback.cancel()
+        super(MapCreationTask, self).cancel()
+
+
+class MapCreationQueue(QObject):
+    """Queue of map creation tasks with a concurrency limit.
+
+    Only max_workers tasks are handed to the QGIS task manager at a time,
+    the next one is started whenever a task finishes. Signals are emitted
+    from the main thread.
+    """
+
+    job_finished = pyqtSignal(object)
+    progress_changed = pyqtSignal(int, int)
+    queue_finished = pyqtSignal(list)
+
+    def __init__(self, max_workers=None, parent=None):
+        """Constructor.
+
+        :param max_workers: Number of maps created at the same time. Defaults
+            to the map_creation_max_workers setting.
+        :type max_workers: int
+
+        :param parent: Parent object.
+        :type parent: QObject
+        """
+        super(MapCreationQueue, self).__init__(parent)
+        self.max_workers = max_workers or setting(
+            'map_creation_max_workers', MAP_CREATION_MAX_WORKERS,
+            expected_type=int, qsettings=QSettings())
+        self.pending = []
+        self.running = []
+        self.finished = []
+
+    def submit(self, description, function, layer_path, **kwargs):
+        """Add a map creation job to the queue.
+
+        :param description: Description shown in the QGIS task manager.
+        :type description: str
+
+        :param function: Map creation function.
+        :type function: callable
+
+        :param layer_path: Base path of the layer written by the function.
+        :type layer_path: str
+
+        :param kwargs: Keyword arguments of the function.
+        :type kwargs: dict
+
+        :returns: The queued task.
+        :rtype: MapCreationTask
+        """
+        task = MapCreationTask(description, function, layer_path, **kwargs)
+        self.pending.append(task)
+        self.start_next()
+        self.emit_progress()
+        return task
+
+    def start_next(self):
+        """Hand pending tasks to the task manager up to the limit."""
+        while self.pending and len(self.running) < self.max_workers:
+            task = self.pending.pop(0)
+            task.taskCompleted.connect(
+                lambda task=task: self.task_finished(task))
+            task.taskTerminated.connect(
+                lambda task=task: self.task_finished(task))
+            self.running.append(task)
+            QgsApplication.taskManager().addTask(task)
+
+    def task_finished(self, task):
+        """Record a finished task and start the next one.
+
+        :param task: The finished task.
+        :type task: MapCreationTask
+        """
+        if task not in self.running:
+            return
+        self.running.remove(task)
+        self.finished.append(task)
+        if not task.is_success:
+            log('Map creation failed: {} {}'.format(
+                task.name, task.message), info=False)
+        self.job_finished.emit(task)
+        self.start_next()
+        self.emit_progress()
+        if not self.is_running():
+            finished, self.finished = self.finished, []
+            self.queue_finished.emit(finished)
+
+    def emit_progress(self):
+        """Emit the number of finished jobs and the number of jobs."""
+        total = len(self.pending) + len(self.running) + len(self.finished)
+        self.progress_changed.emit(len(self.finished), total)
+
+    def is_running(self):
+        """Whether jobs are waiting or running.
+
+        :rtype: bool
+        """
+        return bool(self.pending or self.running)
+
+    def cancel(self):
+        """Drop the waiting jobs and cancel the running ones."""
+        for task in self.pending:
+            task.is_success, task.message = False, 'Map creation cancelled.'
+            self.finished.append(task)
+        self.pending = []
+        for task in self.running:
+            task.cancel()
+        self.emit_progress()
+        if not self.running and self.finished:
+            finished, self.finished = self.finished, []
+            self.queue_finished.emit(finished)
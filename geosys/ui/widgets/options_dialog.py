@@ -52,7 +52,10 @@ class GeosysOptionsDialog(QtWidgets.QDialog, FORM_CLASS):
         self.boolean_settings = {
             #'geosys_region_na': self.us_radio_button,
             #'geosys_region_eu': self.eu_radio_button,
-            'use_testing_service': self.testing_service_checkbox
+            'use_testing_service': self.testing_service_checkbox,
+            'keep_zipped_products': self.keep_zipped_products_checkbox,
+            'simplify_geometries': self.simplify_geometries_checkbox,
+            'geopackage_output': self.geopackage_output_checkbox
         }
         self.credentials_settings = {
             'bridge_api_username': self.username_form,
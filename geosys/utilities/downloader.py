@@ -1,16 +1,26 @@
 # coding=utf-8
 """Helpers for QGIS related functionality."""
+import hashlib
 import logging
 import os
+import re
+import shutil
 import zipfile
 import json
 
-from qgis.core import QgsApplication, QgsNetworkAccessManager
+from qgis.core import QgsNetworkAccessManager
 # noinspection PyPackageRequirements
-from qgis.PyQt.QtCore import QByteArray, QFile, QUrl
+from qgis.PyQt.QtCore import (
+    QByteArray, QEventLoop, QFile, QIODevice, QObject, QTimer, QUrl,
+    pyqtSignal)
 # noinspection PyPackageRequirements
 from qgis.PyQt.QtNetwork import QNetworkReply, QNetworkRequest
 
+from geosys.bridge_api.default import DOWNLOAD_BACKOFF, DOWNLOAD_RETRIES
+from geosys.bridge_api.retry import (
+    RateLimiter, RetryPolicy, retry_after_seconds)
+from geosys.utilities.settings import setting
+
 __copyright__ = "Copyright 2019, Kartoza"
 __license__ = "GPL version 3"
 __email__ = "rohmat@kartoza.com"
@@ -18,8 +28,41 @@ __revision__ = "$Format:%H$"
 
 LOGGER = logging.getLogger('geosys')
 
-
-def fetch_data(url, output_path, headers=None, progress_dialog=None, method='GET', payload=None):
+# Buffer size used when copying zip members to disk.
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# GDAL virtual file system prefix of a file inside a zip archive.
+VSIZIP_PREFIX = '/vsizip/'
+
+# Suffix of the file receiving the bytes until the download is complete.
+PARTIAL_SUFFIX = '.part'
+# Suffix of the file keeping the url and the ETag or Last-Modified value of
+# a partial file, next to it. A partial file is only resumed with it.
+VALIDATOR_SUFFIX = '.validator'
+
+# First byte of a Content-Range header, e.g. bytes 100-999/1000.
+CONTENT_RANGE_START = re.compile(r'bytes\s+(\d+)-')
+
+# Reply errors after which a GET download is attempted again.
+RETRYABLE_ERRORS = [
+    QNetworkReply.RemoteHostClosedError,
+    QNetworkReply.TimeoutError,
+    QNetworkReply.TemporaryNetworkFailureError,
+    QNetworkReply.NetworkSessionFailedError,
+    QNetworkReply.UnknownNetworkError,
+    QNetworkReply.ProxyConnectionClosedError,
+    QNetworkReply.ProxyTimeoutError,
+    QNetworkReply.ServiceUnavailableError,
+    QNetworkReply.UnknownServerError,
+    # QgsNetworkAccessManager aborts the reply when the request times out.
+    QNetworkReply.OperationCanceledError,
+]
+
+
+def fetch_data(
+        url, output_path, headers=None, progress_dialog=None, method='GET',
+        payload=None, hash_algorithm=None, retries=None, backoff=None,
+        feedback=None, idempotent=None):
     """Download data from url and write to output_path.
 
     :param url: URL of the zip bundle.
@@ -34,6 +77,30 @@ def fetch_data(url, output_path, headers=None, progress_dialog=None, method='GET
     :param progress_dialog: A progress dialog.
     :type progress_dialog: QProgressDialog
 
+    :param hash_algorithm: Optional hashlib algorithm name, e.g. 'sha256',
+        used to hash the bytes while they are written.
+    :type hash_algorithm: str
+
+    :param retries: Number of times an interrupted download is resumed.
+        Defaults to the download_retries setting.
+    :type retries: int
+
+    :param backoff: Base delay in seconds before a retry, doubled after
+        every attempt and randomised. Defaults to the download_backoff
+        setting.
+    :type backoff: float
+
+    :param feedback: Optional feedback, canceling it aborts the download.
+    :type feedback: QgsFeedback
+
+    :param idempotent: Whether the request only reads data and can be sent
+        again, e.g. a POST rendering a map. Defaults to the method semantic.
+    :type idempotent: bool
+
+    :returns: Hex digest of the downloaded bytes when hash_algorithm is
+        given, otherwise None.
+    :rtype: str, None
+
     :raises: ImportDialogError - when network error occurred
     """
 
@@ -53,7 +120,9 @@ def fetch_data(url, output_path, headers=None, progress_dialog=None, method='GET
         progress_dialog.setLabelText(label_text)
 
     # Download Process
-    downloader = FileDownloader(url, output_path, headers, progress_dialog, method, payload)
+    downloader = FileDownloader(
+        url, output_path, headers, progress_dialog, method, payload,
+        hash_algorithm, retries, backoff, feedback, idempotent)
     try:
         result = downloader.download()
     except IOError as ex:
@@ -63,6 +132,127 @@ def fetch_data(url, output_path, headers=None, progress_dialog=None, method='GET
         _, error_message = result
         raise Exception(error_message)
 
+    return downloader.hexdigest()
+
+
+def fetch_data_async(
+        url, output_path, headers=None, method='GET', payload=None,
+        hash_algorithm=None, callback=None, retries=None, backoff=None,
+        feedback=None, idempotent=None):
+    """Start downloading data from url to output_path without blocking.
+
+    :param url: URL of the file.
+    :type url: str
+
+    :param output_path: Path of output file,
+    :type output_path: str
+
+    :param headers: Request headers.
+    :type headers: dict
+
+    :param method: HTTP method (GET/POST).
+    :type method: str
+
+    :param payload: JSON payload for POST requests.
+    :type payload: dict
+
+    :param hash_algorithm: Optional hashlib algorithm name used to hash
+        the bytes while they are written.
+    :type hash_algorithm: str
+
+    :param callback: Optional callable receiving the result tuple once the
+        download is finished.
+    :type callback: callable
+
+    :param retries: Number of times an interrupted download is resumed.
+    :type retries: int
+
+    :param backoff: Delay in seconds before the first retry.
+    :type backoff: float
+
+    :param feedback: Optional feedback, canceling it aborts the download.
+    :type feedback: QgsFeedback
+
+    :param idempotent: Whether the request only reads data and can be sent
+        again. Defaults to the method semantic.
+    :type idempotent: bool
+
+    :returns: The running downloader. Keep a reference to it until it is
+        finished, connect to its download_finished signal or call wait().
+    :rtype: FileDownloader
+    """
+    LOGGER.debug('Downloading file from URL: %s' % url)
+    LOGGER.debug('Downloading to: %s' % output_path)
+
+    downloader = FileDownloader(
+        url, output_path, headers, method=method, payload=payload,
+        hash_algorithm=hash_algorithm, retries=retries, backoff=backoff,
+        feedback=feedback, idempotent=idempotent)
+    downloader.start(callback)
+    return downloader
+
+
+def fetch_all_data(downloads, headers=None, feedback=None):
+    """Download several files concurrently, keeping all or none of them.
+
+    The downloads run together on the network access manager of the
+    current thread. When one of them fails, the others are cancelled and
+    the files already downloaded are removed so no incomplete product is
+    left.
+
+    :param downloads: List of (url, output_path) tuples.
+    :type downloads: list
+
+    :param headers: Request headers.
+    :type headers: dict
+
+    :param feedback: Optional feedback, canceling it aborts the downloads.
+    :type feedback: QgsFeedback
+
+    :raises: Exception - when a download failed.
+    """
+    downloaders = []
+    # Errors in the order the downloads failed, the first one is the cause.
+    errors = []
+
+    def download_finished(result):
+        """Cancel the other downloads once one of them failed."""
+        if result[0] is True:
+            return
+        errors.append(result[1])
+        for downloader in downloaders:
+            downloader.cancel()
+
+    try:
+        for url, output_path in downloads:
+            downloader = fetch_data_async(
+                url, output_path, headers=headers, feedback=feedback)
+            downloaders.append(downloader)
+            if downloader.is_finished():
+                download_finished(downloader.result)
+            else:
+                downloader.download_finished.connect(download_finished)
+            if errors:
+                break
+    except Exception:
+        for downloader in downloaders:
+            downloader.cancel()
+        raise
+    finally:
+        for downloader in downloaders:
+            downloader.wait()
+
+    if not errors:
+        return
+    for downloader in downloaders:
+        if downloader.result[0] is True and os.path.exists(
+                downloader.output_path):
+            os.remove(downloader.output_path)
+        elif downloader.cancelled:
+            # Not worth resuming without the files of the other downloads.
+            downloader.remove_partial_file()
+    raise Exception(errors[0])
+
 
 def extract_zip(zip_path, destination_base_path):
     """Extract different extensions to the destination base path.
@@ -87,28 +277,77 @@ def extract_zip(zip_path, destination_base_path):
     :raises: IOError - when not able to open path or output_dir does not
         exist.
     """
-    handle = open(zip_path, 'rb')
-    zip_file = zipfile.ZipFile(handle)
-    for name in zip_file.namelist():
-        extension = os.path.splitext(name)[1]
-        _, requested_extension = os.path.splitext(destination_base_path)
-        if requested_extension:
-            output_final_path = destination_base_path
-        else:
-            output_final_path = '%s%s' % (destination_base_path, extension)
-        output_file = open(output_final_path, 'wb')
-        output_file.write(zip_file.read(name))
-        output_file.close()
+    _, requested_extension = os.path.splitext(destination_base_path)
+    with zipfile.ZipFile(zip_path) as zip_file:
+        for member in zip_file.infolist():
+            if member.is_dir():
+                continue
+            extension = os.path.splitext(member.filename)[1]
+            if requested_extension:
+                output_final_path = destination_base_path
+            else:
+                output_final_path = '%s%s' % (
+                    destination_base_path, extension)
+            # Copy in chunks so large members are never fully in memory.
+            with zip_file.open(member) as source, \
+                    open(output_final_path, 'wb') as output_file:
+                shutil.copyfileobj(source, output_file, COPY_BUFFER_SIZE)
+
+
+def vsizip_path(zip_path, extensions):
+    """GDAL/OGR path of the first member of a zip with a given extension.
+
+    Layers can be opened from this path without extracting the archive.
+
+    :param zip_path: The path of the .zip file
+    :type zip_path: str
 
-    handle.close()
+    :param extensions: Accepted extensions of the member, e.g. ['.shp'].
+    :type extensions: list
 
+    :returns: The /vsizip/ path, None if no member has the extension.
+    :rtype: str
+    """
+    extensions = [extension.lower() for extension in extensions]
+    with zipfile.ZipFile(zip_path) as zip_file:
+        for name in zip_file.namelist():
+            if os.path.splitext(name)[1].lower() in extensions:
+                return '%s%s/%s' % (
+                    VSIZIP_PREFIX, zip_path.replace(os.sep, '/'), name)
+    return None
+
+
+class FileDownloader(QObject):
+    """The blueprint for downloading file from url.
+
+    The download is driven by the Qt event loop: start() returns right away
+    and download_finished is emitted with the result tuple once the reply is
+    finished. download() is the blocking variant, waiting in a local
+    QEventLoop instead of polling.
+
+    Bytes are written to a partial file next to the output path, which is
+    renamed once the download is complete. When the transfer is interrupted
+    the download is retried, resuming an idempotent request, a GET or a POST
+    only reading data, with a Range header from the bytes already received.
+    A partial file left by an earlier attempt is resumed the same way.
+
+    Retries follow the RetryPolicy of the API clients: a POST is only sent
+    again when throttled, unless it is marked idempotent, and a Retry-After
+    header sets the delay. Requests
+    also share the per host rate limit of the API clients.
+    """
 
-class FileDownloader:
-    """The blueprint for downloading file from url."""
+    download_finished = pyqtSignal(object)
 
-    def __init__(self, url, output_path, headers=None, progress_dialog=None, method='GET', payload=None):
+    def __init__(
+            self, url, output_path, headers=None, progress_dialog=None,
+            method='GET', payload=None, hash_algorithm=None, retries=None,
+            backoff=None, feedback=None, idempotent=None):
         """Constructor of the class.
 
+        Downloaded bytes are written to the output file as they arrive, so
+        memory use does not grow with the size of the file.
+
         :param url: URL of file.
         :type url: str
 
@@ -123,38 +362,133 @@ class FileDownloader:
 
         :param progress_dialog: Progress dialog widget.
         :type progress_dialog: QWidget
+
+        :param hash_algorithm: Optional hashlib algorithm name used to hash
+            the bytes while they are written.
+        :type hash_algorithm: str
+
+        :param retries: Number of times an interrupted download is resumed.
+            Defaults to the download_retries setting.
+        :type retries: int
+
+        :param backoff: Base delay in seconds before a retry, doubled
+            after every attempt and randomised. Defaults to the
+            download_backoff setting.
+        :type backoff: float
+
+        :param feedback: Optional feedback, canceling it aborts the
+            download. It can be canceled from another thread.
+        :type feedback: QgsFeedback
+
+        :param idempotent: Whether the request only reads data and can be
+            sent again, e.g. a POST rendering a map. Defaults to the method
+            semantic.
+        :type idempotent: bool
         """
+        super(FileDownloader, self).__init__()
         # noinspection PyArgumentList
         self.manager = QgsNetworkAccessManager.instance()
         self.url = QUrl(url)
         self.output_path = output_path
+        self.partial_path = output_path + PARTIAL_SUFFIX
+        self.validator_path = self.partial_path + VALIDATOR_SUFFIX
         self.headers = headers if headers else {}
         self.progress_dialog = progress_dialog
+        self.feedback = feedback
         self.method = method.upper()
+        if idempotent is None:
+            idempotent = self.method == "GET"
+        self.idempotent = idempotent
         if self.progress_dialog:
             self.prefix_text = self.progress_dialog.labelText()
         # Convert payload to QByteArray
         self.payload = payload
+        self.hash_algorithm = hash_algorithm
+        if retries is None:
+            retries = setting(
+                'download_retries', DOWNLOAD_RETRIES, expected_type=int)
+        if backoff is None:
+            backoff = setting(
+                'download_backoff', DOWNLOAD_BACKOFF, expected_type=float)
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_policy = RetryPolicy(retries=retries, backoff=backoff)
+        self.attempt = 0
+        self.offset = 0
+        self.validator = None
+        self.restart_requested = False
         self.output_file = None
         self.reply = None
-        self.downloaded_file_buffer = None
+        self.hash = None
+        self.cancelled = False
         self.finished_flag = False
+        self.result = None
+        self.callback = None
 
     def download(self):
-        """Downloading the file.
+        """Downloading the file, blocking until it is finished.
 
         :returns: True if success, otherwise returns a tuple with format like
             this (QNetworkReply.NetworkError, error_message)
 
         :raises: IOError - when cannot create output_path
         """
-        # Prepare output path
-        self.output_file = QFile(self.output_path)
-        if not self.output_file.open(QFile.WriteOnly):
+        self.start()
+        return self.wait()
+
+    def start(self, callback=None):
+        """Start downloading the file without blocking.
+
+        :param callback: Optional callable receiving the result tuple once
+            the download is finished.
+        :type callback: callable
+
+        :raises: IOError - when cannot create output_path
+        """
+        if self.method == "POST" and not self.payload:
+            raise ValueError("POST method requires a payload.")
+        self.callback = callback
+
+        # Prepare the partial file, keeping the bytes of an earlier attempt
+        # when the request can be resumed and they come from the same file.
+        self.output_file = QFile(self.partial_path)
+        if self.idempotent:
+            self.validator = self.read_validator()
+        if self.validator:
+            mode = QIODevice.Append
+        else:
+            mode = QIODevice.WriteOnly
+        if not self.output_file.open(mode):
             raise IOError(self.output_file.errorString())
+        self.offset = self.output_file.size()
+        self.reset_hash()
 
-        # Prepare downloaded buffer
-        self.downloaded_file_buffer = QByteArray()
+        self.manager.requestTimedOut.connect(self.request_timeout)
+        if self.progress_dialog:
+            self.progress_dialog.canceled.connect(self.cancel)
+
+        self.schedule_request()
+
+        if self.feedback:
+            self.feedback.canceled.connect(self.cancel)
+            if self.feedback.isCanceled():
+                self.cancel()
+
+    def schedule_request(self, delay=0.0):
+        """Send the request after delay seconds and the host rate limit.
+
+        :param delay: Seconds to wait, e.g. before a retry.
+        :type delay: float
+        """
+        delay += RateLimiter.reserve(self.url.toString())
+        if delay > 0:
+            QTimer.singleShot(int(delay * 1000), self.retry)
+        else:
+            self.send_request()
+
+    def send_request(self):
+        """Send the request, asking only for the missing bytes if any."""
+        self.attempt += 1
 
         # Request the url
         request = QNetworkRequest(self.url)
@@ -170,27 +504,35 @@ class FileDownloader:
             #   request.setRawHeader(b'user-agent', userAgent)
             request.setRawHeader(
                 bytes(header_name, 'utf-8'), bytes(header_value, 'utf-8'))
+        if self.offset:
+            LOGGER.debug(
+                'Resuming download of %s from byte %s' % (
+                    self.url.toString(), self.offset))
+            request.setRawHeader(
+                b'Range', bytes('bytes=%s-' % self.offset, 'utf-8'))
+            # The whole file is sent instead if it changed since.
+            request.setRawHeader(
+                b'If-Range', bytes(self.validator, 'utf-8'))
         # Choose the HTTP method
         if self.method == "GET":
             self.reply = self.manager.get(request)
         elif self.method == "POST":
-            if self.payload:
-                # Convert payload to JSON    
-                # Ensure Content-Type is set when a payload is present
-                if self.payload and 'Content-Type' not in self.headers:
-                    self.headers['Content-Type'] = 'application/json'
-
-                payload_data = QByteArray(json.dumps(self.payload).encode('utf-8'))
-                request.setHeader(QNetworkRequest.ContentTypeHeader, "application/json")
-                self.reply = self.manager.post(request, payload_data)
-            else:
-                raise ValueError("POST method requires a payload.")
+            # Convert payload to JSON
+            # Ensure Content-Type is set when a payload is present
+            if self.payload and 'Content-Type' not in self.headers:
+                self.headers['Content-Type'] = 'application/json'
+
+            payload_data = QByteArray(json.dumps(self.payload).encode('utf-8'))
+            request.setHeader(QNetworkRequest.ContentTypeHeader, "application/json")
+            self.reply = self.manager.post(request, payload_data)
+        self.reply.metaDataChanged.connect(self.check_range)
         self.reply.readyRead.connect(self.get_buffer)
         self.reply.finished.connect(self.write_data)
-        self.manager.requestTimedOut.connect(self.request_timeout)
 
         if self.progress_dialog:
             # progress bar
+            offset = self.offset
+
             def progress_event(received, total):
                 """Update progress.
 
@@ -200,8 +542,9 @@ class FileDownloader:
                 :param total: Total expected data.
                 :type total: int
                 """
-                # noinspection PyArgumentList
-                QgsApplication.processEvents()
+                received += offset
+                if total > 0:
+                    total += offset
 
                 self.progress_dialog.adjustSize()
 
@@ -212,33 +555,298 @@ class FileDownloader:
                 self.progress_dialog.setMaximum(total)
                 self.progress_dialog.setValue(received)
 
-            # cancel
-            def cancel_action():
-                """Cancel download."""
-                self.reply.abort()
-                self.reply.deleteLater()
-
             self.reply.downloadProgress.connect(progress_event)
-            self.progress_dialog.canceled.connect(cancel_action)
 
-        # Wait until finished
-        # On Windows 32bit AND QGIS 2.2, self.reply.isFinished() always
-        # returns False even after finished slot is called. So, that's why we
-        # are adding self.finished_flag (see #864)
-        while not self.reply.isFinished() and not self.finished_flag:
-            # noinspection PyArgumentList
-            QgsApplication.processEvents()
+        if self.feedback:
+            self.reply.downloadProgress.connect(self.feedback_progress)
 
-        result = self.reply.error()
+    def feedback_progress(self, received, total):
+        """Report the percentage downloaded to the feedback.
+
+        :param received: Data received so far by the current request.
+        :type received: int
+
+        :param total: Total expected data of the current request.
+        :type total: int
+        """
+        if total > 0:
+            self.feedback.setProgress(
+                100.0 * (received + self.offset) / (total + self.offset))
+
+    def http_code(self):
+        """HTTP status code of the current reply.
+
+        :returns: The status code, None when no response was received.
+        :rtype: int
+        """
         try:
-            http_code = int(self.reply.attribute(
+            return int(self.reply.attribute(
                 QNetworkRequest.HttpStatusCodeAttribute))
         except TypeError:
             # If the user cancels the request, the HTTP response will be None.
-            http_code = None
+            return None
+
+    def raw_header(self, name):
+        """Value of a header of the current reply.
+
+        :param name: Header name.
+        :type name: bytes
+
+        :returns: The header value, empty when it is missing.
+        :rtype: str
+        """
+        return bytes(self.reply.rawHeader(name)).decode('latin-1', 'ignore')
+
+    def check_range(self):
+        """Check the reply continues the partial file, start over if not.
+
+        A resumed reply must be a 206 starting at the end of the partial
+        file. The server sends the whole file with a 200 when the Range
+        header is ignored or the If-Range validator does not match.
+        """
+        http_code = self.http_code()
+        if http_code not in (200, 206):
+            return
+        if self.offset and http_code == 206:
+            match = CONTENT_RANGE_START.match(
+                self.raw_header(b'Content-Range'))
+            if match and int(match.group(1)) == self.offset:
+                return
+            LOGGER.debug(
+                'Server sent an unexpected range, restarting download.')
+            self.restart_requested = True
+            self.reply.abort()
+            return
+        if self.offset:
+            LOGGER.debug(
+                'Server ignored the range request, restarting download.')
+            self.output_file.resize(0)
+            self.offset = 0
+            self.reset_hash()
+        if self.idempotent:
+            self.save_validator()
+
+    def read_validator(self):
+        """Validator of the partial file, saved when it was started.
+
+        :returns: The ETag or Last-Modified value, None when the partial
+            file is missing or may not come from this request.
+        :rtype: str
+        """
+        if not os.path.exists(self.partial_path):
+            return None
+        try:
+            with open(self.validator_path) as validator_file:
+                validator = json.load(validator_file)
+        except (IOError, ValueError):
+            return None
+        if validator.get('request') != self.request_digest():
+            return None
+        return validator.get('validator') or None
+
+    def save_validator(self):
+        """Save the validator of the current reply next to the partial file.
+
+        Weak ETags cannot be used with If-Range, Last-Modified is used
+        instead. Without a validator the partial file is not resumed by a
+        later download.
+        """
+        etag = self.raw_header(b'ETag')
+        if etag and not etag.startswith('W/'):
+            self.validator = etag
+        else:
+            self.validator = self.raw_header(b'Last-Modified') or None
+        if self.validator:
+            with open(self.validator_path, 'w') as validator_file:
+                json.dump({
+                    'request': self.request_digest(),
+                    'validator': self.validator
+                }, validator_file)
+        else:
+            self.remove_validator()
+
+    def request_digest(self):
+        """Digest of the url, method and payload of the request.
+
+        A POST renders a different file for a different payload at the same
+        url, so the partial file of one is never resumed by the other.
 
-        self.reply.abort()
+        :rtype: str
+        """
+        content = json.dumps(
+            [self.url.toString(), self.method, self.payload],
+            sort_keys=True, default=str)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def remove_partial_file(self):
+        """Remove the partial file and its validator, if any."""
+        QFile.remove(self.partial_path)
+        self.remove_validator()
+
+    def remove_validator(self):
+        """Remove the validator of the partial file, if any."""
+        if os.path.exists(self.validator_path):
+            os.remove(self.validator_path)
+
+    def reset_hash(self):
+        """Hash the bytes already in the partial file, if hashing."""
+        if not self.hash_algorithm:
+            return
+        self.hash = hashlib.new(self.hash_algorithm)
+        if not self.offset:
+            return
+        self.output_file.flush()
+        with open(self.partial_path, 'rb') as partial_file:
+            for chunk in iter(lambda: partial_file.read(1024 * 1024), b''):
+                self.hash.update(chunk)
+
+    def wait(self):
+        """Block until the download is finished.
+
+        A local event loop is used so the thread sleeps until the network
+        reply signals. User input is only processed when a progress dialog
+        is shown, so that its cancel button keeps working.
+
+        :returns: The download result, see download().
+        :rtype: tuple
+        """
+        # On Windows 32bit AND QGIS 2.2, self.reply.isFinished() always
+        # returns False even after finished slot is called. So, that's why we
+        # are adding self.finished_flag (see #864)
+        if not self.finished_flag:
+            loop = QEventLoop()
+            self.download_finished.connect(loop.quit)
+            if self.progress_dialog:
+                loop.exec_()
+            else:
+                loop.exec_(QEventLoop.ExcludeUserInputEvents)
+            self.download_finished.disconnect(loop.quit)
+        return self.result
+
+    def is_finished(self):
+        """Whether the download is finished.
+
+        :rtype: bool
+        """
+        return self.finished_flag
+
+    def cancel(self):
+        """Abort the download, the result will be an error."""
+        self.cancelled = True
+        if self.reply and not self.reply.isFinished():
+            self.reply.abort()
+        elif not self.finished_flag:
+            # Waiting before a retry.
+            self.finish((False, 'The download was cancelled.'))
+
+    def get_buffer(self):
+        """Write the bytes available in self.reply to the output file."""
+        data = self.reply.readAll()
+        if data.isEmpty() or self.restart_requested:
+            return
+        http_code = self.http_code()
+        if http_code and http_code >= 400:
+            # Do not mix an error page into the partial file.
+            return
+        self.output_file.write(data)
+        if self.hash:
+            self.hash.update(data.data())
+
+    def write_data(self):
+        """Write the remaining data, then retry or publish the result."""
+        if self.finished_flag:
+            return
+        self.get_buffer()
+        self.output_file.flush()
+
+        if self.restart_requested or (
+                self.offset and self.http_code() == 416):
+            # The partial file does not match the remote file anymore.
+            LOGGER.debug('Partial file cannot be resumed, restarting.')
+            self.restart_requested = False
+            self.reply.deleteLater()
+            self.reply = None
+            self.output_file.resize(0)
+            self.offset = 0
+            self.validator = None
+            self.remove_validator()
+            self.reset_hash()
+            self.schedule_request()
+            return
+
+        result = self.reply_result()
+        retryable = result[0] is not True and (
+            not self.cancelled and self.retry_policy.should_retry(
+                self.attempt, self.http_code(),
+                idempotent=self.idempotent,
+                connection_error=self.reply.error() in RETRYABLE_ERRORS))
+        retry_after = retry_after_seconds(self.raw_header(b'Retry-After'))
         self.reply.deleteLater()
+        self.reply = None
+
+        if retryable:
+            if self.idempotent and self.validator:
+                self.offset = self.output_file.size()
+            else:
+                self.output_file.resize(0)
+                self.offset = 0
+                self.reset_hash()
+            delay = self.retry_policy.delay(self.attempt, retry_after)
+            LOGGER.debug(
+                'Download of %s failed (%s), retrying in %.1f seconds.' % (
+                    self.url.toString(), result[1], delay))
+            self.schedule_request(delay)
+            return
+
+        self.finish(result)
+
+    def retry(self):
+        """Send the request again, unless the download was cancelled."""
+        if not self.finished_flag:
+            self.send_request()
+
+    def finish(self, result):
+        """Close the file and publish the result.
+
+        The partial file becomes the output file on success. On failure it
+        is kept for a later attempt when the request can be resumed.
+
+        :param result: The download result, see download().
+        :type result: tuple
+        """
+        self.output_file.close()
+        if result[0] is True:
+            if QFile.exists(self.output_path):
+                QFile.remove(self.output_path)
+            if not QFile.rename(self.partial_path, self.output_path):
+                result = False, 'Unable to write %s' % self.output_path
+            self.remove_validator()
+        elif (not self.idempotent or not self.validator or
+                not self.output_file.size()):
+            self.remove_partial_file()
+
+        if self.feedback:
+            try:
+                self.feedback.canceled.disconnect(self.cancel)
+            except TypeError:
+                # Finished before the feedback was connected.
+                pass
+
+        self.result = result
+        self.finished_flag = True
+        self.download_finished.emit(self.result)
+        if self.callback:
+            self.callback(self.result)
+
+    def reply_result(self):
+        """Translate the finished reply into a result tuple.
+
+        :returns: True if success, otherwise returns a tuple with format like
+            this (QNetworkReply.NetworkError, error_message)
+        :rtype: tuple
+        """
+        result = self.reply.error()
+        http_code = self.http_code()
 
         if result == QNetworkReply.NoError:
             return True, None
@@ -273,24 +881,20 @@ class FileDownloader:
         elif result == QNetworkReply.ContentNotFoundError:
             LOGGER.exception('Path not found : %s' % self.url.path())
             LOGGER.error(f"Content not found at URL: {self.url.toString()}")
-            LOGGER.error(f"Headers sent: {self.requestHeaders().toRawHeaders()}")
-            LOGGER.error(f"Server response: {self.reply.readAll().data()}")
+            LOGGER.error(
+                f"Headers sent: {self.reply.request().rawHeaderList()}")
             return False, 'Sorry, the content was not found on the server.'
 
         else:
             return result, self.reply.errorString()
 
-    def get_buffer(self):
-        """Get buffer from self.reply and store it to our buffer container."""
-        buffer_size = self.reply.size()
-        data = self.reply.read(buffer_size)
-        self.downloaded_file_buffer.append(data)
+    def hexdigest(self):
+        """Hex digest of the bytes written so far.
 
-    def write_data(self):
-        """Write data to a file."""
-        self.output_file.write(self.downloaded_file_buffer)
-        self.output_file.close()
-        self.finished_flag = True
+        :returns: The digest, or None when no hash algorithm was given.
+        :rtype: str, None
+        """
+        return self.hash.hexdigest() if self.hash else None
 
     def request_timeout(self):
         """The request timed out."""
@@ -1,6 +1,9 @@
 # coding=utf-8
 """GUI utilities for the dock and the multi Exposure Tool."""
 import os
+import threading
+from datetime import datetime
+
 from past.builtins import cmp
 
 from qgis.core import (
@@ -10,6 +13,7 @@ from qgis.core import (
     QgsWkbTypes,
     QgsCoordinateTransform,
     QgsFeature,
+    QgsFeatureRequest,
     QgsMemoryProviderUtils,
     QgsFields,
     QgsCoordinateReferenceSystem,
@@ -19,11 +23,19 @@ from qgis.core import (
     QgsGeometry,
     QgsVectorFileWriter)
 
-from qgis.PyQt.QtCore import Qt
+from qgis.PyQt.QtCore import (
+    Qt, QCoreApplication, QObject, QThread, pyqtSignal, pyqtSlot)
 from PyQt5.QtCore import QVariant
 
 from geosys.utilities.qgis import qgis_version
-from geosys.bridge_api.default import SHP_EXT
+from geosys.bridge_api.default import (
+    GPKG_EXT,
+    METERS_PER_DEGREE,
+    SHP_EXT,
+    SIMPLIFY_RESOLUTION_RATIO,
+    WKT_PRECISION)
+from geosys.bridge_api.definitions import SENSORS
+from geosys.bridge_api.utilities import get_definition
 from geosys.utilities.settings import setting
 
 __copyright__ = "Copyright 2019, Kartoza"
@@ -225,9 +237,42 @@ def layer_icon(layer):
         return QgsLayerItem.iconDefault()
 
 
+class LayerLoader(QObject):
+    """Adds layers created by background tasks from the main thread.
+
+    The project may only be changed from the main thread, so layers
+    created elsewhere are moved to it and added through a queued signal.
+    """
+
+    layer_ready = pyqtSignal(object, str)
+
+    def __init__(self):
+        """Constructor."""
+        super(LayerLoader, self).__init__()
+        self.layer_ready.connect(self.add_layer)
+
+    @pyqtSlot(object, str)
+    def add_layer(self, layer, name):
+        """Add layer to QGIS.
+
+        :param layer: The layer.
+        :type layer: QgsMapLayer
+
+        :param name: Layer name.
+        :type name: str
+        """
+        add_layer_to_canvas(layer, name)
+
+
+# Created on import, i.e. in the main thread.
+layer_loader = LayerLoader()
+
+
 def add_layer_to_canvas(layer, name):
     """Helper method to add layer to QGIS.
 
+    It can be called from any thread, the layer is added by the main thread.
+
     :param layer: The layer.
     :type layer: QgsMapLayer
 
@@ -235,6 +280,12 @@ def add_layer_to_canvas(layer, name):
     :type name: str
 
     """
+    main_thread = QCoreApplication.instance().thread()
+    if QThread.currentThread() != main_thread:
+        layer.moveToThread(main_thread)
+        layer_loader.layer_ready.emit(layer, name)
+        return
+
     if qgis_version() >= 21800:
         layer.setName(name)
     else:
@@ -334,8 +385,141 @@ def reproject(layer, output_crs):
     return reprojected
 
 
+def geometry_request(output_crs=None, feature_ids=None, max_features=None):
+    """Feature request reading only the geometry of the needed features.
+
+    The geometries are reprojected by the feature iterator, one feature at a
+    time, so no copy of the layer is made.
+
+    :param output_crs: CRS of the returned geometries, defaults to the CRS
+        of the layer.
+    :type output_crs: QgsCoordinateReferenceSystem
+
+    :param feature_ids: Ids of the requested features, defaults to all.
+    :type feature_ids: list
+
+    :param max_features: Number of maximum features to read.
+    :type max_features: int
+
+    :return: The feature request.
+    :rtype: QgsFeatureRequest
+    """
+    request = QgsFeatureRequest()
+    request.setSubsetOfAttributes([])
+    if feature_ids is not None:
+        request.setFilterFids(feature_ids)
+    if max_features is not None:
+        request.setLimit(max_features)
+    if output_crs is not None:
+        request.setDestinationCrs(
+            output_crs, QgsProject.instance().transformContext())
+    return request
+
+
+def wkt_geometries_from_layer(
+        layer, output_crs=None, feature_ids=None, max_features=None,
+        as_single_geometry=False, simplify_tolerance=None, precision=None):
+    """Get list of wkt geometries of a layer in the given CRS.
+
+    Only the requested features are read and reprojected, see
+    geometry_request.
+
+    :param layer: Vector layer or feature source.
+    :type layer: QgsFeatureSource
+
+    :param output_crs: CRS of the geometries, defaults to the layer CRS.
+    :type output_crs: QgsCoordinateReferenceSystem
+
+    :param feature_ids: Ids of the requested features, defaults to all.
+    :type feature_ids: list
+
+    :param max_features: Number of maximum features iteration.
+    :type max_features: int
+
+    :param as_single_geometry: Flag indicating whether to squash the features
+        into single geometry or not.
+    :type as_single_geometry: bool
+
+    :param simplify_tolerance: Simplification tolerance, see geometry_wkt.
+    :type simplify_tolerance: float
+
+    :param precision: Number of decimals, see geometry_wkt.
+    :type precision: int
+
+    :return: List of wkt geometries.
+    :rtype: list
+    """
+    request = geometry_request(output_crs, feature_ids, max_features)
+    return wkt_geometries_from_feature_iterator(
+        layer.getFeatures(request), max_features, as_single_geometry,
+        simplify_tolerance, precision)
+
+
+def sensor_simplify_tolerance(sensor=None, qsettings=None):
+    """Simplification tolerance in degrees of the geometries sent to the API.
+
+    The tolerance is a fraction of the resolution of the sensor, so the
+    simplification does not change the pixels of the maps. The finest
+    resolution is used when the sensor is not known.
+
+    :param sensor: Sensor key.
+    :type sensor: str
+
+    :param qsettings: A custom QSettings to use.
+    :type qsettings: qgis.PyQt.QtCore.QSettings
+
+    :return: The tolerance, None when the simplify_geometries setting is
+        disabled.
+    :rtype: float
+    """
+    if not setting(
+            'simplify_geometries', False, expected_type=bool,
+            qsettings=qsettings):
+        return None
+    definition = get_definition(sensor) if sensor else None
+    if definition and definition.get('resolution'):
+        resolution = definition['resolution']
+    else:
+        resolution = min(item['resolution'] for item in SENSORS)
+    # A degree of longitude is shorter than a degree of latitude, the
+    # tolerance is never larger than requested.
+    return resolution * SIMPLIFY_RESOLUTION_RATIO / METERS_PER_DEGREE
+
+
+def geometry_wkt(geometry, simplify_tolerance=None, precision=None):
+    """WKT of a geometry, simplified and with trimmed coordinates.
+
+    The simplification preserves the topology, a geometry which would
+    collapse is kept as it is.
+
+    :param geometry: The geometry.
+    :type geometry: QgsGeometry
+
+    :param simplify_tolerance: Simplification tolerance in the units of the
+        geometry, no simplification when not given.
+    :type simplify_tolerance: float
+
+    :param precision: Number of decimals of the coordinates. Defaults to
+        WKT_PRECISION when simplifying, otherwise to the full precision.
+    :type precision: int
+
+    :return: The WKT.
+    :rtype: str
+    """
+    if simplify_tolerance:
+        simplified = geometry.simplify(simplify_tolerance)
+        if simplified and not simplified.isEmpty():
+            geometry = simplified
+        if precision is None:
+            precision = WKT_PRECISION
+    if precision is None:
+        return geometry.asWkt()
+    return geometry.asWkt(precision)
+
+
 def wkt_geometries_from_feature_iterator(
-        feature_iterator, max_features=None, as_single_geometry=False):
+        feature_iterator, max_features=None, as_single_geometry=False,
+        simplify_tolerance=None, precision=None):
     """Get list of wkt geometries from a QgsMapLayer feature iterator.
 
     :param feature_iterator: QGIS layer feature iterator.
@@ -349,13 +533,19 @@ def wkt_geometries_from_feature_iterator(
         into single geometry or not.
     :type as_single_geometry: bool
 
+    :param simplify_tolerance: Simplification tolerance, see geometry_wkt.
+    :type simplify_tolerance: float
+
+    :param precision: Number of decimals, see geometry_wkt.
+    :type precision: int
+
     :return: List of wkt geometries.
     :rtype: list
     """
     geom = None
     geoms = []
     for index, feature in enumerate(feature_iterator):
-        if index >= max_features:
+        if max_features is not None and index >= max_features:
             break
         if not feature.hasGeometry():
             continue
@@ -368,9 +558,11 @@ def wkt_geometries_from_feature_iterator(
             geoms.append(feature.geometry())
 
     if geom:
-        return [geom.asWkt()]
+        return [geometry_wkt(geom, simplify_tolerance, precision)]
     elif geoms:
-        return [geom.asWkt() for geom in geoms]
+        return [
+            geometry_wkt(geom, simplify_tolerance, precision)
+            for geom in geoms]
     else:
         return []
 
@@ -399,11 +591,147 @@ def attribute_from_feature_iterator(
     return attr_vals
 
 
+def hotspot_layer_fields(source_type):
+    """Fields of a hotspots or zones layer.
+
+    :param source_type: Source type, hotspots or segments.
+    :type source_type: str
+
+    :return: The layer fields.
+    :rtype: QgsFields
+    """
+    fields = QgsFields()
+    if source_type == "hotspots":
+        fields.append(QgsField("segmentId", QVariant.String))
+        fields.append(QgsField("value", QVariant.String))
+    else:
+        fields.append(QgsField("id", QVariant.Int))
+        fields.append(QgsField("mean", QVariant.Double))
+        fields.append(QgsField("max", QVariant.Double))
+        fields.append(QgsField("min", QVariant.Double))
+        fields.append(QgsField("area", QVariant.Double))
+        fields.append(QgsField("std", QVariant.Double))
+    return fields
+
+
+def hotspot_layer_features(source, source_type, fields):
+    """Features of a hotspots or zones layer.
+
+    :param source: Hotspots or zones of a hotspot response, see
+        create_hotspot_layer.
+    :type source: list
+
+    :param source_type: Source type, hotspots or segments.
+    :type source_type: str
+
+    :param fields: Fields of the layer.
+    :type fields: QgsFields
+
+    :return: The features, with multipart geometries.
+    :rtype: list
+    """
+    if source_type == "hotspots":
+        rows = (
+            (spot.get('geometry'),
+             [spot.get('segmentId'), str(spot.get('value'))])
+            for spot in source)
+    else:
+        rows = (
+            (polygon['geometry'],
+             [int(polygon['id']),
+              float(polygon['stats']['mean']),
+              float(polygon['stats']['max']),
+              float(polygon['stats']['min']),
+              float(polygon['stats']['area']),
+              # The API produces None values for standard deviation, they
+              # are left as None in the attribute table.
+              None if polygon['stats']['std'] is None
+              else float(polygon['stats']['std'])])
+            for zone in source
+            for polygon in zone.get('segments'))
+
+    features = []
+    for wkt, attributes in rows:
+        geom = QgsGeometry.fromWkt(wkt)
+        geom.convertToMultiType()
+        feature = QgsFeature(fields)
+        feature.setGeometry(geom)
+        feature.setAttributes(attributes)
+        features.append(feature)
+    return features
+
+
+# GeoPackage of the vector outputs of this session, per output directory.
+_session_geopackages = {}
+# SQLite allows a single writer, the layers are written one at a time.
+_geopackage_lock = threading.Lock()
+
+
+def session_geopackage(output_dir):
+    """Path of the GeoPackage of the vector outputs of this session.
+
+    :param output_dir: Output directory.
+    :type output_dir: str
+
+    :return: Path of the GeoPackage, it is created by the first layer
+        written in it.
+    :rtype: str
+    """
+    with _geopackage_lock:
+        if output_dir not in _session_geopackages:
+            filename = 'geosys_{}{}'.format(
+                datetime.now().strftime('%Y%m%d_%H%M%S'), GPKG_EXT)
+            _session_geopackages[output_dir] = os.path.join(
+                output_dir, filename)
+        return _session_geopackages[output_dir]
+
+
+def write_vector_features(
+        file_name, fields, wkb_type, crs, features, options):
+    """Write features in a new vector layer with a single writer.
+
+    :param file_name: Path of the layer.
+    :type file_name: str
+
+    :param fields: Fields of the layer.
+    :type fields: QgsFields
+
+    :param wkb_type: Geometry type of the layer.
+    :type wkb_type: QgsWkbTypes.Type
+
+    :param crs: Coordinate reference system of the layer.
+    :type crs: QgsCoordinateReferenceSystem
+
+    :param features: Features to write.
+    :type features: list
+
+    :param options: Writer options, with the driver of the layer.
+    :type options: QgsVectorFileWriter.SaveVectorOptions
+
+    :return: The writer error, QgsVectorFileWriter.NoError on success.
+    :rtype: QgsVectorFileWriter.WriterError
+    """
+    writer = QgsVectorFileWriter.create(
+        file_name,
+        fields,
+        wkb_type,
+        crs,
+        QgsProject.instance().transformContext(),
+        options)
+    if writer.hasError() == QgsVectorFileWriter.NoError:
+        writer.addFeatures(features)
+    error = writer.hasError()
+    # Deleting the writer flushes the features to disk.
+    del writer
+    return error
+
+
 def create_hotspot_layer(
         source,
         source_type,
         source_filename,
-        crs_authid=None
+        crs_authid=None,
+        output_dir=None
 ):
     """Creates layer from wkt text in the source.
 
@@ -449,73 +777,54 @@ def create_hotspot_layer(
 
         :param crs_authid: string containing a coordinate reference system definition
         :type crs_authid: string
+
+        :param output_dir: Directory of the layer, the output directory
+            setting by default.
+        :type output_dir: str
+
+        :return: Path of the layer, or its GeoPackage table URI when the
+            geopackage_output setting is enabled. None when it could not
+            be written.
+        :rtype: str
     """
     crs = QgsCoordinateReferenceSystem(crs_authid)
-    fields = QgsFields()
-    features = []
-
     if source_type == "hotspots":
-        layer_type = "MULTIPOINT?crs={}".format(crs.authid())
-        fields.append(QgsField("segmentId", QVariant.String))
-        fields.append(QgsField("value", QVariant.String))
-
-        for spot in source:
-            geom = QgsGeometry.fromWkt(spot.get('geometry'))
-            feature = QgsFeature()
-            feature.setFields(fields)
-            feature.setGeometry(geom)
-            feature[0] = spot.get('segmentId')
-            feature[1] = str(spot.get('value'))
-            features.append(feature)
+        wkb_type = QgsWkbTypes.MultiPoint
     else:
-        layer_type = "MULTIPOLYGON?crs={}".format(crs.authid())
-        for zone in source:
-            fields.append(QgsField("id", QVariant.Int))
-            fields.append(QgsField("mean", QVariant.Double))
-            fields.append(QgsField("max", QVariant.Double))
-            fields.append(QgsField("min", QVariant.Double))
-            fields.append(QgsField("area", QVariant.Double))
-            fields.append(QgsField("std", QVariant.Double))
-
-            for polygon in zone.get('segments'):
-                geom = QgsGeometry.fromWkt(polygon['geometry'])
-                feature = QgsFeature()
-                feature.setFields(fields)
-                feature.setGeometry(geom)
-                feature[0] = int(polygon['id'])
-                feature[1] = float(polygon['stats']['mean'])
-                feature[2] = float(polygon['stats']['max'])
-                feature[3] = float(polygon['stats']['min'])
-                feature[4] = float(polygon['stats']['area'])
-
-                # The API produces None values for standard deviation
-                # This check will leave the standard deviation as None in the attribute table if the response from the API is None
-                # Otherwise the value from the API will be used
-                std_value = polygon['stats']['std']
-                if std_value is not None:
-                    feature[5] = float(polygon['stats']['std'])
-
-                features.append(feature)
-
-    layer = QgsVectorLayer(layer_type, source_filename, "memory")
-    layer.dataProvider().addAttributes(fields)
-    layer.dataProvider().addFeatures(features)
-    layer.updateExtents()
-    layer.reload()
-
-    file_name = '{}{}'.format(source_filename, SHP_EXT)
-    output_dir = setting(
-        'output_directory', expected_type=str)
-    file_name = os.path.join(output_dir, file_name)
-
-    # Save memory layer to disk
-    error, error_message = QgsVectorFileWriter.writeAsVectorFormat(
-        layer,
-        file_name,
-        "UTF-8",
-        crs,
-        "ESRI Shapefile")
-
-    if error == QgsVectorFileWriter.NoError:
-        saved_layer = QgsVectorLayer(file_name, source_filename, "ogr")
-        add_layer_to_canvas(saved_layer, source_filename)
+        wkb_type = QgsWkbTypes.MultiPolygon
+    fields = hotspot_layer_fields(source_type)
+    features = hotspot_layer_features(source, source_type, fields)
+
+    if not output_dir:
+        output_dir = setting(
+            'output_directory', expected_type=str)
+
+    # The features are written straight to disk, all at once.
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.fileEncoding = "UTF-8"
+    if setting('geopackage_output', False, expected_type=bool):
+        # Every layer is a table of the session GeoPackage.
+        file_name = session_geopackage(output_dir)
+        uri = '{}|layername={}'.format(file_name, source_filename)
+        options.driverName = "GPKG"
+        options.layerName = source_filename
+        options.layerOptions = ['SPATIAL_INDEX=YES']
+        with _geopackage_lock:
+            if os.path.exists(file_name):
+                options.actionOnExistingFile = (
+                    QgsVectorFileWriter.CreateOrOverwriteLayer)
+            error = write_vector_features(
+                file_name, fields, wkb_type, crs, features, options)
+    else:
+        file_name = os.path.join(
+            output_dir, '{}{}'.format(source_filename, SHP_EXT))
+        uri = file_name
+        options.driverName = "ESRI Shapefile"
+        error = write_vector_features(
+            file_name, fields, wkb_type, crs, features, options)
+
+    if error != QgsVectorFileWriter.NoError:
+        return None
+    saved_layer = QgsVectorLayer(uri, source_filename, "ogr")
+    add_layer_to_canvas(saved_layer, source_filename)
+    return uri
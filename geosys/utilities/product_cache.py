@@ -0,0 +1,466 @@
+# coding=utf-8
+"""Local caches of map products and catalog responses."""
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from qgis.core import QgsApplication
+from qgis.PyQt.QtCore import QByteArray
+
+from geosys.bridge_api.catalog_cache import CatalogCache
+from geosys.bridge_api.default import (
+    PRODUCT_CACHE_SIZE, CATALOG_CACHE_TTL, CATALOG_CACHE_PAST_TTL,
+    THUMBNAIL_MEMORY_CACHE_SIZE, THUMBNAIL_DISK_CACHE_SIZE)
+from geosys.utilities.settings import setting
+
+__copyright__ = "Copyright 2019, Kartoza"
+__license__ = "GPL version 3"
+__email__ = "rohmat@kartoza.com"
+__revision__ = "$Format:%H$"
+
+# Name of the cached files, followed by the extension of the product file.
+PRODUCT_FILE_NAME = 'product'
+
+# Signatures of the image formats returned by the thumbnail endpoints.
+IMAGE_SIGNATURES = (b'\x89PNG', b'\xff\xd8\xff')
+
+
+def link_or_copy(source, destination):
+    """Hardlink source to destination, copy it when linking fails.
+
+    :param source: Existing file.
+    :type source: str
+
+    :param destination: New file, replaced if it exists.
+    :type destination: str
+    """
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        # Different file system, or no hardlink support.
+        shutil.copy2(source, destination)
+
+
+class ProductCache(object):
+    """Map product files stored under a hash of their request.
+
+    Every entry is a directory holding the files of one product. The
+    modification time of the directory records its last use, the least
+    recently used entries are evicted once the cache is over its size.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, directory, max_size):
+        """Constructor.
+
+        :param directory: Cache directory, created when needed.
+        :type directory: str
+
+        :param max_size: Maximum size of the cache in bytes, 0 disables it.
+        :type max_size: int
+        """
+        self.directory = directory
+        self.max_size = max_size
+
+    @property
+    def enabled(self):
+        """Whether products are cached.
+
+        :rtype: bool
+        """
+        return bool(self.directory) and self.max_size > 0
+
+    @staticmethod
+    def key(*parts):
+        """Cache key of a product request.
+
+        :param parts: JSON serializable parts of the request, e.g. region,
+            map type key, image id, geometry, payload and output format.
+        :type parts: tuple
+
+        :returns: Hex digest identifying the request.
+        :rtype: str
+        """
+        content = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def entry_path(self, key):
+        """Directory of a cache entry.
+
+        :param key: Cache key.
+        :type key: str
+
+        :rtype: str
+        """
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key, destination_base_path):
+        """Materialise a cached product at destination_base_path.
+
+        :param key: Cache key.
+        :type key: str
+
+        :param destination_base_path: Base path of the product files, their
+            extension is appended.
+        :type destination_base_path: str
+
+        :returns: True when the product was found in the cache.
+        :rtype: bool
+        """
+        if not self.enabled:
+            return False
+        entry = self.entry_path(key)
+        try:
+            names = os.listdir(entry)
+        except OSError:
+            return False
+        if not names:
+            return False
+        try:
+            for name in names:
+                suffix = name[len(PRODUCT_FILE_NAME):]
+                link_or_copy(
+                    os.path.join(entry, name), destination_base_path + suffix)
+            # Mark the entry as recently used.
+            os.utime(entry)
+        except OSError:
+            # Evicted while being read.
+            return False
+        return True
+
+    def put(self, key, destination_base_path):
+        """Store the product files found at destination_base_path.
+
+        :param key: Cache key.
+        :type key: str
+
+        :param destination_base_path: Base path of the product files.
+        :type destination_base_path: str
+        """
+        if not self.enabled:
+            return
+        paths = glob.glob(glob.escape(destination_base_path) + '.*')
+        if not paths:
+            return
+        entry = self.entry_path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        staging = tempfile.mkdtemp(dir=os.path.dirname(entry))
+        try:
+            for path in paths:
+                suffix = path[len(destination_base_path):]
+                link_or_copy(
+                    path, os.path.join(staging, PRODUCT_FILE_NAME + suffix))
+            with self._lock:
+                if os.path.exists(entry):
+                    shutil.rmtree(entry, ignore_errors=True)
+                os.rename(staging, entry)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits."""
+        with self._lock:
+            entries = []
+            total_size = 0
+            for entry in glob.glob(os.path.join(self.directory, '*', '*')):
+                try:
+                    size = sum(
+                        os.path.getsize(os.path.join(entry, name))
+                        for name in os.listdir(entry))
+                    entries.append((os.path.getmtime(entry), size, entry))
+                except OSError:
+                    continue
+                total_size += size
+            entries.sort()
+            while entries and total_size > self.max_size:
+                _, size, entry = entries.pop(0)
+                shutil.rmtree(entry, ignore_errors=True)
+                total_size -= size
+
+    def clear(self):
+        """Remove every cached product."""
+        with self._lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class ThumbnailCache(object):
+    """Thumbnails kept in memory and on disk.
+
+    The in-memory tier is a least recently used dict of QByteArray shared
+    by every search of the session. The disk tier keeps the thumbnails
+    across sessions, its files are read back into memory when needed. The
+    modification time of a file records its last use, the least recently
+    used files are evicted once the disk tier is over its size.
+    """
+
+    _lock = threading.Lock()
+    _memory = OrderedDict()
+    _disk_lock = threading.Lock()
+    # Bytes written to each disk tier since it was last measured.
+    _disk_usage = {}
+
+    def __init__(
+            self, directory, memory_size=THUMBNAIL_MEMORY_CACHE_SIZE,
+            disk_size=THUMBNAIL_DISK_CACHE_SIZE * 1024 * 1024):
+        """Constructor.
+
+        :param directory: Directory of the disk tier, None to only keep
+            thumbnails in memory.
+        :type directory: str
+
+        :param memory_size: Number of thumbnails kept in memory.
+        :type memory_size: int
+
+        :param disk_size: Maximum size of the disk tier in bytes.
+        :type disk_size: int
+        """
+        self.directory = directory
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+
+    @staticmethod
+    def key(endpoint, image_id, geometry, payload):
+        """Cache key of a thumbnail request.
+
+        :param endpoint: Thumbnail endpoint url.
+        :type endpoint: str
+
+        :param image_id: Image id.
+        :type image_id: str
+
+        :param geometry: Field geometry in WKT format.
+        :type geometry: str
+
+        :param payload: Thumbnail request payload.
+        :type payload: dict
+
+        :returns: Hex digest identifying the request.
+        :rtype: str
+        """
+        geometry_hash = hashlib.sha256(
+            (geometry or '').encode('utf-8')).hexdigest()
+        content = json.dumps(
+            [endpoint, image_id, geometry_hash, payload],
+            sort_keys=True, default=str)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        """Path of a thumbnail in the disk tier.
+
+        :param key: Cache key.
+        :type key: str
+
+        :rtype: str
+        """
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """Get a cached thumbnail.
+
+        :param key: Cache key.
+        :type key: str
+
+        :returns: The thumbnail, None when it is not cached.
+        :rtype: QByteArray
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        if not self.directory:
+            return None
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as thumbnail_file:
+                content = thumbnail_file.read()
+            # Mark the thumbnail as recently used.
+            os.utime(path)
+        except OSError:
+            return None
+        return self._remember(key, content)
+
+    def put(self, key, content):
+        """Store a thumbnail, unless the content is not an image.
+
+        :param key: Cache key.
+        :type key: str
+
+        :param content: Thumbnail content.
+        :type content: bytes
+
+        :returns: The thumbnail.
+        :rtype: QByteArray
+        """
+        if not content or not content.startswith(IMAGE_SIGNATURES):
+            # Error responses are not cached.
+            return QByteArray(content or b'')
+        if self.directory:
+            path = self.path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temporary_path = '{}.{}'.format(path, threading.get_ident())
+                with open(temporary_path, 'wb') as thumbnail_file:
+                    thumbnail_file.write(content)
+                os.replace(temporary_path, path)
+            except OSError:
+                pass
+            else:
+                self._add_disk_usage(len(content))
+        return self._remember(key, content)
+
+    def _add_disk_usage(self, size):
+        """Count a thumbnail written to disk, evict when over the size.
+
+        The disk tier is only measured again once the bytes written since
+        the last measure may put it over its size.
+
+        :param size: Size of the thumbnail in bytes.
+        :type size: int
+        """
+        with self._disk_lock:
+            usage = self._disk_usage.get(self.directory)
+            if usage is not None:
+                usage += size
+                self._disk_usage[self.directory] = usage
+                if usage <= self.disk_size:
+                    return
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used thumbnails until the disk tier fits."""
+        if not self.directory:
+            return
+        with self._disk_lock:
+            files = []
+            total_size = 0
+            for path in glob.glob(os.path.join(self.directory, '*', '*')):
+                try:
+                    size = os.path.getsize(path)
+                    files.append((os.path.getmtime(path), size, path))
+                except OSError:
+                    continue
+                total_size += size
+            files.sort()
+            while files and total_size > self.disk_size:
+                _, size, path = files.pop(0)
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total_size -= size
+            self._disk_usage[self.directory] = total_size
+
+    def _remember(self, key, content):
+        """Add a thumbnail to the in-memory tier.
+
+        :param key: Cache key.
+        :type key: str
+
+        :param content: Thumbnail content.
+        :type content: bytes
+
+        :rtype: QByteArray
+        """
+        thumbnail = QByteArray(content)
+        with self._lock:
+            self._memory[key] = thumbnail
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+        return thumbnail
+
+    @classmethod
+    def clear_memory(cls):
+        """Forget the thumbnails kept in memory."""
+        with cls._lock:
+            cls._memory.clear()
+
+
+def default_product_cache_directory():
+    """Default directory of the product cache, in the QGIS profile.
+
+    :rtype: str
+    """
+    return os.path.join(
+        QgsApplication.qgisSettingsDirPath(), 'geosys', 'product_cache')
+
+
+def product_cache(qsettings=None):
+    """Product cache configured by the user settings.
+
+    The product_cache_directory setting sets the directory and the
+    product_cache_size setting its size in megabytes, 0 disables the cache.
+
+    :param qsettings: A custom QSettings to use.
+    :type qsettings: qgis.PyQt.QtCore.QSettings
+
+    :rtype: ProductCache
+    """
+    directory = setting(
+        'product_cache_directory', '', expected_type=str,
+        qsettings=qsettings) or default_product_cache_directory()
+    size = setting(
+        'product_cache_size', PRODUCT_CACHE_SIZE, expected_type=int,
+        qsettings=qsettings)
+    return ProductCache(directory, size * 1024 * 1024)
+
+
+def catalog_cache(qsettings=None):
+    """Catalog-imagery response cache configured by the user settings.
+
+    The database is stored in the QGIS profile. The catalog_cache_ttl and
+    catalog_cache_past_ttl settings set the lifetime in seconds of the
+    responses, 0 disables the cache.
+
+    :param qsettings: A custom QSettings to use.
+    :type qsettings: qgis.PyQt.QtCore.QSettings
+
+    :returns: The cache, None when it is disabled.
+    :rtype: CatalogCache
+    """
+    ttl = setting(
+        'catalog_cache_ttl', CATALOG_CACHE_TTL, expected_type=int,
+        qsettings=qsettings)
+    past_ttl = setting(
+        'catalog_cache_past_ttl', CATALOG_CACHE_PAST_TTL, expected_type=int,
+        qsettings=qsettings)
+    if ttl <= 0 and past_ttl <= 0:
+        return None
+    path = os.path.join(
+        QgsApplication.qgisSettingsDirPath(), 'geosys', 'catalog_cache.db')
+    return CatalogCache(path, ttl, past_ttl)
+
+
+def thumbnail_cache(qsettings=None):
+    """Thumbnail cache configured by the user settings.
+
+    The disk tier is stored in the QGIS profile unless the
+    thumbnail_disk_cache setting is turned off. The
+    thumbnail_disk_cache_size setting sets its size in megabytes, 0
+    disables it.
+
+    :param qsettings: A custom QSettings to use.
+    :type qsettings: qgis.PyQt.QtCore.QSettings
+
+    :rtype: ThumbnailCache
+    """
+    directory = None
+    size = setting(
+        'thumbnail_disk_cache_size', THUMBNAIL_DISK_CACHE_SIZE,
+        expected_type=int, qsettings=qsettings)
+    if size > 0 and setting(
+            'thumbnail_disk_cache', True, expected_type=bool,
+            qsettings=qsettings):
+        directory = os.path.join(
+            QgsApplication.qgisSettingsDirPath(), 'geosys', 'thumbnail_cache')
+    return ThumbnailCache(directory, disk_size=size * 1024 * 1024)